@@ -1,14 +1,26 @@
 # app_fixed_datetime.py - Fixed version with timezone-aware datetime
-from flask import Flask, render_template, request, jsonify, redirect, url_for, flash
+from flask import Flask, Response, render_template, request, jsonify, redirect, url_for, flash, g, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime, timezone
 import os
 from dotenv import load_dotenv
 import json
+import queue
+import base64
+import time
 import asyncio
-from threading import Thread
-from datetime import datetime, timezone
+from contextlib import contextmanager
+from datetime import datetime, timezone, timedelta
+from sqlalchemy import event, and_, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import deferred, undefer, load_only, selectinload
 from services.pipeline_orchestrator import PipelineOrchestrator
+from services.job_queue import JobWorkerPool
+from services.database import database_url, is_sqlite, engine_options, set_sqlite_pragmas
+from services.export_stream import negotiate_encoding, compress_chunks, json_array_chunks, ndjson_chunks
+from services.paper_import import paper_record, dedupe_keys, parse_ndjson, parse_bibtex, arxiv_id, arxiv_fetcher
+from services.tracing import tracer
+from services.metrics import registry, timed
 
 # Load environment variables
 load_dotenv()
@@ -16,11 +28,30 @@ load_dotenv()
 # Initialize Flask app
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'dev-key-change-in-production')
-app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', 'sqlite:///research_pipeline.db')
+app.config['SQLALCHEMY_DATABASE_URI'] = database_url()
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
 # Initialize database
 db = SQLAlchemy(app)
+if is_sqlite(app.config['SQLALCHEMY_DATABASE_URI']):
+    with app.app_context():
+        event.listen(db.engine, "connect", set_sqlite_pragmas)
+
+@contextmanager
+def worker_session():
+    """Session for code running outside a request (pipeline workers, stage listeners).
+
+    Each thread gets its own app context and therefore its own scoped
+    session, which is rolled back if the block raises and removed when the
+    context ends, returning its connection to the pool.
+    """
+    with app.app_context():
+        try:
+            yield db.session
+        except Exception:
+            db.session.rollback()
+            raise
 
 # Custom function for timezone-aware datetime
 def utc_now():
@@ -39,13 +70,21 @@ class ResearchProject(db.Model):
     description = db.Column(db.Text)
     status = db.Column(db.String(50), default='initialized')  # initialized, running, completed, failed
     pipeline_config = db.Column(db.Text)  # JSON config for pipeline
-    results = db.Column(db.Text)  # JSON results from pipeline
+    results = deferred(db.Column(db.Text))  # Legacy JSON results blob; new runs are stored as StageResult rows
     created_at = db.Column(db.DateTime, default=utc_now)
     updated_at = db.Column(db.DateTime, default=utc_now, onupdate=utc_now)
     
     # Relationships
     research_papers = db.relationship('ResearchPaper', backref='project', lazy=True, cascade='all, delete-orphan')
     prototypes = db.relationship('Prototype', backref='project', lazy=True, cascade='all, delete-orphan')
+    pipeline_jobs = db.relationship('PipelineJob', backref='project', lazy=True, cascade='all, delete-orphan')
+    stage_statuses = db.relationship('PipelineStageStatus', backref='project', lazy=True, cascade='all, delete-orphan')
+    stage_results = db.relationship('StageResult', backref='project', lazy=True, cascade='all, delete-orphan')
+    
+    __table_args__ = (
+        # Dashboard order and keyset pagination
+        db.Index('ix_research_project_updated_at_id', 'updated_at', 'id'),
+    )
 
 class ResearchPaper(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -53,11 +92,11 @@ class ResearchPaper(db.Model):
     authors = db.Column(db.String(1000))
     abstract = db.Column(db.Text)
     url = db.Column(db.String(500))
-    paper_type = db.Column(db.String(50), default='manual')  # manual, arxiv, web
+    paper_type = db.Column(db.String(50), default='manual')  # manual, arxiv, web, bibtex, import
     indexed_at = db.Column(db.DateTime, default=utc_now)
     
     # Foreign keys
-    project_id = db.Column(db.Integer, db.ForeignKey('research_project.id'), nullable=False)
+    project_id = db.Column(db.Integer, db.ForeignKey('research_project.id'), nullable=False, index=True)
 
 class Prototype(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -68,21 +107,561 @@ class Prototype(db.Model):
     status = db.Column(db.String(50), default='development')  # development, testing, deployed
     created_at = db.Column(db.DateTime, default=utc_now)
     
+    # Foreign keys
+    project_id = db.Column(db.Integer, db.ForeignKey('research_project.id'), nullable=False, index=True)
+
+ACTIVE_JOB_STATUSES = ('queued', 'running')
+
+class PipelineJob(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    status = db.Column(db.String(50), default='queued', nullable=False)  # queued, running, completed, failed
+    force = db.Column(db.Boolean, default=False)  # bypass the stage result cache
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=utc_now)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    heartbeat_at = db.Column(db.DateTime)  # renewed while running; a stale heartbeat means the worker died
+    
     # Foreign keys
     project_id = db.Column(db.Integer, db.ForeignKey('research_project.id'), nullable=False)
+    
+    __table_args__ = (
+        db.Index('ix_pipeline_job_status_id', 'status', 'id'),
+        # At most one queued/running job per project
+        db.Index(
+            'uq_pipeline_job_active_project', 'project_id', unique=True,
+            sqlite_where=db.text("status IN ('queued', 'running')"),
+            postgresql_where=db.text("status IN ('queued', 'running')")
+        ),
+    )
+
+class PipelineStageStatus(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    stage = db.Column(db.String(50), nullable=False)  # research, weaviate, prototype, testing, production, pipeline
+    status = db.Column(db.String(50), nullable=False)  # completed, failed
+    counters = db.Column(db.Text)  # JSON counters recorded when the stage finished
+    updated_at = db.Column(db.DateTime, default=utc_now, onupdate=utc_now)
+    
+    # Foreign keys
+    project_id = db.Column(db.Integer, db.ForeignKey('research_project.id'), nullable=False)
+    
+    __table_args__ = (
+        db.UniqueConstraint('project_id', 'stage', name='uq_pipeline_stage_status_project_stage'),
+    )
+
+class StageResult(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    stage = db.Column(db.String(50), nullable=False)  # research, weaviate, prototype, testing, production, pipeline, stage.<name>
+    status = db.Column(db.String(50))
+    duration_seconds = db.Column(db.Float)
+    summary = db.Column(db.Text)  # JSON result without its large values
+    artifacts = deferred(db.Column(db.Text))  # JSON [path, value] pairs of the large values, loaded on demand
+    artifact_bytes = db.Column(db.Integer, default=0)
+    created_at = db.Column(db.DateTime, default=utc_now)
+    
+    # Foreign keys
+    project_id = db.Column(db.Integer, db.ForeignKey('research_project.id'), nullable=False)
+    job_id = db.Column(db.Integer, db.ForeignKey('pipeline_job.id'))  # groups a pipeline run's rows; None for single-stage runs
+    
+    __table_args__ = (
+        db.Index('ix_stage_result_project_stage_id', 'project_id', 'stage', 'id'),
+    )
+
+class PipelineBatch(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    project_ids = db.Column(db.Text, nullable=False)  # JSON list of requested project ids
+    job_ids = db.Column(db.Text, nullable=False)  # JSON list of the pipeline jobs serving them
+    force = db.Column(db.Boolean, default=False)
+    created_at = db.Column(db.DateTime, default=utc_now)
+
+def record_stage_status(project_id, stage, status, counters):
+    """Upsert a stage's status row; registered as an orchestrator stage listener"""
+    with worker_session():
+        row = PipelineStageStatus.query.filter_by(project_id=project_id, stage=stage).first()
+        if row is None:
+            row = PipelineStageStatus(project_id=project_id, stage=stage)
+            db.session.add(row)
+        row.status = status
+        row.counters = json.dumps(counters, default=str)
+        row.updated_at = utc_now()
+        db.session.commit()
+
+def load_stage_status(project_id):
+    """Read the recorded stage statuses for a project"""
+    stages = {}
+    for row in PipelineStageStatus.query.filter_by(project_id=project_id):
+        stages[row.stage] = {
+            "status": row.status,
+            "updated_at": row.updated_at.isoformat() if row.updated_at else None,
+            **(json.loads(row.counters) if row.counters else {})
+        }
+    return stages
+
+orchestrator.add_stage_listener(record_stage_status)
+
+# Result values serialized larger than this many characters are stored as deferred artifacts
+STAGE_RESULT_INLINE_CHARS = int(os.getenv('STAGE_RESULT_INLINE_CHARS', 2000))
+# Runs kept per project and stage
+STAGE_RESULT_HISTORY = int(os.getenv('STAGE_RESULT_HISTORY', 5))
+# Stage key prefix of single-stage runs, kept apart from the pipeline's stage rows
+SINGLE_STAGE_PREFIX = 'stage.'
+
+def split_artifacts(result, path=()):
+    """Split a result into (summary, artifacts): large values move to [path, value] artifact pairs"""
+    summary, artifacts = {}, []
+    for key, value in result.items():
+        if isinstance(value, dict):
+            summary[key], nested = split_artifacts(value, path + (key,))
+            artifacts.extend(nested)
+        elif len(json.dumps(value, default=str)) > STAGE_RESULT_INLINE_CHARS:
+            artifacts.append([list(path + (key,)), value])
+        else:
+            summary[key] = value
+    return summary, artifacts
+
+def merge_artifacts(summary, artifacts):
+    """Put artifact values back at their paths in a result summary"""
+    for path, value in artifacts:
+        target = summary
+        for key in path[:-1]:
+            target = target.setdefault(key, {})
+        target[path[-1]] = value
+    return summary
+
+def save_stage_result(project_id, stage, result, job_id=None):
+    """Add one run's result row for a stage and prune runs beyond STAGE_RESULT_HISTORY (caller commits)"""
+    summary, artifacts = split_artifacts(json.loads(json.dumps(result, default=str)))
+    artifacts_json = json.dumps(artifacts) if artifacts else None
+    db.session.add(StageResult(
+        project_id=project_id,
+        job_id=job_id,
+        stage=stage,
+        status=result.get('status'),
+        duration_seconds=result.get('duration_seconds', result.get('total_duration_seconds')),
+        summary=json.dumps(summary),
+        artifacts=artifacts_json,
+        artifact_bytes=len(artifacts_json) if artifacts_json else 0
+    ))
+    
+    stale = db.session.query(StageResult.id).filter_by(project_id=project_id, stage=stage) \
+        .order_by(StageResult.id.desc()).offset(STAGE_RESULT_HISTORY).all()
+    if stale:
+        StageResult.query.filter(StageResult.id.in_([row.id for row in stale])).delete(synchronize_session=False)
+
+def save_pipeline_results(project_id, results, job_id=None):
+    """Store a pipeline run as one row per stage plus a "pipeline" row for the run summary"""
+    for stage, stage_result in (results.get('stages') or {}).items():
+        save_stage_result(project_id, stage, stage_result, job_id)
+    save_stage_result(project_id, 'pipeline', {key: value for key, value in results.items() if key != 'stages'}, job_id)
+
+def load_results(project, include_artifacts=False):
+    """Results of the project's latest pipeline run, plus its latest single-stage runs.
+
+    Stage results are the rows of the same job as the latest "pipeline" row,
+    so the view never mixes stages of different runs. Single-stage runs have
+    results of another shape and are listed apart, under "single_stages".
+    Artifacts are only read when include_artifacts is set; projects that
+    predate StageResult fall back to their legacy results blob.
+    """
+    def rows():
+        query = StageResult.query.filter_by(project_id=project.id)
+        return query.options(undefer(StageResult.artifacts)) if include_artifacts else query
+    
+    def decode(row):
+        result = json.loads(row.summary) if row.summary else {}
+        if include_artifacts and row.artifacts:
+            merge_artifacts(result, json.loads(row.artifacts))
+        return result
+    
+    single_stages = {}
+    for row in rows().filter(StageResult.stage.startswith(SINGLE_STAGE_PREFIX)).order_by(StageResult.id.desc()):
+        single_stages.setdefault(row.stage[len(SINGLE_STAGE_PREFIX):], row)
+    pipeline = rows().filter_by(stage='pipeline').order_by(StageResult.id.desc()).first()
+    
+    if pipeline is None and not single_stages:
+        return json.loads(project.results) if project.results else {}
+    
+    results = {}
+    if pipeline is not None:
+        results = decode(pipeline)
+        stage_rows = rows().filter(
+            StageResult.job_id == pipeline.job_id,
+            StageResult.id < pipeline.id,
+            StageResult.stage != 'pipeline',
+            ~StageResult.stage.startswith(SINGLE_STAGE_PREFIX)
+        ).order_by(StageResult.id)
+        results['stages'] = {row.stage: decode(row) for row in stage_rows}
+    if single_stages:
+        results['single_stages'] = {stage: decode(row) for stage, row in reversed(list(single_stages.items()))}
+    return results
+
+def job_to_dict(job):
+    """Serialize a pipeline job for API responses"""
+    return {
+        "job_id": job.id,
+        "project_id": job.project_id,
+        "status": job.status,
+        "force": job.force,
+        "error": job.error,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+        "heartbeat_at": job.heartbeat_at.isoformat() if job.heartbeat_at else None
+    }
+
+def create_missing_indexes():
+    """Create model indexes missing from existing tables (create_all only indexes new tables)"""
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=db.engine, checkfirst=True)
+
+def create_missing_columns():
+    """Add nullable model columns missing from existing tables (create_all only creates new tables)"""
+    inspector = db.inspect(db.engine)
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing or not column.nullable:
+                continue
+            column_type = column.type.compile(dialect=db.engine.dialect)
+            with db.engine.begin() as connection:
+                connection.execute(db.text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+
+# Page sizes for the project dashboard and paper listings
+PROJECTS_PAGE_SIZE = int(os.getenv('PROJECTS_PAGE_SIZE', 24))
+PAPERS_PAGE_SIZE = int(os.getenv('PAPERS_PAGE_SIZE', 100))
+MAX_PAGE_SIZE = 500
+
+def encode_cursor(*values):
+    """Opaque keyset pagination cursor for the last row of a page"""
+    return base64.urlsafe_b64encode(json.dumps(values, default=str).encode()).decode()
+
+def decode_cursor(cursor, *kinds):
+    """Values encoded by encode_cursor, or None without a cursor.
+
+    kinds are the types of the encoded values in order (datetimes are encoded
+    as ISO strings); a cursor of any other shape raises ValueError.
+    """
+    if not cursor:
+        return None
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        raise ValueError('Invalid cursor')
+    if not isinstance(values, list) or len(values) != len(kinds):
+        raise ValueError('Invalid cursor')
+    
+    decoded = []
+    for value, kind in zip(values, kinds):
+        if kind is datetime and isinstance(value, str):
+            try:
+                decoded.append(datetime.fromisoformat(value))
+            except ValueError:
+                raise ValueError('Invalid cursor')
+        elif kind is int and isinstance(value, int) and not isinstance(value, bool):
+            decoded.append(value)
+        else:
+            raise ValueError('Invalid cursor')
+    return decoded
+
+def page_size(default):
+    return max(1, min(request.args.get('limit', default, type=int), MAX_PAGE_SIZE))
+
+def paper_to_dict(paper):
+    """Serialize a paper for the pipeline services"""
+    return {
+        "title": paper.title,
+        "authors": paper.authors,
+        "abstract": paper.abstract,
+        "url": paper.url,
+        "type": paper.paper_type
+    }
+
+def project_papers(project):
+    """Serialize a project's papers for the pipeline services"""
+    return [paper_to_dict(paper) for paper in project.research_papers]
+
+def build_pipeline_config(project):
+    """Build the orchestrator config (pipeline settings plus papers) for a project"""
+    config = json.loads(project.pipeline_config) if project.pipeline_config else {}
+    config["papers"] = project_papers(project)
+    return config
+
+def enqueue_pipeline_job(project, force=False):
+    """Queue a pipeline run for a project, returning (job, created).
+
+    If the project already has a queued or running job that job is returned
+    instead, so repeated submissions never run a project twice.
+    """
+    existing = PipelineJob.query.filter(
+        PipelineJob.project_id == project.id,
+        PipelineJob.status.in_(ACTIVE_JOB_STATUSES)
+    ).first()
+    if existing:
+        return existing, False
+    
+    job = PipelineJob(project_id=project.id, force=force)
+    project.status = 'queued'
+    project.updated_at = utc_now()
+    db.session.add(job)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Lost the race against a concurrent submission for the same project
+        db.session.rollback()
+        existing = PipelineJob.query.filter(
+            PipelineJob.project_id == project.id,
+            PipelineJob.status.in_(ACTIVE_JOB_STATUSES)
+        ).first()
+        return existing, False
+    
+    orchestrator.events.publish(project.id, "job_queued", job_id=job.id)
+    return job, True
+
+def enqueue_pipeline_batch(project_ids, force=False):
+    """Queue pipeline runs for many projects as one batch.
+
+    Each project gets (or reuses) a regular pipeline job; the jobs run on the
+    shared worker pool, where backend concurrency limits and co-batched
+    embedding and Weaviate calls apply across all of them.
+    """
+    project_ids = list(dict.fromkeys(project_ids))
+    projects = ResearchProject.query.filter(ResearchProject.id.in_(project_ids)).all()
+    found = {project.id: project for project in projects}
+    missing = [project_id for project_id in project_ids if project_id not in found]
+    
+    jobs = []
+    for project_id in project_ids:
+        if project_id in found:
+            job, _ = enqueue_pipeline_job(found[project_id], force=force)
+            jobs.append(job)
+    
+    batch = PipelineBatch(
+        project_ids=json.dumps([project_id for project_id in project_ids if project_id in found]),
+        job_ids=json.dumps([job.id for job in jobs]),
+        force=force
+    )
+    db.session.add(batch)
+    db.session.commit()
+    return batch, jobs, missing
+
+def batch_to_dict(batch):
+    """Serialize a pipeline batch with the state of its jobs"""
+    job_ids = json.loads(batch.job_ids)
+    jobs = PipelineJob.query.filter(PipelineJob.id.in_(job_ids)).order_by(PipelineJob.id).all() if job_ids else []
+    counts = {}
+    for job in jobs:
+        counts[job.status] = counts.get(job.status, 0) + 1
+    
+    return {
+        "batch_id": batch.id,
+        "project_ids": json.loads(batch.project_ids),
+        "force": batch.force,
+        "created_at": batch.created_at.isoformat() if batch.created_at else None,
+        "status": "running" if any(job.status in ACTIVE_JOB_STATUSES for job in jobs) else "finished",
+        "counts": counts,
+        "jobs": [job_to_dict(job) for job in jobs]
+    }
+
+# A running job whose heartbeat is older than this is taken over by the next free worker
+JOB_LEASE_SECONDS = float(os.getenv('PIPELINE_JOB_LEASE_SECONDS', 120))
+
+def claimable_jobs():
+    """Filter for jobs a worker may claim: queued, or running under an expired lease"""
+    expired = utc_now() - timedelta(seconds=JOB_LEASE_SECONDS)
+    return or_(
+        PipelineJob.status == 'queued',
+        and_(
+            PipelineJob.status == 'running',
+            db.func.coalesce(PipelineJob.heartbeat_at, PipelineJob.started_at) < expired
+        )
+    )
+
+def claim_next_job():
+    """Atomically move the oldest claimable job to running and return its id.
+
+    Jobs left running by a worker thread or process that died stop renewing
+    their lease, so they are claimed again here once it expires; no startup
+    step is needed to recover them.
+    """
+    with worker_session():
+        while True:
+            job = PipelineJob.query.filter(claimable_jobs()).order_by(PipelineJob.id).first()
+            if job is None:
+                return None
+            
+            job_id, reclaimed = job.id, job.status == 'running'
+            now = utc_now()
+            claimed = PipelineJob.query.filter(PipelineJob.id == job_id, claimable_jobs()).update(
+                {"status": "running", "started_at": now, "heartbeat_at": now},
+                synchronize_session=False
+            )
+            db.session.commit()
+            if claimed:
+                if reclaimed:
+                    app.logger.warning(f"Reclaimed pipeline job {job_id} after its lease expired")
+                return job_id
+
+def renew_job_leases(job_ids):
+    """Heartbeat for the jobs this process is running; called by the worker pool"""
+    with worker_session():
+        PipelineJob.query.filter(PipelineJob.id.in_(job_ids), PipelineJob.status == 'running').update(
+            {"heartbeat_at": utc_now()},
+            synchronize_session=False
+        )
+        db.session.commit()
+
+# Request and job metrics served at /metrics
+http_requests = registry.counter(
+    "http_requests_total", "HTTP requests by route and status", ("method", "route", "status")
+)
+http_request_seconds = registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency by route", ("method", "route")
+)
+http_requests_in_flight = registry.gauge("http_requests_in_flight", "HTTP requests being served")
+pipeline_job_seconds = registry.histogram("pipeline_job_duration_seconds", "Duration of pipeline jobs")
+pipeline_job_errors = registry.counter("pipeline_job_errors_total", "Pipeline jobs that raised")
+
+@timed(pipeline_job_seconds, pipeline_job_errors)
+def run_pipeline_job(job_id):
+    """Execute a claimed pipeline job and record its outcome"""
+    with worker_session():
+        job = db.session.get(PipelineJob, job_id)
+        project = db.session.get(ResearchProject, job.project_id) if job else None
+        if project is None:
+            if job:
+                job.status = 'failed'
+                job.error = 'Project no longer exists'
+                job.finished_at = utc_now()
+                db.session.commit()
+            return
+        
+        project_id = project.id
+        config = build_pipeline_config(project)
+        config["force"] = bool(job.force)
+        project.status = 'running'
+        project.updated_at = utc_now()  # Use timezone-aware datetime
+        db.session.commit()
+        orchestrator.events.publish(project_id, "job_started", job_id=job_id)
+        
+        try:
+            result = asyncio.run(orchestrator.run_complete_pipeline(project_id, config))
+            status = 'completed' if result.get('status') == 'completed' else 'failed'
+            error = result.get('error')
+        except Exception as e:
+            result = {"error": str(e)}
+            status = 'failed'
+            error = str(e)
+        
+        project = db.session.get(ResearchProject, project_id)
+        if project is not None:
+            save_pipeline_results(project_id, result, job_id)
+            project.status = status
+            project.updated_at = utc_now()  # Use timezone-aware datetime
+        
+        job = db.session.get(PipelineJob, job_id)
+        if job is not None:
+            job.status = status
+            job.error = error
+            job.finished_at = utc_now()
+        db.session.commit()
+        orchestrator.events.publish(project_id, "job_finished", job_id=job_id, status=status, error=error)
+
+# Initialize the pipeline worker pool (sized by PIPELINE_WORKERS)
+job_pool = JobWorkerPool(claim_next_job, run_pipeline_job, heartbeat=renew_job_leases)
+
+def count_jobs_by_status():
+    """Pipeline job counts per status, read when /metrics is scraped"""
+    with worker_session():
+        rows = db.session.query(PipelineJob.status, db.func.count(PipelineJob.id)).group_by(PipelineJob.status).all()
+        return {status: count for status, count in rows}
+
+registry.gauge("pipeline_jobs", "Pipeline jobs by status", ("status",), func=count_jobs_by_status)
+registry.gauge("pipeline_job_workers", "Pipeline worker threads", func=lambda: len(job_pool.workers))
+registry.gauge(
+    "backend_in_flight", "Calls running against each rate-limited backend", ("backend",),
+    func=lambda: {backend: state["in_flight"] for backend, state in orchestrator.limiter.snapshot().items()}
+)
+registry.gauge(
+    "backend_concurrency_limit", "Concurrent calls allowed per backend", ("backend",),
+    func=lambda: {backend: state["limit"] for backend, state in orchestrator.limiter.snapshot().items()}
+)
+registry.gauge(
+    "comet_buffer_records", "Comet logging records by outcome since startup, and records pending", ("state",),
+    func=lambda: {state: count for state, count in orchestrator.comet.buffer.stats().items() if state != "policy"}
+)
+registry.gauge("crewai_running_tasks", "CrewAI tasks running", func=lambda: len(orchestrator.crewai.tasks.active()))
+registry.gauge("crewai_idle_agent_sets", "Pre-warmed CrewAI agent sets not in use",
+               func=lambda: orchestrator.crewai.pool.qsize())
+
+@app.before_request
+def start_job_workers():
+    job_pool.start()
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    http_requests_in_flight.inc()
+
+@app.teardown_request
+def record_request_metrics(error=None):
+    started = g.pop('request_started', None)
+    if started is None:
+        return
+    http_requests_in_flight.dec()
+    # Label by URL rule, not path, so ids don't create a series per project
+    route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+    http_request_seconds.observe(time.perf_counter() - started, method=request.method, route=route)
+
+@app.after_request
+def count_request(response):
+    route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+    http_requests.inc(method=request.method, route=route, status=str(response.status_code))
+    return response
 
 # Routes
 @app.route('/')
 def index():
-    projects = ResearchProject.query.order_by(ResearchProject.updated_at.desc()).all()
+    # Keyset pagination on (updated_at, id): each page is an index range scan however many projects exist
+    limit = page_size(PROJECTS_PAGE_SIZE)
+    query = ResearchProject.query.options(load_only(
+        ResearchProject.id, ResearchProject.title, ResearchProject.description,
+        ResearchProject.status, ResearchProject.created_at, ResearchProject.updated_at
+    ))
+    try:
+        cursor = decode_cursor(request.args.get('cursor'), datetime, int)
+    except ValueError:
+        # A stale or hand-edited link shows the first page
+        cursor = None
+    if cursor:
+        updated_at, last_id = cursor
+        query = query.filter(or_(
+            ResearchProject.updated_at < updated_at,
+            and_(ResearchProject.updated_at == updated_at, ResearchProject.id < last_id)
+        ))
+    projects = query.order_by(ResearchProject.updated_at.desc(), ResearchProject.id.desc()).limit(limit + 1).all()
+    
+    next_cursor = None
+    if len(projects) > limit:
+        projects = projects[:limit]
+        next_cursor = encode_cursor(projects[-1].updated_at.isoformat(), projects[-1].id)
+    
     health_status = orchestrator.get_pipeline_health()
-    return render_template('index.html', projects=projects, health_status=health_status)
+    return render_template('index.html', projects=projects, health_status=health_status,
+                           next_cursor=next_cursor, paged=cursor is not None)
 
 @app.route('/project/<int:id>')
 def project_detail(id):
-    project = ResearchProject.query.get_or_404(id)
-    status = orchestrator.get_project_status(id)
-    results = json.loads(project.results) if project.results else {}
+    # Papers are listed by title, authors and url only; load them with the project, without abstracts
+    project = ResearchProject.query.options(
+        selectinload(ResearchProject.research_papers).load_only(
+            ResearchPaper.id, ResearchPaper.title, ResearchPaper.authors, ResearchPaper.url
+        )
+    ).filter_by(id=id).first_or_404()
+    status = orchestrator.get_project_status(id, load_stage_status(id))
+    results = load_results(project)
     return render_template('project_detail.html', project=project, status=status, results=results)
 
 @app.route('/new_project', methods=['GET', 'POST'])
@@ -146,59 +725,82 @@ def favicon():
 # API Routes for pipeline integration
 @app.route('/api/pipeline/run/<int:project_id>', methods=['POST'])
 def run_pipeline(project_id):
-    """Run the complete pipeline for a project"""
+    """Queue a complete pipeline run for a project"""
     try:
         project = ResearchProject.query.get_or_404(project_id)
-        project.status = 'running'
-        project.updated_at = utc_now()  # Use timezone-aware datetime
-        db.session.commit()
+        options = request.get_json(silent=True) or {}
+        job, created = enqueue_pipeline_job(project, force=bool(options.get('force')))
+        job_pool.notify()
         
-        # Get papers for the project
-        papers = []
-        for paper in project.research_papers:
-            papers.append({
-                "title": paper.title,
-                "authors": paper.authors,
-                "abstract": paper.abstract,
-                "url": paper.url,
-                "type": paper.paper_type
-            })
+        return jsonify({
+            'status': 'queued' if created else 'already_queued',
+            'message': 'Pipeline execution queued' if created else f'Pipeline already {job.status} for this project',
+            'project_id': project_id,
+            'job_id': job.id
+        }), 202 if created else 200
         
-        # Get pipeline config
-        config = json.loads(project.pipeline_config) if project.pipeline_config else {}
-        config["papers"] = papers
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# Projects accepted in one batch request
+PIPELINE_BATCH_MAX_PROJECTS = int(os.getenv('PIPELINE_BATCH_MAX_PROJECTS', 500))
+
+@app.route('/api/pipeline/batch', methods=['POST'])
+def run_pipeline_batch():
+    """Queue complete pipeline runs for many projects at once"""
+    try:
+        options = request.get_json(silent=True) or {}
+        project_ids = options.get('project_ids')
+        if not isinstance(project_ids, list) or not project_ids:
+            return jsonify({'error': 'project_ids must be a non-empty list'}), 400
         
-        # Run pipeline in background thread
-        def run_pipeline_async():
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            
-            try:
-                result = loop.run_until_complete(orchestrator.run_complete_pipeline(project_id, config))
-                
-                # Update project with results
-                project.results = json.dumps(result)
-                project.status = 'completed' if result.get('status') == 'completed' else 'failed'
-                project.updated_at = utc_now()  # Use timezone-aware datetime
-                db.session.commit()
-                
-            except Exception as e:
-                project.status = 'failed'
-                project.results = json.dumps({"error": str(e)})
-                project.updated_at = utc_now()  # Use timezone-aware datetime
-                db.session.commit()
-            
-            finally:
-                loop.close()
+        invalid = [
+            project_id for project_id in project_ids
+            if not isinstance(project_id, int) or isinstance(project_id, bool)
+        ]
+        if invalid:
+            return jsonify({'error': 'project_ids must be integers', 'invalid_project_ids': invalid}), 400
         
-        thread = Thread(target=run_pipeline_async)
-        thread.start()
+        project_ids = list(dict.fromkeys(project_ids))
+        if len(project_ids) > PIPELINE_BATCH_MAX_PROJECTS:
+            return jsonify({
+                'error': f'At most {PIPELINE_BATCH_MAX_PROJECTS} projects can be queued in one batch'
+            }), 400
         
-        return jsonify({
-            'status': 'started',
-            'message': 'Pipeline execution started',
-            'project_id': project_id
-        })
+        found = {row.id for row in db.session.query(ResearchProject.id).filter(ResearchProject.id.in_(project_ids))}
+        missing = [project_id for project_id in project_ids if project_id not in found]
+        if missing:
+            return jsonify({'error': 'Unknown projects', 'missing_project_ids': missing}), 404
+        
+        batch, jobs, missing = enqueue_pipeline_batch(project_ids, force=bool(options.get('force')))
+        job_pool.notify()
+        
+        response = batch_to_dict(batch)
+        response['message'] = f'Queued pipeline runs for {len(jobs)} projects'
+        response['missing_project_ids'] = missing
+        return jsonify(response), 202
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/pipeline/batch/<int:batch_id>')
+def get_pipeline_batch(batch_id):
+    """Get the progress of a batch of pipeline runs"""
+    try:
+        batch = PipelineBatch.query.get_or_404(batch_id)
+        response = batch_to_dict(batch)
+        response['backends'] = orchestrator.limiter.snapshot()
+        return jsonify(response)
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/pipeline/jobs/<int:job_id>')
+def get_pipeline_job(job_id):
+    """Get the status of a queued pipeline job"""
+    try:
+        job = PipelineJob.query.get_or_404(job_id)
+        return jsonify(job_to_dict(job))
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -212,25 +814,12 @@ def run_stage(project_id, stage):
         
         # Add project-specific data to config
         if stage == 'research':
-            papers = []
-            for paper in project.research_papers:
-                papers.append({
-                    "title": paper.title,
-                    "authors": paper.authors,
-                    "abstract": paper.abstract,
-                    "url": paper.url,
-                    "type": paper.paper_type
-                })
-            config["papers"] = papers
+            config["papers"] = project_papers(project)
         
         result = orchestrator.run_single_stage(project_id, stage, config)
         
-        # Update project status
-        current_results = json.loads(project.results) if project.results else {}
-        if 'stages' not in current_results:
-            current_results['stages'] = {}
-        current_results['stages'][stage] = result
-        project.results = json.dumps(current_results)
+        # Store this run under its own stage key; the pipeline's stage results are untouched
+        save_stage_result(project_id, f"{SINGLE_STAGE_PREFIX}{stage}", result)
         project.updated_at = utc_now()  # Use timezone-aware datetime
         db.session.commit()
         
@@ -244,7 +833,7 @@ def get_project_status(project_id):
     """Get current project status"""
     try:
         project = ResearchProject.query.get_or_404(project_id)
-        status = orchestrator.get_project_status(project_id)
+        status = orchestrator.get_project_status(project_id, load_stage_status(project_id))
         
         return jsonify({
             'project_status': project.status,
@@ -255,49 +844,121 @@ def get_project_status(project_id):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/project/<int:project_id>/traces')
+def get_project_traces(project_id):
+    """Get the span breakdown of a project's most recent traced runs"""
+    try:
+        ResearchProject.query.get_or_404(project_id)
+        limit = request.args.get('limit', 5, type=int)
+        return jsonify({'project_id': project_id, 'traces': tracer.recent(project_id, limit)})
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/project/<int:project_id>/events')
+def project_events(project_id):
+    """Stream pipeline progress events for a project as server-sent events"""
+    ResearchProject.query.get_or_404(project_id)
+    keepalive = float(os.getenv('SSE_KEEPALIVE_SECONDS', 15))
+    last_event_id = request.headers.get('Last-Event-ID', type=int)
+    subscription = orchestrator.events.subscribe(project_id, last_event_id)
+    
+    def stream():
+        try:
+            while True:
+                try:
+                    event = subscription.get(timeout=keepalive)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event, default=str)}\n\n"
+        finally:
+            orchestrator.events.unsubscribe(project_id, subscription)
+    
+    return Response(stream(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus scrape endpoint: request, job, backend and service call metrics"""
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/api/health')
 def health_check():
     """Check pipeline component health"""
     return jsonify(orchestrator.get_pipeline_health())
 
+# Rows fetched per round trip while streaming an export
+EXPORT_BATCH_SIZE = int(os.getenv('EXPORT_BATCH_SIZE', 200))
+
+def stream_rows(*columns, project_id):
+    """A project's rows as dicts, fetched in batches through a server-side cursor where supported"""
+    model = columns[0].class_
+    statement = db.select(*columns).where(model.project_id == project_id).order_by(model.id)
+    result = db.session.execute(statement.execution_options(yield_per=EXPORT_BATCH_SIZE))
+    for row in result:
+        yield dict(row._mapping)
+
+def export_chunks(project, export_format):
+    """Export text for a project, produced one paper and prototype at a time"""
+    project_data = {
+        "id": project.id,
+        "title": project.title,
+        "description": project.description,
+        "status": project.status,
+        "created_at": project.created_at.isoformat(),
+        "updated_at": project.updated_at.isoformat()
+    }
+    papers = stream_rows(
+        ResearchPaper.title, ResearchPaper.authors, ResearchPaper.abstract, ResearchPaper.url,
+        ResearchPaper.paper_type.label("type"), project_id=project.id
+    )
+    prototypes = stream_rows(
+        Prototype.name, Prototype.description, Prototype.code, Prototype.status, project_id=project.id
+    )
+    
+    if export_format == 'ndjson':
+        yield json.dumps({"type": "project", **project_data}, default=str) + "\n"
+        yield from ndjson_chunks("paper", papers)
+        yield from ndjson_chunks("prototype", prototypes)
+        yield json.dumps({"type": "results", "results": load_results(project, include_artifacts=True) or None},
+                         default=str) + "\n"
+        return
+    
+    yield '{"project":' + json.dumps(project_data, default=str) + ',"papers":'
+    yield from json_array_chunks(papers)
+    yield ',"prototypes":'
+    yield from json_array_chunks(prototypes)
+    # Results are the latest row per stage, so their size does not grow with the paper count
+    yield ',"results":' + json.dumps(load_results(project, include_artifacts=True) or None, default=str) + '}'
+
 @app.route('/api/project/<int:project_id>/export')
 def export_project(project_id):
-    """Export project data for external use"""
+    """Export project data for external use.
+
+    The export is streamed as JSON, or as NDJSON records (project, paper,
+    prototype, results) with ?format=ndjson or Accept: application/x-ndjson,
+    and compressed with zstd or gzip when the client accepts it.
+    """
     try:
         project = ResearchProject.query.get_or_404(project_id)
         
-        export_data = {
-            "project": {
-                "id": project.id,
-                "title": project.title,
-                "description": project.description,
-                "status": project.status,
-                "created_at": project.created_at.isoformat(),
-                "updated_at": project.updated_at.isoformat()
-            },
-            "papers": [
-                {
-                    "title": paper.title,
-                    "authors": paper.authors,
-                    "abstract": paper.abstract,
-                    "url": paper.url,
-                    "type": paper.paper_type
-                }
-                for paper in project.research_papers
-            ],
-            "prototypes": [
-                {
-                    "name": prototype.name,
-                    "description": prototype.description,
-                    "code": prototype.code,
-                    "status": prototype.status
-                }
-                for prototype in project.prototypes
-            ],
-            "results": json.loads(project.results) if project.results else None
-        }
+        export_format = request.args.get('format')
+        if export_format is None:
+            export_format = 'ndjson' if 'application/x-ndjson' in request.headers.get('Accept', '') else 'json'
+        if export_format not in ('json', 'ndjson'):
+            return jsonify({'error': f'Unknown export format: {export_format}'}), 400
         
-        return jsonify(export_data)
+        encoding = negotiate_encoding(request.headers.get('Accept-Encoding'))
+        headers = {'Vary': 'Accept-Encoding'}
+        if encoding:
+            headers['Content-Encoding'] = encoding
+        
+        chunks = compress_chunks(export_chunks(project, export_format), encoding)
+        mimetype = 'application/x-ndjson' if export_format == 'ndjson' else 'application/json'
+        return Response(stream_with_context(chunks), mimetype=mimetype, headers=headers)
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -416,6 +1077,35 @@ def crewai_task_status(task_id):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/crewai/stream/<task_id>')
+def crewai_task_stream(task_id):
+    """Stream a CrewAI task's tokens and agent steps as server-sent events"""
+    stream = orchestrator.crewai.get_task_stream(task_id)
+    if stream is None:
+        return jsonify({'error': f'No stream for task {task_id}'}), 404
+    
+    keepalive = float(os.getenv('SSE_KEEPALIVE_SECONDS', 15))
+    # Event ids are chunk positions, so a reconnecting client resumes after the last one it saw
+    offset = request.headers.get('Last-Event-ID', type=int) or request.args.get('offset', 0, type=int)
+    
+    def generate():
+        position = offset
+        while True:
+            chunks, done = stream.read(position, keepalive)
+            for chunk in chunks:
+                position += 1
+                yield f"id: {position}\nevent: {chunk['kind']}\ndata: {json.dumps(chunk)}\n\n"
+            if done and not chunks:
+                yield f"event: done\ndata: {json.dumps({'task_id': stream.task_id, 'status': stream.status})}\n\n"
+                return
+            if not chunks:
+                yield ": keepalive\n\n"
+    
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
 @app.route('/api/comet/track', methods=['POST'])
 def comet_track():
     """Track progress and metrics with Comet"""
@@ -463,9 +1153,23 @@ def get_comet_dashboard(project_id):
 # Additional routes for paper management
 @app.route('/api/project/<int:project_id>/papers', methods=['GET'])
 def list_papers(project_id):
-    """List all papers for a project"""
+    """List a project's papers in id order, a page at a time.
+
+    The next page's cursor is returned in the X-Next-Cursor header (and a
+    Link rel="next" header) while more papers remain.
+    """
     try:
-        project = ResearchProject.query.get_or_404(project_id)
+        ResearchProject.query.get_or_404(project_id)
+        limit = page_size(PAPERS_PAGE_SIZE)
+        query = ResearchPaper.query.filter_by(project_id=project_id)
+        try:
+            cursor = decode_cursor(request.args.get('cursor'), int)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        if cursor:
+            query = query.filter(ResearchPaper.id > cursor[0])
+        rows = query.order_by(ResearchPaper.id).limit(limit + 1).all()
+        
         papers = [
             {
                 "id": paper.id,
@@ -476,11 +1180,129 @@ def list_papers(project_id):
                 "type": paper.paper_type,
                 "indexed_at": paper.indexed_at.isoformat()
             }
-            for paper in project.research_papers
+            for paper in rows[:limit]
         ]
-        return jsonify(papers)
+        response = jsonify(papers)
+        if len(rows) > limit:
+            next_cursor = encode_cursor(rows[limit - 1].id)
+            response.headers['X-Next-Cursor'] = next_cursor
+            response.headers['Link'] = f'<{url_for("list_papers", project_id=project_id, cursor=next_cursor, limit=limit)}>; rel="next"'
+        return response
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# Rows per INSERT statement when importing papers, and papers accepted per import
+IMPORT_BATCH_SIZE = int(os.getenv('IMPORT_BATCH_SIZE', 1000))
+IMPORT_MAX_PAPERS = int(os.getenv('IMPORT_MAX_PAPERS', 50000))
+
+# Used for arXiv imports; replace with an object with fetch(ids) to stub arXiv out
+paper_fetcher = arxiv_fetcher()
+
+def bulk_insert_papers(project_id, records):
+    """Insert the records that are not already in the project, in batches; returns (papers, duplicates)
+
+    Records match an existing or earlier paper by DOI, normalized url or
+    title hash. Returned papers are serialized with their new ids.
+    """
+    seen = set()
+    existing = db.session.execute(
+        db.select(ResearchPaper.title, ResearchPaper.url).where(ResearchPaper.project_id == project_id)
+    )
+    for title, url in existing:
+        seen.update(dedupe_keys({"title": title, "url": url}))
+    
+    rows, duplicates = [], 0
+    for record in records:
+        keys = dedupe_keys(record)
+        if keys & seen:
+            duplicates += 1
+            continue
+        seen.update(keys)
+        rows.append({field: value for field, value in record.items() if field != "doi"} | {"project_id": project_id})
+    
+    papers = []
+    for start in range(0, len(rows), IMPORT_BATCH_SIZE):
+        batch = rows[start:start + IMPORT_BATCH_SIZE]
+        ids = db.session.scalars(db.insert(ResearchPaper).returning(ResearchPaper.id, sort_by_parameter_order=True), batch).all()
+        for paper_id, row in zip(ids, batch):
+            papers.append({"id": paper_id, "title": row["title"], "authors": row["authors"],
+                           "abstract": row["abstract"], "url": row["url"], "type": row["paper_type"]})
+    return papers, duplicates
+
+@app.route('/api/project/<int:project_id>/papers/import', methods=['POST'])
+def import_papers(project_id):
+    """Bulk-import papers from NDJSON, BibTeX or a list of arXiv ids.
+
+    The format is taken from ?format= (ndjson, bibtex, arxiv) or the body:
+    an application/x-ndjson or application/x-bibtex body, or a JSON body with
+    "arxiv_ids" or "papers". New papers are inserted in one transaction and
+    indexed in the background; duplicates and invalid entries are counted.
+    """
+    try:
+        project = ResearchProject.query.get_or_404(project_id)
+        import_format = request.args.get('format')
+        body = request.get_json(silent=True) if request.is_json else None
+        if import_format is None:
+            if request.mimetype == 'application/x-ndjson':
+                import_format = 'ndjson'
+            elif request.mimetype in ('application/x-bibtex', 'text/x-bibtex'):
+                import_format = 'bibtex'
+            elif body and 'arxiv_ids' in body:
+                import_format = 'arxiv'
+            elif body and 'papers' in body:
+                import_format = 'json'
+            else:
+                return jsonify({'error': 'Send NDJSON, BibTeX, or JSON with "arxiv_ids" or "papers"'}), 400
+        
+        try:
+            if import_format == 'ndjson':
+                entries, default_type = list(parse_ndjson(request.get_data(as_text=True))), 'import'
+            elif import_format == 'bibtex':
+                entries, default_type = list(parse_bibtex(request.get_data(as_text=True))), 'bibtex'
+            elif import_format == 'json':
+                entries, default_type = list(body['papers']), 'import'
+            elif import_format == 'arxiv':
+                ids = list(dict.fromkeys(arxiv_id(value) for value in body.get('arxiv_ids', [])))
+                if len(ids) > IMPORT_MAX_PAPERS:
+                    return jsonify({'error': f'At most {IMPORT_MAX_PAPERS} papers per import'}), 413
+                entries, default_type = list(paper_fetcher.fetch(ids)), 'arxiv'
+            else:
+                return jsonify({'error': f'Unknown import format: {import_format}'}), 400
+        except ValueError as e:
+            return jsonify({'error': f'Invalid {import_format} import: {str(e)}'}), 400
+        
+        if len(entries) > IMPORT_MAX_PAPERS:
+            return jsonify({'error': f'At most {IMPORT_MAX_PAPERS} papers per import'}), 413
+        
+        records, invalid = [], []
+        for number, entry in enumerate(entries, 1):
+            try:
+                records.append(paper_record(entry if isinstance(entry, dict) else {}, default_type))
+            except ValueError as e:
+                invalid.append({'entry': number, 'error': str(e)})
+        
+        papers, duplicates = bulk_insert_papers(project_id, records)
+        project.updated_at = utc_now()  # Use timezone-aware datetime
+        db.session.commit()
+        
+        if papers:
+            orchestrator.index_papers_in_background(project_id, papers)
+        
+        return jsonify({
+            'status': 'success',
+            'format': import_format,
+            'received': len(entries),
+            'imported': len(papers),
+            'duplicates': duplicates,
+            'invalid': len(invalid),
+            'errors': invalid[:100],
+            'paper_ids': [paper['id'] for paper in papers],
+            'indexing': 'queued' if papers else 'skipped'
+        })
         
     except Exception as e:
+        db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/project/<int:project_id>/papers/<int:paper_id>', methods=['DELETE'])
@@ -488,8 +1310,12 @@ def delete_paper(project_id, paper_id):
     """Delete a research paper"""
     try:
         paper = ResearchPaper.query.filter_by(id=paper_id, project_id=project_id).first_or_404()
+        removed_paper = paper_to_dict(paper)
         db.session.delete(paper)
         db.session.commit()
+        
+        # Drop the paper from the project's vector index as well
+        orchestrator.llamaindex.remove_papers(project_id, [removed_paper])
         flash('Paper deleted successfully!', 'success')
         return jsonify({'status': 'success', 'message': 'Paper deleted'})
         
@@ -559,4 +1385,6 @@ def from_json_filter(value):
 if __name__ == '__main__':
     with app.app_context():
         db.create_all()
+        create_missing_columns()
+        create_missing_indexes()
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,289 @@
+#!/usr/bin/env python
+# benchmarks/pipeline_benchmark.py - End-to-end latency and throughput benchmark of the Flask app
+"""Benchmark the pipeline through the Flask test client on the fake model backend.
+
+Covers complete pipeline runs (queued through the job workers), each single
+stage, the LlamaIndex query, Weaviate suggestion, export and dashboard
+routes, and batch throughput at N concurrent projects. Writes p50/p95/p99
+latencies, throughput and peak RSS as JSON; with --baseline the run is
+compared against an earlier result and exits non-zero on regressions.
+
+    python benchmarks/pipeline_benchmark.py --iterations 20 --concurrency 1 4 8 \\
+        --output bench.json --baseline previous.json
+
+All stores live in a temporary directory. MODEL_BACKEND defaults to "fake";
+FAKE_LLM_LATENCY and the other FAKE_* settings shape the fake models.
+"""
+import os
+import sys
+import json
+import math
+import time
+import logging
+import argparse
+import platform
+import resource
+import tempfile
+import subprocess
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Single stages in pipeline order, with the request body each one needs
+STAGE_CONFIGS = {
+    "research": {},
+    "connect": {"query": "attention mechanisms"},
+    "prototype": {"concept": "Sparse attention", "requirements": {"language": "python", "framework": "flask"}},
+    "test": {"prototype_code": "def attend(q, k, v):\n    return v", "requirements": {"testing_framework": "pytest"}},
+    "production": {"prototype_code": "def attend(q, k, v):\n    return v", "test_results": {"passed": 12, "failed": 0}}
+}
+
+def configure_environment(workdir: str, use_cache: bool):
+    """Point every store at the work directory and default to the fake model backend"""
+    os.environ.setdefault('MODEL_BACKEND', 'fake')
+    os.environ.update({
+        'DATABASE_URL': f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+        'STAGE_CACHE_PATH': os.path.join(workdir, 'stage_cache.db'),
+        'STAGE_CACHE_ENABLED': 'true' if use_cache else 'false',
+        'EMBEDDING_CACHE_PATH': os.path.join(workdir, 'embeddings.db'),
+        'LLAMAINDEX_STORAGE_DIR': os.path.join(workdir, 'llamaindex'),
+        'CREWAI_TASK_STORE': os.path.join(workdir, 'crewai_tasks.db'),
+        'COMET_OFFLINE_DIR': os.path.join(workdir, 'comet_offline'),
+        'COMET_SPOOL_PATH': os.path.join(workdir, 'comet_spool.jsonl'),
+        'TRACE_EXPORT_PATH': os.path.join(workdir, 'traces.jsonl')
+    })
+    os.environ.setdefault('PIPELINE_POLL_INTERVAL', '0.05')
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process so far"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Reported in bytes on macOS and kilobytes elsewhere
+    return round(peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024, 1)
+
+def percentile(samples, fraction: float) -> float:
+    """Nearest-rank percentile of a sorted list"""
+    return samples[max(0, math.ceil(fraction * len(samples)) - 1)]
+
+def summarize(samples, errors: int) -> dict:
+    """Latency percentiles in milliseconds"""
+    ordered = sorted(samples)
+    if not ordered:
+        return {"count": 0, "errors": errors}
+    return {
+        "count": len(ordered),
+        "errors": errors,
+        "p50_ms": round(percentile(ordered, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(ordered, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(ordered, 0.99) * 1000, 2),
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 2),
+        "max_ms": round(ordered[-1] * 1000, 2),
+        "peak_rss_mb": peak_rss_mb()
+    }
+
+def failed(response) -> bool:
+    if response.status_code >= 400:
+        return True
+    body = response.get_json(silent=True)
+    return isinstance(body, dict) and bool(body.get('error'))
+
+class PipelineBenchmark:
+    def __init__(self, app_module, papers_per_project: int, poll_interval: float, timeout: float):
+        self.app_module = app_module
+        self.client = app_module.app.test_client()
+        self.papers_per_project = papers_per_project
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+    
+    def create_project(self, index: int) -> int:
+        """Insert a project with synthetic papers and the default pipeline config"""
+        module = self.app_module
+        with module.app.app_context():
+            project = module.ResearchProject(
+                title=f"Benchmark project {index}",
+                description="Synthetic project for the pipeline benchmark",
+                pipeline_config=json.dumps({
+                    "prototype_requirements": {"language": "python", "framework": "flask", "features": ["api"]},
+                    "deployment_target": "docker",
+                    "ai_model": "gpt-3.5-turbo",
+                    "max_concepts": 20
+                })
+            )
+            module.db.session.add(project)
+            module.db.session.flush()
+            for paper in range(self.papers_per_project):
+                module.db.session.add(module.ResearchPaper(
+                    title=f"Paper {paper} of project {index}: efficient attention variant {paper}",
+                    authors="A. Author, B. Author",
+                    abstract=f"We study attention variant {paper} for project {index} and report "
+                             f"latency, memory and accuracy trade-offs on standard benchmarks.",
+                    project_id=project.id
+                ))
+            module.db.session.commit()
+            return project.id
+    
+    def wait_for(self, url: str, done) -> dict:
+        """Poll a status route until done(body) holds"""
+        deadline = time.perf_counter() + self.timeout
+        while time.perf_counter() < deadline:
+            body = self.client.get(url).get_json()
+            if done(body):
+                return body
+            time.sleep(self.poll_interval)
+        raise TimeoutError(f"Timed out waiting for {url}")
+    
+    def measure(self, name: str, iterations: int, call) -> dict:
+        """Time call(iteration) -> response over the given iterations"""
+        samples = []
+        errors = 0
+        for iteration in range(iterations):
+            start = time.perf_counter()
+            response = call(iteration)
+            samples.append(time.perf_counter() - start)
+            errors += failed(response)
+        summary = summarize(samples, errors)
+        logging.getLogger(__name__).warning(f"{name}: {summary}")
+        return summary
+    
+    def run_pipeline(self, project_id: int):
+        """Queue a forced pipeline run and wait for its job to finish"""
+        response = self.client.post(f'/api/pipeline/run/{project_id}', json={'force': True})
+        job_id = response.get_json()['job_id']
+        job = self.wait_for(f'/api/pipeline/jobs/{job_id}', lambda body: body['status'] not in ('queued', 'running'))
+        return response if job['status'] == 'completed' else self.client.get(f'/api/pipeline/jobs/{job_id}')
+    
+    def run_batch(self, concurrency: int) -> dict:
+        """Run one batch of fresh projects and report projects completed per second"""
+        project_ids = [self.create_project(1000 + concurrency * 100 + index) for index in range(concurrency)]
+        start = time.perf_counter()
+        response = self.client.post('/api/pipeline/batch', json={'project_ids': project_ids, 'force': True})
+        batch_id = response.get_json()['batch_id']
+        batch = self.wait_for(f'/api/pipeline/batch/{batch_id}', lambda body: body['status'] == 'finished')
+        elapsed = time.perf_counter() - start
+        return {
+            "projects": concurrency,
+            "elapsed_seconds": round(elapsed, 3),
+            "projects_per_second": round(concurrency / elapsed, 3),
+            "failed": batch['counts'].get('failed', 0),
+            "peak_rss_mb": peak_rss_mb()
+        }
+    
+    def run(self, iterations: int, concurrency_levels) -> dict:
+        with self.app_module.app.app_context():
+            self.app_module.db.create_all()
+        
+        # Warm up imports, agent pools and connections outside the measurements
+        warm_project = self.create_project(0)
+        self.run_pipeline(warm_project)
+        
+        project_ids = [self.create_project(index + 1) for index in range(iterations)]
+        scenarios = {
+            "pipeline": self.measure("pipeline", iterations, lambda i: self.run_pipeline(project_ids[i]))
+        }
+        
+        for stage, config in STAGE_CONFIGS.items():
+            scenarios[f"stage_{stage}"] = self.measure(
+                f"stage_{stage}", iterations,
+                lambda i, stage=stage, config=config: self.client.post(
+                    f'/api/pipeline/stage/{project_ids[i]}/{stage}', json={**config, 'force': True}
+                )
+            )
+        
+        scenarios["llamaindex_query"] = self.measure(
+            "llamaindex_query", iterations,
+            lambda i: self.client.post('/api/llamaindex/query', json={
+                'project_id': project_ids[i], 'query': 'Which attention variant is fastest?'
+            })
+        )
+        scenarios["weaviate_suggestions"] = self.measure(
+            "weaviate_suggestions", iterations,
+            lambda i: self.client.post('/api/weaviate/suggestions', json={
+                'project_id': project_ids[i], 'concept': 'efficient attention'
+            })
+        )
+        scenarios["export"] = self.measure(
+            "export", iterations, lambda i: self.client.get(f'/api/project/{project_ids[i]}/export')
+        )
+        scenarios["dashboard"] = self.measure("dashboard", iterations, lambda i: self.client.get('/'))
+        
+        throughput = {str(level): self.run_batch(level) for level in concurrency_levels}
+        return {"scenarios": scenarios, "throughput": throughput, "peak_rss_mb": peak_rss_mb()}
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """Scenarios whose p95 latency grew, or throughput fell, by more than tolerance"""
+    regressions = []
+    for name, summary in results["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if previous and previous.get("p95_ms") and summary.get("p95_ms") is not None:
+            if summary["p95_ms"] > previous["p95_ms"] * (1 + tolerance):
+                regressions.append(f"{name}: p95 {previous['p95_ms']}ms -> {summary['p95_ms']}ms")
+    for level, summary in results["throughput"].items():
+        previous = baseline.get("throughput", {}).get(level)
+        if previous and summary["projects_per_second"] < previous["projects_per_second"] * (1 - tolerance):
+            regressions.append(
+                f"throughput at {level} projects: {previous['projects_per_second']}/s -> {summary['projects_per_second']}/s"
+            )
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=10, help='requests per latency scenario')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 8],
+                        help='project counts for the batch throughput runs')
+    parser.add_argument('--papers', type=int, default=5, help='papers per benchmark project')
+    parser.add_argument('--cache', action='store_true', help='leave the stage result cache enabled')
+    parser.add_argument('--timeout', type=float, default=300, help='seconds to wait for a pipeline run')
+    parser.add_argument('--output', default='bench_results.json', help='where to write the JSON results')
+    parser.add_argument('--baseline', help='earlier results to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed relative slowdown before a regression')
+    args = parser.parse_args()
+    
+    workdir = tempfile.mkdtemp(prefix='r2p-bench-')
+    configure_environment(workdir, args.cache)
+    logging.basicConfig(level=logging.WARNING)
+    sys.path.insert(0, ROOT)
+    import app as app_module
+    
+    benchmark = PipelineBenchmark(app_module, args.papers, poll_interval=0.02, timeout=args.timeout)
+    results = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "settings": {
+            "iterations": args.iterations,
+            "papers_per_project": args.papers,
+            "stage_cache": args.cache,
+            **{key: value for key, value in os.environ.items()
+               if key == 'MODEL_BACKEND' or key.startswith('FAKE_') or key.endswith('_CONCURRENCY')
+               or key == 'PIPELINE_WORKERS'}
+        },
+        **benchmark.run(args.iterations, args.concurrency)
+    }
+    
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Wrote benchmark results to {args.output}")
+    
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions beyond {args.tolerance:.0%} against {args.baseline}")
+    
+    # Skip waiting on the app's background threads (job workers, health checks, Comet uploads)
+    sys.stdout.flush()
+    os._exit(0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+# services/batching.py - Shared backend concurrency limits and cross-project call batching
+import os
+import logging
+import threading
+from contextlib import contextmanager
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Any
+
+logger = logging.getLogger(__name__)
+
+# Default number of concurrent calls allowed per external backend
+DEFAULT_BACKEND_LIMITS = {
+    "llm": 4,
+    "weaviate": 8
+}
+
+class BackendLimiter:
+    """Process-wide concurrency limits for external backends.
+
+    Every pipeline run shares one limiter, so however many projects are in
+    flight at most ``limit`` calls hit a backend at once (configured with
+    LLM_CONCURRENCY and WEAVIATE_CONCURRENCY). Limits are thread semaphores
+    because each pipeline job runs in its own event loop. Comet is not
+    limited here: CometService writes from its own background thread.
+    """
+
+    def __init__(self, limits: Dict[str, int] = None):
+        if limits is None:
+            limits = {
+                backend: int(os.getenv(f'{backend.upper()}_CONCURRENCY', default))
+                for backend, default in DEFAULT_BACKEND_LIMITS.items()
+            }
+        self.limits = limits
+        self.semaphores = {backend: threading.BoundedSemaphore(limit) for backend, limit in limits.items()}
+        self.in_flight = {backend: 0 for backend in limits}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def slot(self, backend: str):
+        """Hold one of the backend's call slots (unknown backends are unlimited)"""
+        semaphore = self.semaphores.get(backend)
+        if semaphore is None:
+            yield
+            return
+
+        semaphore.acquire()
+        with self._lock:
+            self.in_flight[backend] += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.in_flight[backend] -= 1
+            semaphore.release()
+
+    def snapshot(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {
+                backend: {"limit": self.limits[backend], "in_flight": self.in_flight[backend]}
+                for backend in self.limits
+            }
+
+class MicroBatcher:
+    """Coalesces concurrent calls from different threads into one backend request.
+
+    ``submit(items)`` queues a caller's items and blocks until they are
+    flushed. The first caller of a window waits up to ``max_wait`` seconds (or
+    until ``max_batch`` items are pending) and then flushes every pending item
+    with a single ``flush_func(items)`` call, which must return one result per
+    item. Results are handed back to each caller in order.
+    """
+
+    def __init__(self, flush_func: Callable[[List[Any]], List[Any]], max_batch: int, max_wait: float):
+        self.flush_func = flush_func
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._pending = []
+        self._pending_size = 0
+        self._leader_active = False
+        self._full = threading.Event()
+        self._lock = threading.Lock()
+
+    def submit(self, items: List[Any]) -> List[Any]:
+        if not items:
+            return []
+
+        future = Future()
+        with self._lock:
+            self._pending.append((items, future))
+            self._pending_size += len(items)
+            leader = not self._leader_active
+            self._leader_active = True
+            if self._pending_size >= self.max_batch:
+                self._full.set()
+
+        if leader:
+            if self.max_wait > 0:
+                self._full.wait(self.max_wait)
+            with self._lock:
+                batch = self._pending
+                self._pending = []
+                self._pending_size = 0
+                self._leader_active = False
+                self._full.clear()
+            self._flush(batch)
+
+        return future.result()
+
+    def _flush(self, batch: List):
+        items = [item for request_items, _ in batch for item in request_items]
+        try:
+            results = self.flush_func(items)
+            if len(results) != len(items):
+                raise RuntimeError(f"Batch returned {len(results)} results for {len(items)} items")
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+
+        if len(batch) > 1:
+            logger.info(f"Co-batched {len(items)} items from {len(batch)} callers")
+
+        offset = 0
+        for request_items, future in batch:
+            future.set_result(results[offset:offset + len(request_items)])
+            offset += len(request_items)
@@ -5,19 +5,89 @@ import logging
 from typing import Dict, List, Any
 import json
 from datetime import datetime
+from services.model_backends import use_fake_models
+from services.telemetry_buffer import TelemetryBuffer
+from services.tracing import tracer
 
 logger = logging.getLogger(__name__)
 
+# Experiment calls that are queued and replayed by the background writer
+BUFFERED_CALLS = ("log_metric", "log_parameter", "log_text", "log_code", "log_image")
+
+class BufferedExperiment:
+    """Stands in for a stage's Comet experiment, queueing its log_* calls"""
+    
+    def __init__(self, buffer: TelemetryBuffer, project_id: int, stage: str):
+        self.buffer = buffer
+        self.project_id = project_id
+        self.stage = stage
+        self.dropped = 0
+    
+    def __getattr__(self, method: str):
+        if method not in BUFFERED_CALLS:
+            raise AttributeError(method)
+        
+        def queue_call(*args, **kwargs):
+            queued = self.buffer.put({
+                "project_id": self.project_id,
+                "stage": self.stage,
+                "method": method,
+                "args": list(args),
+                "kwargs": kwargs
+            })
+            self.dropped += not queued
+        return queue_call
+
 class CometService:
     def __init__(self):
         self.api_key = os.getenv('COMET_API_KEY')
         self.workspace = os.getenv('COMET_WORKSPACE')
         self.project_name = os.getenv('COMET_PROJECT_NAME', 'research-to-product-pipeline')
         self.experiments = {}
+        # Offline experiments are written to disk instead of the Comet API (default with fake models)
+        self.offline = os.getenv('COMET_OFFLINE', str(use_fake_models())).lower() == 'true'
+        self.offline_dir = os.getenv('COMET_OFFLINE_DIR', 'instance/comet_offline')
+        # Logging calls are queued and written by a background thread, so tracking never blocks a stage
+        self.buffer = TelemetryBuffer(
+            self._write_batch,
+            name="comet",
+            max_size=int(os.getenv('COMET_QUEUE_SIZE', 1000)),
+            batch_size=int(os.getenv('COMET_BATCH_SIZE', 50)),
+            flush_interval=float(os.getenv('COMET_FLUSH_INTERVAL', 1.0)),
+            drop_policy=os.getenv('COMET_DROP_POLICY', 'drop_oldest'),
+            spool_path=os.getenv('COMET_SPOOL_PATH', 'instance/comet_spool.jsonl'),
+            block_timeout=float(os.getenv('COMET_BLOCK_TIMEOUT', 0.05))
+        )
         
-    def create_experiment(self, project_id: int, stage: str) -> str:
-        """Create a new Comet experiment for tracking a project stage"""
-        try:
+    def ping(self) -> str:
+        """Check that the Comet API is reachable with the configured key"""
+        if self.offline:
+            return f"Offline, writing to {self.offline_dir}"
+        if not self.api_key:
+            raise RuntimeError("No API key")
+        comet_ml.API(api_key=self.api_key).get_workspaces()
+        return "API reachable"
+    
+    @staticmethod
+    def _log_present(experiment, metrics: Dict, names: Dict[str, str]):
+        """Log the metrics present in metrics, under their Comet names"""
+        for key, name in names.items():
+            if key in metrics:
+                value = metrics[key]
+                experiment.log_metric(name, int(value) if isinstance(value, bool) else value)
+    
+    def _open_experiment(self, project_id: int, stage: str):
+        """Open and register a stage's Comet experiment; errors propagate to the caller"""
+        if self.offline:
+            os.makedirs(self.offline_dir, exist_ok=True)
+            experiment = comet_ml.OfflineExperiment(
+                offline_directory=self.offline_dir,
+                workspace=self.workspace,
+                project_name=self.project_name,
+                auto_param_logging=False,
+                auto_metric_logging=False
+            )
+        else:
             experiment = comet_ml.Experiment(
                 api_key=self.api_key,
                 workspace=self.workspace,
@@ -25,31 +95,53 @@ class CometService:
                 auto_param_logging=False,
                 auto_metric_logging=False
             )
-            
-            experiment.set_name(f"Project_{project_id}_{stage}")
-            experiment.add_tag(f"project_{project_id}")
-            experiment.add_tag(stage)
-            experiment.add_tag("research-pipeline")
-            
-            experiment_key = experiment.get_key()
-            self.experiments[f"{project_id}_{stage}"] = experiment
-            
-            logger.info(f"Created Comet experiment {experiment_key} for project {project_id} stage {stage}")
-            return experiment_key
+        
+        experiment.set_name(f"Project_{project_id}_{stage}")
+        experiment.add_tag(f"project_{project_id}")
+        experiment.add_tag(stage)
+        experiment.add_tag("research-pipeline")
+        
+        self.experiments[f"{project_id}_{stage}"] = experiment
+        logger.info(f"Created Comet experiment {experiment.get_key()} for project {project_id} stage {stage}")
+        return experiment
+    
+    def create_experiment(self, project_id: int, stage: str) -> str:
+        """Create a new Comet experiment for tracking a project stage"""
+        try:
+            return self._open_experiment(project_id, stage).get_key()
             
         except Exception as e:
             logger.error(f"Error creating Comet experiment: {str(e)}")
             return None
     
+    def _write_batch(self, records: List[Dict]) -> List[Dict]:
+        """Apply queued experiment calls in order; returns the records that failed"""
+        failed = []
+        with tracer.span("comet.flush", records=len(records)) as span:
+            for record in records:
+                key = f"{record['project_id']}_{record['stage']}"
+                try:
+                    if record["method"] == "end":
+                        experiment = self.experiments.pop(key, None)
+                        if experiment is not None:
+                            experiment.end()
+                        continue
+                    
+                    experiment = self.experiments.get(key) or self._open_experiment(record["project_id"], record["stage"])
+                    getattr(experiment, record["method"])(*record["args"], **record["kwargs"])
+                except (TypeError, ValueError) as e:
+                    # A bad call fails the same way on every retry, so it is not spooled
+                    logger.error(f"Dropping Comet {record['method']} for {key}: {str(e)}")
+                except Exception as e:
+                    logger.error(f"Error writing Comet {record['method']} for {key}: {str(e)}")
+                    failed.append(record)
+            span.set(failed=len(failed))
+        return failed
+    
     def log_research_metrics(self, project_id: int, metrics: Dict) -> bool:
         """Log metrics from the research analysis stage"""
         try:
-            experiment_key = f"{project_id}_research"
-            
-            if experiment_key not in self.experiments:
-                self.create_experiment(project_id, "research")
-            
-            experiment = self.experiments[experiment_key]
+            experiment = BufferedExperiment(self.buffer, project_id, "research")
             
             # Log research-specific metrics
             experiment.log_metric("papers_indexed", metrics.get("papers_indexed", 0))
@@ -71,8 +163,8 @@ class CometService:
                 concepts_data = json.dumps(metrics["concepts"], indent=2)
                 experiment.log_text(concepts_data, name="extracted_concepts.json")
             
-            logger.info(f"Logged research metrics for project {project_id}")
-            return True
+            logger.info(f"Queued research metrics for project {project_id}")
+            return not experiment.dropped
             
         except Exception as e:
             logger.error(f"Error logging research metrics: {str(e)}")
@@ -81,12 +173,7 @@ class CometService:
     def log_prototype_metrics(self, project_id: int, metrics: Dict) -> bool:
         """Log metrics from the prototyping stage"""
         try:
-            experiment_key = f"{project_id}_prototype"
-            
-            if experiment_key not in self.experiments:
-                self.create_experiment(project_id, "prototype")
-            
-            experiment = self.experiments[experiment_key]
+            experiment = BufferedExperiment(self.buffer, project_id, "prototype")
             
             # Log prototype-specific metrics
             experiment.log_metric("development_time_hours", metrics.get("development_time", 0.0))
@@ -107,8 +194,8 @@ class CometService:
             if "architecture_diagram" in metrics:
                 experiment.log_image(metrics["architecture_diagram"], name="architecture.png")
             
-            logger.info(f"Logged prototype metrics for project {project_id}")
-            return True
+            logger.info(f"Queued prototype metrics for project {project_id}")
+            return not experiment.dropped
             
         except Exception as e:
             logger.error(f"Error logging prototype metrics: {str(e)}")
@@ -117,20 +204,20 @@ class CometService:
     def log_testing_metrics(self, project_id: int, metrics: Dict) -> bool:
         """Log metrics from the testing stage"""
         try:
-            experiment_key = f"{project_id}_testing"
-            
-            if experiment_key not in self.experiments:
-                self.create_experiment(project_id, "testing")
-            
-            experiment = self.experiments[experiment_key]
-            
-            # Log testing-specific metrics
-            experiment.log_metric("test_coverage", metrics.get("test_coverage", 0.0))
-            experiment.log_metric("tests_passed", metrics.get("tests_passed", 0))
-            experiment.log_metric("tests_failed", metrics.get("tests_failed", 0))
-            experiment.log_metric("performance_score", metrics.get("performance_score", 0.0))
-            experiment.log_metric("memory_usage_mb", metrics.get("memory_usage", 0.0))
-            experiment.log_metric("avg_response_time_ms", metrics.get("response_time", 0.0))
+            experiment = BufferedExperiment(self.buffer, project_id, "testing")
+            
+            # Log testing-specific metrics (only those measured; absent ones are not logged as zero)
+            self._log_present(experiment, metrics, {
+                "test_design_time": "test_design_time_seconds",
+                "tests_created": "tests_created",
+                "test_plan_chars": "test_plan_chars",
+                "llm_tokens": "llm_tokens",
+                "test_coverage": "test_coverage",
+                "tests_passed": "tests_passed",
+                "tests_failed": "tests_failed",
+                "memory_usage": "memory_usage_mb",
+                "response_time": "avg_response_time_ms"
+            })
             
             # Log parameters
             experiment.log_parameter("testing_framework", metrics.get("testing_framework", "pytest"))
@@ -145,8 +232,8 @@ class CometService:
                 for chart_name, chart_data in metrics["performance_charts"].items():
                     experiment.log_image(chart_data, name=f"{chart_name}.png")
             
-            logger.info(f"Logged testing metrics for project {project_id}")
-            return True
+            logger.info(f"Queued testing metrics for project {project_id}")
+            return not experiment.dropped
             
         except Exception as e:
             logger.error(f"Error logging testing metrics: {str(e)}")
@@ -155,19 +242,19 @@ class CometService:
     def log_production_metrics(self, project_id: int, metrics: Dict) -> bool:
         """Log metrics from the production deployment stage"""
         try:
-            experiment_key = f"{project_id}_production"
-            
-            if experiment_key not in self.experiments:
-                self.create_experiment(project_id, "production")
-            
-            experiment = self.experiments[experiment_key]
-            
-            # Log production-specific metrics
-            experiment.log_metric("deployment_time_minutes", metrics.get("deployment_time", 0.0))
-            experiment.log_metric("optimization_improvement", metrics.get("optimization_improvement", 0.0))
-            experiment.log_metric("scalability_score", metrics.get("scalability_score", 0.0))
-            experiment.log_metric("security_score", metrics.get("security_score", 0.0))
-            experiment.log_metric("monitoring_coverage", metrics.get("monitoring_coverage", 0.0))
+            experiment = BufferedExperiment(self.buffer, project_id, "production")
+            
+            # Log production-specific metrics (only those measured; absent ones are not logged as zero)
+            self._log_present(experiment, metrics, {
+                "deployment_time": "deployment_time_seconds",
+                "plan_created": "plan_created",
+                "plan_chars": "plan_chars",
+                "llm_tokens": "llm_tokens",
+                "optimization_improvement": "optimization_improvement",
+                "scalability_score": "scalability_score",
+                "security_score": "security_score",
+                "monitoring_coverage": "monitoring_coverage"
+            })
             
             # Log parameters
             experiment.log_parameter("deployment_platform", metrics.get("platform", "unknown"))
@@ -183,8 +270,8 @@ class CometService:
             if "monitoring_dashboard" in metrics:
                 experiment.log_image(metrics["monitoring_dashboard"], name="monitoring_dashboard.png")
             
-            logger.info(f"Logged production metrics for project {project_id}")
-            return True
+            logger.info(f"Queued production metrics for project {project_id}")
+            return not experiment.dropped
             
         except Exception as e:
             logger.error(f"Error logging production metrics: {str(e)}")
@@ -193,18 +280,17 @@ class CometService:
     def log_project_progression(self, project_id: int, progression_data: Dict) -> bool:
         """Log overall project progression metrics"""
         try:
-            experiment_key = f"{project_id}_progression"
-            
-            if experiment_key not in self.experiments:
-                self.create_experiment(project_id, "progression")
-            
-            experiment = self.experiments[experiment_key]
+            experiment = BufferedExperiment(self.buffer, project_id, "progression")
             
             # Log progression metrics
-            experiment.log_metric("total_project_time_days", progression_data.get("total_time", 0.0))
+            experiment.log_metric("total_project_time_seconds", progression_data.get("total_time", 0.0))
             experiment.log_metric("research_to_prototype_time", progression_data.get("research_to_prototype", 0.0))
             experiment.log_metric("prototype_to_production_time", progression_data.get("prototype_to_production", 0.0))
-            experiment.log_metric("overall_success_score", progression_data.get("success_score", 0.0))
+            self._log_present(experiment, progression_data, {"success_score": "overall_success_score"})
+            
+            # Log time spent per traced operation
+            for operation, totals in progression_data.get("time_by_operation", {}).items():
+                experiment.log_metric(f"time_ms.{operation}", totals["total_ms"])
             
             # Log stage completions
             for stage, completed in progression_data.get("stage_completions", {}).items():
@@ -215,8 +301,8 @@ class CometService:
                 timeline_data = json.dumps(progression_data["timeline"], indent=2)
                 experiment.log_text(timeline_data, name="project_timeline.json")
             
-            logger.info(f"Logged project progression for project {project_id}")
-            return True
+            logger.info(f"Queued project progression for project {project_id}")
+            return not experiment.dropped
             
         except Exception as e:
             logger.error(f"Error logging project progression: {str(e)}")
@@ -245,23 +331,20 @@ class CometService:
             return {}
     
     def get_project_dashboard_url(self, project_id: int) -> str:
-        """Get the Comet dashboard URL for a project"""
-        experiment_key = f"{project_id}_progression"
-        if experiment_key in self.experiments:
-            experiment = self.experiments[experiment_key]
+        """Get the Comet dashboard URL for a project, once its progression has been written"""
+        experiment = self.experiments.get(f"{project_id}_progression")
+        # Offline experiments have no URL until they are uploaded
+        if experiment is not None and not self.offline:
             return experiment.get_url()
         return None
     
     def close_experiments(self, project_id: int):
-        """Close all experiments for a project"""
+        """Close all experiments for a project, after their queued calls are written"""
         try:
             for stage in ["research", "prototype", "testing", "production", "progression"]:
-                exp_key = f"{project_id}_{stage}"
-                if exp_key in self.experiments:
-                    self.experiments[exp_key].end()
-                    del self.experiments[exp_key]
+                self.buffer.put({"project_id": project_id, "stage": stage, "method": "end", "args": [], "kwargs": {}})
             
-            logger.info(f"Closed all experiments for project {project_id}")
+            logger.info(f"Queued closing all experiments for project {project_id}")
             
         except Exception as e:
             logger.error(f"Error closing experiments: {str(e)}")
\ No newline at end of file
@@ -2,12 +2,125 @@
 from crewai import Agent, Task, Crew, Process
 from crewai.tools import BaseTool
 import os
+import queue
 import logging
+from contextlib import contextmanager
 from typing import Dict, List, Any
 import json
+import hashlib
+from services.task_stream import TaskStreamRegistry
+from services.task_registry import TaskRegistry
+from services.prompt_builder import PromptBuilder
+from services.task_graph import run_task_graph
+from services.model_backends import use_fake_models, crewai_llm
+from services.tracing import tracer, payload_size
 
 logger = logging.getLogger(__name__)
 
+# Task description templates, keyed by the task id prefix of each stage
+PROMPT_TEMPLATES = {
+    "research_analysis": """
+                Analyze the following research data for project {project_id}:
+                
+                Research Papers: {papers}
+                Research Concepts: {concepts}
+                
+                Please:
+                1. Identify the main research themes and methodologies
+                2. Extract key technical concepts that can be implemented
+                3. Assess the practical feasibility of each concept
+                4. Suggest potential applications and use cases
+                5. Recommend the best concepts for prototyping
+                """,
+    "prototyping": """
+                Create a prototype for the following concept from project {project_id}:
+                
+                Concept: {concept}
+                Requirements: {requirements}
+                
+                Please:
+                1. Design the architecture for the prototype
+                2. Create the main implementation code
+                3. Include necessary dependencies and setup instructions
+                4. Provide a simple example of how to use the prototype
+                5. Document any assumptions or limitations
+                """,
+    "testing": """
+                Design comprehensive tests for the prototype in project {project_id}:
+                
+                Prototype Code: {prototype_code}
+                Requirements: {requirements}
+                
+                Please:
+                1. Create unit tests for individual components
+                2. Design integration tests for the full system
+                3. Develop performance benchmarks
+                4. Create test data and scenarios
+                5. Propose a testing strategy and timeline
+                """,
+    "productionization": """
+                Prepare the prototype from project {project_id} for production deployment:
+                
+                Prototype Code: {prototype_code}
+                Test Results: {test_results}
+                
+                Please:
+                1. Suggest production architecture and infrastructure
+                2. Recommend optimization strategies
+                3. Design monitoring and logging solutions
+                4. Create deployment scripts and configurations
+                5. Plan rollback and disaster recovery procedures
+                """
+}
+
+# Expected output of each templated task
+EXPECTED_OUTPUTS = {
+    "research_analysis": 'Detailed analysis report with actionable insights',
+    "prototyping": 'Complete prototype with code, documentation, and usage examples',
+    "testing": 'Complete testing suite with test cases, benchmarks, and strategy',
+    "productionization": 'Production deployment plan with scripts, monitoring, and optimization strategies'
+}
+
+# Tasks of the collaborative full pipeline and the tasks whose output each one needs;
+# infrastructure planning only needs the prototypes, so it overlaps with test design
+FULL_PIPELINE_TASKS = [
+    {
+        "key": "research",
+        "agent": "research_analyst",
+        "description": "Analyze research data and extract key implementable concepts for project {project_id}",
+        "expected_output": 'List of prioritized concepts with implementation feasibility scores',
+        "depends_on": []
+    },
+    {
+        "key": "prototype",
+        "agent": "prototype_developer",
+        "description": "Take the top research concepts and create working prototypes",
+        "expected_output": 'Functional prototype code with documentation',
+        "depends_on": ["research"]
+    },
+    {
+        "key": "testing",
+        "agent": "testing_specialist",
+        "description": "Design and implement comprehensive tests for the prototypes",
+        "expected_output": 'Complete test suite with coverage analysis',
+        "depends_on": ["prototype"]
+    },
+    {
+        "key": "infrastructure",
+        "agent": "production_engineer",
+        "description": "Plan the production infrastructure, scaling, monitoring and deployment configuration for the prototypes",
+        "expected_output": 'Infrastructure and deployment configuration plan',
+        "depends_on": ["prototype"]
+    },
+    {
+        "key": "production",
+        "agent": "production_engineer",
+        "description": "Prepare prototypes for production deployment with optimization and monitoring",
+        "expected_output": 'Production-ready deployment plan and optimized code',
+        "depends_on": ["testing", "infrastructure"]
+    }
+]
+
 class ResearchAnalysisTool(BaseTool):
     name: str = "Research Analysis Tool"
     description: str = "Analyzes research papers and extracts key insights"
@@ -40,13 +153,43 @@ class ProductionizationTool(BaseTool):
         # Suggest production deployment
         return f"Production deployment strategy created"
 
-class CrewAIService:
-    def __init__(self):
-        self.setup_agents()
-        self.current_tasks = {}
-        
-    def setup_agents(self):
-        """Initialize CrewAI agents for different stages of the pipeline"""
+def token_usage(output) -> Dict:
+    """LLM token counts reported by a crew run"""
+    usage = getattr(output, "token_usage", None)
+    if usage is None:
+        return {}
+    return {
+        "total_tokens": usage.total_tokens,
+        "prompt_tokens": usage.prompt_tokens,
+        "completion_tokens": usage.completion_tokens,
+        "requests": usage.successful_requests
+    }
+
+def usage_since(output, baseline):
+    """Reduce a crew output's token usage to the run's own share.
+
+    Pooled agents keep their LLMs, whose usage counters run for the LLM's
+    lifetime, so the totals CrewAI reports include every earlier run;
+    baseline is ``crew.calculate_usage_metrics()`` taken before kickoff.
+    """
+    usage = getattr(output, "token_usage", None)
+    if usage is not None and baseline is not None:
+        output.token_usage = usage.delta_since(baseline)
+    return output
+
+class CrewSlot:
+    """One pre-warmed set of the four pipeline agents and their templated crews.
+
+    A slot is used by one call at a time; task descriptions are the prompt
+    templates and are filled in by ``Crew.kickoff(inputs=...)``.
+    """
+    
+    def __init__(self, stream: bool = False):
+        def model():
+            # None keeps CrewAI's default model; the fake backend supplies its own LLM.
+            # Each agent gets its own LLM, whose usage counters then cover only its runs
+            llm = crewai_llm()
+            return {"llm": llm} if llm is not None else {}
         
         # Research Analyst Agent
         self.research_analyst = Agent(
@@ -57,7 +200,7 @@ class CrewAIService:
             and practical applications from research papers.''',
             tools=[ResearchAnalysisTool()],
             verbose=True,
-            memory=True
+            **model()
         )
         
         # Prototype Developer Agent
@@ -69,7 +212,7 @@ class CrewAIService:
             into practical, working code implementations.''',
             tools=[PrototypingTool()],
             verbose=True,
-            memory=True
+            **model()
         )
         
         # Testing Specialist Agent
@@ -81,7 +224,7 @@ class CrewAIService:
             tests and integration tests.''',
             tools=[TestingTool()],
             verbose=True,
-            memory=True
+            **model()
         )
         
         # Production Engineer Agent
@@ -93,42 +236,154 @@ class CrewAIService:
             and deployment strategies.''',
             tools=[ProductionizationTool()],
             verbose=True,
-            memory=True
+            **model()
         )
+        
+        self.agents = [self.research_analyst, self.prototype_developer, self.testing_specialist, self.production_engineer]
+        self.crews = {
+            task_type: Crew(
+                agents=[agent],
+                tasks=[Task(
+                    description=PROMPT_TEMPLATES[task_type],
+                    agent=agent,
+                    expected_output=EXPECTED_OUTPUTS[task_type]
+                )],
+                process=Process.sequential,
+                stream=stream
+            )
+            for task_type, agent in [
+                ("research_analysis", self.research_analyst),
+                ("prototyping", self.prototype_developer),
+                ("testing", self.testing_specialist),
+                ("productionization", self.production_engineer)
+            ]
+        }
+    
+    def bind_memory(self, memory):
+        """Point every agent at the memory scope of the project being served"""
+        for agent in self.agents:
+            agent.memory = memory
+
+class CrewAIService:
+    def __init__(self, retriever=None):
+        # CrewAI agents default to the model named by OPENAI_MODEL_NAME
+        self.model_name = os.getenv('OPENAI_MODEL_NAME', 'default')
+        if use_fake_models():
+            # Keep stage cache entries of fake runs apart from real ones
+            self.model_name = f"fake-{self.model_name}"
+        # Task inputs are fitted to a token budget; retriever(project_id, query, top_k)
+        # supplies passages when a project's papers do not fit
+        self.prompts = PromptBuilder(retriever, model_name=os.getenv('OPENAI_MODEL_NAME'))
+        # Stream tokens and agent steps of running tasks to per-task buffers
+        self.streaming = os.getenv('CREWAI_STREAMING', 'true').lower() == 'true'
+        self.streams = TaskStreamRegistry()
+        self.setup_agents()
+        self.tasks = TaskRegistry()
+    
+    def prompt_fingerprint(self, task_type: str) -> str:
+        """Identify the model, prompt template and prompt budget used for a task type"""
+        template = PROMPT_TEMPLATES.get(task_type, "")
+        return (f"{self.model_name}:{hashlib.sha256(template.encode('utf-8')).hexdigest()[:16]}:"
+                f"{self.prompts.fingerprint()}")
+        
+    def setup_agents(self):
+        """Pre-warm a pool of agent sets and templated crews for the pipeline stages"""
+        self.memory = None
+        if use_fake_models():
+            # Memory would call the remote embedder and LLM
+            logger.info("CrewAI memory disabled with the fake model backend")
+        else:
+            try:
+                from crewai.memory import Memory
+                # One memory store; each call sees only its project's scope
+                self.memory = Memory()
+            except Exception as e:
+                logger.warning(f"CrewAI memory unavailable, agents will run without memory: {str(e)}")
+        
+        # Each pipeline worker runs up to two crews at once (analysis alongside prototyping)
+        default_size = int(os.getenv('PIPELINE_WORKERS', 2)) * 2
+        self.pool_size = int(os.getenv('CREWAI_POOL_SIZE', default_size))
+        # Seconds a caller waits for a free agent set before giving up
+        self.pool_timeout = float(os.getenv('CREWAI_POOL_TIMEOUT', 600))
+        self.pool = queue.Queue()
+        for _ in range(self.pool_size):
+            self.pool.put(CrewSlot(stream=self.streaming))
+        logger.info(f"Pre-warmed {self.pool_size} CrewAI agent sets")
+    
+    @contextmanager
+    def checkout(self, project_id: int):
+        """Borrow a pooled agent set, scoping its agents' memory to the project.
+
+        Raises TimeoutError if no agent set is returned within pool_timeout
+        seconds, so a leaked slot or an oversubscribed pool fails the call
+        instead of holding its worker and backend slot forever.
+        """
+        try:
+            slot = self.pool.get(timeout=self.pool_timeout)
+        except queue.Empty:
+            raise TimeoutError(
+                f"No CrewAI agent set became free within {self.pool_timeout:g}s "
+                f"(pool of {self.pool_size}; see CREWAI_POOL_SIZE and CREWAI_POOL_TIMEOUT)"
+            )
+        try:
+            slot.bind_memory(self.memory.scope(f"/project/{project_id}") if self.memory is not None else None)
+            yield slot
+        finally:
+            self.pool.put(slot)
+    
+    def _kickoff(self, project_id: int, task_type: str, **inputs):
+        """Run a templated single-agent crew from the pool, returning (task_id, output).
+
+        The run is recorded in the task registry under a new task id, and while
+        it runs its tokens and agent steps are appended to that id's stream.
+        """
+        task_id = self.tasks.start(project_id, task_type)
+        stream = self.streams.open(task_id)
+        try:
+            with tracer.span("crew.kickoff", task_type=task_type, task_id=task_id,
+                             input_bytes=payload_size(inputs)) as span:
+                with self.checkout(project_id) as slot:
+                    crew = slot.crews[task_type]
+                    crew.step_callback = stream.add_step
+                    baseline = crew.calculate_usage_metrics()
+                    output = crew.kickoff(inputs={"project_id": project_id, **inputs})
+                    if self.streaming:
+                        for chunk in output:
+                            stream.add_chunk(chunk)
+                        output = output.result
+                    usage_since(output, baseline)
+                span.set(output_bytes=len(str(output)), **token_usage(output))
+        except Exception as e:
+            stream.close("failed")
+            self.tasks.finish(task_id, "failed", error=str(e))
+            raise
+        
+        stream.close("completed")
+        self.tasks.finish(task_id, "completed", output)
+        return task_id, output
+    
+    def ping(self) -> str:
+        """Report agent readiness (the LLM itself is probed by the LlamaIndex check)"""
+        return (f"{self.pool.qsize()}/{self.pool_size} agent sets idle, "
+                f"{len(self.tasks.active())} running tasks")
     
     def analyze_research(self, project_id: int, research_data: Dict) -> Dict:
         """Have the research analyst analyze research papers"""
         try:
-            task = Task(
-                description=f"""
-                Analyze the following research data for project {project_id}:
-                
-                Research Papers: {json.dumps(research_data.get('papers', []), indent=2)}
-                Research Concepts: {json.dumps(research_data.get('concepts', []), indent=2)}
-                
-                Please:
-                1. Identify the main research themes and methodologies
-                2. Extract key technical concepts that can be implemented
-                3. Assess the practical feasibility of each concept
-                4. Suggest potential applications and use cases
-                5. Recommend the best concepts for prototyping
-                """,
-                agent=self.research_analyst,
-                expected_output='Detailed analysis report with actionable insights'
+            task_id, result = self._kickoff(
+                project_id, "research_analysis",
+                **self.prompts.build(
+                    "research_analysis", project_id,
+                    papers=research_data.get('papers', []),
+                    concepts=research_data.get('concepts', [])
+                )
             )
             
-            crew = Crew(agents=[self.research_analyst], tasks=[task], process=Process.sequential)
-            result = crew.kickoff()
-            
-            self.current_tasks[f"research_analysis_{project_id}"] = {
-                "status": "completed",
-                "result": result
-            }
-            
             return {
-                "task_id": f"research_analysis_{project_id}",
+                "task_id": task_id,
                 "status": "completed",
-                "result": result
+                "result": result,
+                "token_usage": token_usage(result)
             }
             
         except Exception as e:
@@ -138,36 +393,16 @@ class CrewAIService:
     def create_prototype(self, project_id: int, concept: str, requirements: Dict) -> Dict:
         """Have the prototype developer create a prototype"""
         try:
-            task = Task(
-                description=f"""
-                Create a prototype for the following concept from project {project_id}:
-                
-                Concept: {concept}
-                Requirements: {json.dumps(requirements, indent=2)}
-                
-                Please:
-                1. Design the architecture for the prototype
-                2. Create the main implementation code
-                3. Include necessary dependencies and setup instructions
-                4. Provide a simple example of how to use the prototype
-                5. Document any assumptions or limitations
-                """,
-                agent=self.prototype_developer,
-                expected_output='Complete prototype with code, documentation, and usage examples'
+            task_id, result = self._kickoff(
+                project_id, "prototyping",
+                **self.prompts.build("prototyping", project_id, concept=concept, requirements=requirements)
             )
             
-            crew = Crew(agents=[self.prototype_developer], tasks=[task], process=Process.sequential)
-            result = crew.kickoff()
-            
-            self.current_tasks[f"prototyping_{project_id}"] = {
-                "status": "completed",
-                "result": result
-            }
-            
             return {
-                "task_id": f"prototyping_{project_id}",
+                "task_id": task_id,
                 "status": "completed",
-                "result": result
+                "result": result,
+                "token_usage": token_usage(result)
             }
             
         except Exception as e:
@@ -177,36 +412,16 @@ class CrewAIService:
     def design_tests(self, project_id: int, prototype_code: str, requirements: Dict) -> Dict:
         """Have the testing specialist design tests for the prototype"""
         try:
-            task = Task(
-                description=f"""
-                Design comprehensive tests for the prototype in project {project_id}:
-                
-                Prototype Code: {prototype_code[:500]}... (truncated)
-                Requirements: {json.dumps(requirements, indent=2)}
-                
-                Please:
-                1. Create unit tests for individual components
-                2. Design integration tests for the full system
-                3. Develop performance benchmarks
-                4. Create test data and scenarios
-                5. Propose a testing strategy and timeline
-                """,
-                agent=self.testing_specialist,
-                expected_output='Complete testing suite with test cases, benchmarks, and strategy'
+            task_id, result = self._kickoff(
+                project_id, "testing",
+                **self.prompts.build("testing", project_id, prototype_code=prototype_code, requirements=requirements)
             )
             
-            crew = Crew(agents=[self.testing_specialist], tasks=[task], process=Process.sequential)
-            result = crew.kickoff()
-            
-            self.current_tasks[f"testing_{project_id}"] = {
-                "status": "completed",
-                "result": result
-            }
-            
             return {
-                "task_id": f"testing_{project_id}",
+                "task_id": task_id,
                 "status": "completed",
-                "result": result
+                "result": result,
+                "token_usage": token_usage(result)
             }
             
         except Exception as e:
@@ -216,95 +431,94 @@ class CrewAIService:
     def productionize(self, project_id: int, prototype_code: str, test_results: Dict) -> Dict:
         """Have the production engineer prepare the prototype for production"""
         try:
-            task = Task(
-                description=f"""
-                Prepare the prototype from project {project_id} for production deployment:
-                
-                Prototype Code: {prototype_code[:500]}... (truncated)
-                Test Results: {json.dumps(test_results, indent=2)}
-                
-                Please:
-                1. Suggest production architecture and infrastructure
-                2. Recommend optimization strategies
-                3. Design monitoring and logging solutions
-                4. Create deployment scripts and configurations
-                5. Plan rollback and disaster recovery procedures
-                """,
-                agent=self.production_engineer,
-                expected_output='Production deployment plan with scripts, monitoring, and optimization strategies'
+            task_id, result = self._kickoff(
+                project_id, "productionization",
+                **self.prompts.build("productionization", project_id, prototype_code=prototype_code, test_results=test_results)
             )
             
-            crew = Crew(agents=[self.production_engineer], tasks=[task], process=Process.sequential)
-            result = crew.kickoff()
-            
-            self.current_tasks[f"productionization_{project_id}"] = {
-                "status": "completed",
-                "result": result
-            }
-            
             return {
-                "task_id": f"productionization_{project_id}",
+                "task_id": task_id,
                 "status": "completed",
-                "result": result
+                "result": result,
+                "token_usage": token_usage(result)
             }
             
         except Exception as e:
             logger.error(f"Error in productionization: {str(e)}")
             return {"error": str(e)}
     
-    def collaborate_full_pipeline(self, project_id: int, research_data: Dict) -> Dict:
-        """Run a collaborative session with all agents for the full pipeline"""
-        try:
-            # Create tasks for each agent
-            research_task = Task(
-                description=f"Analyze research data and extract key implementable concepts for project {project_id}",
-                agent=self.research_analyst,
-                expected_output='List of prioritized concepts with implementation feasibility scores'
-            )
-            
-            prototype_task = Task(
-                description="Take the top research concepts and create working prototypes",
-                agent=self.prototype_developer,
-                expected_output='Functional prototype code with documentation',
-                dependencies=[research_task]
-            )
-            
-            testing_task = Task(
-                description="Design and implement comprehensive tests for the prototypes",
-                agent=self.testing_specialist,
-                expected_output='Complete test suite with coverage analysis',
-                dependencies=[prototype_task]
-            )
-            
-            production_task = Task(
-                description="Prepare prototypes for production deployment with optimization and monitoring",
-                agent=self.production_engineer,
-                expected_output='Production-ready deployment plan and optimized code',
-                dependencies=[testing_task]
+    def _run_graph_task(self, slot: CrewSlot, project_id: int, stream, task: Dict, dependency_outputs: Dict) -> Any:
+        """Run one task of the full pipeline as a single-agent crew, given its dependencies' output"""
+        description = task["description"].format(project_id=project_id)
+        if dependency_outputs:
+            # Each upstream output gets an equal share of the prompt budget
+            share = self.prompts.budget // len(dependency_outputs)
+            context = "\n\n".join(
+                f"Output of the {key} task:\n{self.prompts.truncate(str(output), share)}"
+                for key, output in dependency_outputs.items()
             )
-            
-            # Create crew with all agents
+            description = f"{description}\n\n{context}"
+        
+        agent = getattr(slot, task["agent"])
+        with tracer.span("crew.kickoff", task_type=task["key"], input_bytes=len(description)) as span:
             crew = Crew(
-                agents=[self.research_analyst, self.prototype_developer, 
-                       self.testing_specialist, self.production_engineer],
-                tasks=[research_task, prototype_task, testing_task, production_task],
+                agents=[agent],
+                tasks=[Task(description=description, agent=agent, expected_output=task["expected_output"])],
                 process=Process.sequential,
-                memory=True,
-                verbose=2
+                step_callback=stream.add_step,
+                stream=self.streaming
             )
+            baseline = crew.calculate_usage_metrics()
+            output = crew.kickoff()
+            if self.streaming:
+                for chunk in output:
+                    stream.add_chunk(chunk)
+                output = output.result
+            usage_since(output, baseline)
+            span.set(output_bytes=len(str(output)), **token_usage(output))
+        return output
+    
+    def collaborate_full_pipeline(self, project_id: int, research_data: Dict, mode: str = None) -> Dict:
+        """Run a collaborative session with all agents for the full pipeline.
+        
+        In "dag" mode (the default, CREWAI_PIPELINE_MODE) every task starts as
+        soon as the tasks it depends on have finished, so independent tasks run
+        concurrently; "sequential" runs them one at a time in declared order.
+        The result reports each task's wall time and the critical path.
+        """
+        mode = mode or os.getenv('CREWAI_PIPELINE_MODE', 'dag')
+        try:
+            task_id = self.tasks.start(project_id, "full_pipeline")
+            stream = self.streams.open(task_id)
             
-            # Execute the full pipeline
-            result = crew.kickoff()
+            # Agents come from the pool; memory is scoped to this project
+            with self.checkout(project_id) as slot:
+                try:
+                    report = run_task_graph(
+                        FULL_PIPELINE_TASKS,
+                        lambda task, dependency_outputs: self._run_graph_task(
+                            slot, project_id, stream, task, dependency_outputs
+                        ),
+                        max_workers=1 if mode == "sequential" else None
+                    )
+                except Exception as e:
+                    stream.close("failed")
+                    self.tasks.finish(task_id, "failed", error=str(e))
+                    raise
             
-            self.current_tasks[f"full_pipeline_{project_id}"] = {
-                "status": "completed",
-                "result": result
-            }
+            result = report.pop("outputs")
+            stream.close("completed")
+            self.tasks.finish(task_id, "completed", result["production"])
+            logger.info(f"Full pipeline for project {project_id} ({mode}) took {report['total_seconds']}s, "
+                        f"critical path {' -> '.join(report['critical_path'])}")
             
             return {
-                "task_id": f"full_pipeline_{project_id}",
+                "task_id": task_id,
                 "status": "completed",
-                "result": result
+                "result": result["production"],
+                "task_results": result,
+                "mode": mode,
+                **report
             }
             
         except Exception as e:
@@ -312,9 +526,17 @@ class CrewAIService:
             return {"error": str(e)}
     
     def get_task_status(self, task_id: str) -> Dict:
-        """Get the status of a specific task"""
-        return self.current_tasks.get(task_id, {"status": "not found"})
+        """Get the status (and stored result) of a task run or its legacy alias"""
+        return self.tasks.get(task_id, include_result=True) or {"status": "not found"}
+    
+    def get_task_stream(self, task_id: str):
+        """Get the output stream of a task run or its legacy alias"""
+        return self.streams.get(self.tasks.resolve(task_id))
     
     def list_active_tasks(self) -> List[str]:
-        """List all active tasks"""
-        return list(self.current_tasks.keys())
\ No newline at end of file
+        """List all running tasks"""
+        return self.tasks.active()
+    
+    def list_project_tasks(self, project_id: int) -> List[Dict]:
+        """List a project's recent task runs, newest first"""
+        return self.tasks.project_tasks(project_id)
\ No newline at end of file
@@ -0,0 +1,56 @@
+# services/database.py - Engine settings for the app database: SQLite WAL tuning or a pooled server database
+import os
+import logging
+import sqlite3
+from typing import Dict
+
+logger = logging.getLogger(__name__)
+
+def database_url() -> str:
+    """DATABASE_URL, with the legacy postgres:// scheme rewritten for SQLAlchemy"""
+    url = os.getenv('DATABASE_URL', 'sqlite:///research_pipeline.db')
+    if url.startswith('postgres://'):
+        url = 'postgresql://' + url[len('postgres://'):]
+    return url
+
+def is_sqlite(url: str) -> bool:
+    return url.startswith('sqlite')
+
+def engine_options(url: str) -> Dict:
+    """SQLALCHEMY_ENGINE_OPTIONS for the configured database.
+    
+    SQLite waits on a locked database instead of failing at once (busy
+    timeout, in seconds here; the pragma below sets the same in ms). Server
+    databases get a bounded pool whose connections are checked before use and
+    recycled before idle timeouts on the server or a proxy close them.
+    """
+    if is_sqlite(url):
+        return {'connect_args': {'timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', 5000)) / 1000}}
+    
+    return {
+        'pool_size': int(os.getenv('DB_POOL_SIZE', 10)),
+        'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', 20)),
+        'pool_timeout': float(os.getenv('DB_POOL_TIMEOUT', 30)),
+        'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', 1800)),
+        'pool_pre_ping': True
+    }
+
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    """Engine "connect" listener: WAL journal so readers never block the writer.
+    
+    synchronous=NORMAL is durable across application crashes in WAL mode and
+    only fsyncs at checkpoints, which makes the many small commits of
+    pipeline jobs and status updates cheap.
+    """
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute(f"PRAGMA busy_timeout={int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', 5000))}")
+        cursor.execute(f"PRAGMA journal_mode={os.getenv('SQLITE_JOURNAL_MODE', 'WAL')}")
+        cursor.execute(f"PRAGMA synchronous={os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL')}")
+    except sqlite3.Error as e:
+        logger.error(f"Error setting SQLite pragmas: {str(e)}")
+    finally:
+        cursor.close()
@@ -0,0 +1,157 @@
+# services/embedding_service.py - Shared OpenAI embedding layer with a persistent cache
+import os
+import hashlib
+import logging
+import threading
+from typing import List, Dict
+import numpy as np
+from services.local_store import connect_sqlite
+from services.batching import MicroBatcher
+from services.model_backends import use_fake_models, embedding_client
+from services.tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+class EmbeddingService:
+    """Embeds text for both LlamaIndex and Weaviate.
+
+    Vectors are cached in SQLite as float32 blobs keyed by (model, text hash),
+    so text seen in any project or run is only embedded once. Cache misses are
+    sent to the API in batches of ``batch_size`` texts per request; misses
+    from concurrent callers (e.g. projects in one batch run) arriving within
+    ``batch_wait`` seconds are combined into the same requests.
+    """
+
+    def __init__(self, model_name: str = None, cache_path: str = None, batch_size: int = None,
+                 batch_wait: float = None):
+        self.model_name = model_name or os.getenv('EMBEDDING_MODEL', 'text-embedding-ada-002')
+        self.cache_path = cache_path or os.getenv('EMBEDDING_CACHE_PATH', 'instance/embeddings.db')
+        self.batch_size = batch_size or int(os.getenv('EMBEDDING_BATCH_SIZE', 100))
+        if batch_wait is None:
+            batch_wait = float(os.getenv('EMBEDDING_BATCH_WAIT', 0.02))
+        self.batcher = MicroBatcher(self._embed_all, max_batch=self.batch_size, max_wait=batch_wait)
+        self.client = None
+        self.conn = None
+        self.service_available = False
+        self._lock = threading.Lock()
+        
+        self._initialize()
+    
+    def _initialize(self):
+        """Create the embedding client (OpenAI, or the fake backend) and open the vector cache"""
+        try:
+            if use_fake_models():
+                # Fake vectors are cached apart from the real model's
+                self.model_name = f"fake-{self.model_name}"
+            elif not os.getenv('OPENAI_API_KEY'):
+                logger.warning("OpenAI API key not found. Embedding service will not work.")
+                return
+            
+            self.client = embedding_client()
+            self.service_available = True
+            
+        except Exception as e:
+            logger.error(f"Error initializing embedding client: {str(e)}")
+            return
+        
+        try:
+            self.conn = connect_sqlite(self.cache_path)
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS embeddings (
+                    model TEXT NOT NULL,
+                    text_hash TEXT NOT NULL,
+                    vector BLOB NOT NULL,
+                    PRIMARY KEY (model, text_hash)
+                ) WITHOUT ROWID
+            """)
+            self.conn.commit()
+        except Exception as e:
+            logger.error(f"Error opening embedding cache at {self.cache_path}: {str(e)}")
+            self.conn = None
+    
+    @staticmethod
+    def text_hash(text: str) -> str:
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+    
+    def _lookup(self, hashes: List[str]) -> Dict[str, np.ndarray]:
+        """Fetch cached vectors for the given text hashes"""
+        if self.conn is None or not hashes:
+            return {}
+        
+        found = {}
+        with self._lock:
+            # Stay under SQLite's bound-parameter limit
+            for start in range(0, len(hashes), 500):
+                chunk = hashes[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self.conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({placeholders})",
+                    [self.model_name, *chunk]
+                ).fetchall()
+                for text_hash, blob in rows:
+                    found[text_hash] = np.frombuffer(blob, dtype=np.float32)
+        return found
+    
+    def _store(self, vectors: Dict[str, np.ndarray]):
+        """Write newly computed vectors to the cache"""
+        if self.conn is None or not vectors:
+            return
+        
+        try:
+            with self._lock:
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO embeddings (model, text_hash, vector) VALUES (?, ?, ?)",
+                    [(self.model_name, text_hash, vector.tobytes()) for text_hash, vector in vectors.items()]
+                )
+                self.conn.commit()
+        except Exception as e:
+            logger.error(f"Error writing embedding cache: {str(e)}")
+    
+    def _embed_batch(self, texts: List[str]) -> List[np.ndarray]:
+        """Embed one batch of texts with a single API request"""
+        with tracer.span("embeddings.request", model=self.model_name, texts=len(texts),
+                         text_chars=sum(len(text) for text in texts)) as span:
+            response = self.client.embeddings.create(model=self.model_name, input=texts)
+            usage = getattr(response, 'usage', None)
+            if usage is not None:
+                span.set(prompt_tokens=usage.prompt_tokens)
+        data = sorted(response.data, key=lambda item: item.index)
+        return [np.asarray(item.embedding, dtype=np.float32) for item in data]
+    
+    def _embed_all(self, texts: List[str]) -> List[np.ndarray]:
+        """Embed any number of texts in requests of at most batch_size"""
+        # Co-batched callers may miss on the same text
+        unique = list(dict.fromkeys(texts))
+        embeddings = {}
+        for start in range(0, len(unique), self.batch_size):
+            batch = unique[start:start + self.batch_size]
+            embeddings.update(zip(batch, self._embed_batch(batch)))
+        return [embeddings[text] for text in texts]
+    
+    def embed_texts(self, texts: List[str]) -> List[List[float]]:
+        """Embed texts, serving repeats from the cache"""
+        if not self.service_available:
+            raise RuntimeError("Embedding service not available")
+        
+        hashes = [self.text_hash(text) for text in texts]
+        vectors = self._lookup(list(dict.fromkeys(hashes)))
+        
+        # Embed each distinct uncached text once
+        missing = {}
+        for text_hash, text in zip(hashes, texts):
+            if text_hash not in vectors:
+                missing.setdefault(text_hash, text)
+        
+        embeddings = self.batcher.submit(list(missing.values()))
+        computed = dict(zip(missing.keys(), embeddings))
+        
+        if computed:
+            self._store(computed)
+            vectors.update(computed)
+            logger.info(f"Embedded {len(computed)} texts ({len(texts) - len(computed)} served from cache)")
+        
+        return [vectors[text_hash].tolist() for text_hash in hashes]
+    
+    def embed_text(self, text: str) -> List[float]:
+        """Embed a single text"""
+        return self.embed_texts([text])[0]
@@ -0,0 +1,85 @@
+# services/event_bus.py - In-process pub/sub for pipeline progress events
+import os
+import queue
+import itertools
+import threading
+from collections import deque
+from datetime import datetime, timezone
+from typing import Dict, List
+
+class EventBus:
+    """Fans out per-project progress events to subscribers (e.g. SSE streams).
+
+    Each subscriber gets a bounded queue; when a slow subscriber's queue is
+    full its oldest event is dropped so publishers never block. The events of
+    a project's current run are kept so a new subscriber can catch up.
+    """
+
+    def __init__(self, max_queue_size: int = None, history_size: int = None):
+        self.max_queue_size = max_queue_size or int(os.getenv('EVENT_QUEUE_SIZE', 256))
+        self.history_size = history_size or int(os.getenv('EVENT_HISTORY_SIZE', 100))
+        self.subscribers = {}
+        self.history = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+    
+    def publish(self, project_id: int, event_type: str, **data) -> Dict:
+        """Publish an event to every subscriber of a project"""
+        event = {
+            "id": next(self._ids),
+            "type": event_type,
+            "project_id": project_id,
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "data": data
+        }
+        
+        with self._lock:
+            history = self.history.setdefault(project_id, deque(maxlen=self.history_size))
+            if event_type == "pipeline_started":
+                # Replay only covers the current run
+                history.clear()
+            history.append(event)
+            subscribers = list(self.subscribers.get(project_id, ()))
+        
+        for subscriber in subscribers:
+            self._offer(subscriber, event)
+        return event
+    
+    def _offer(self, subscriber: queue.Queue, event: Dict):
+        while True:
+            try:
+                subscriber.put_nowait(event)
+                return
+            except queue.Full:
+                try:
+                    subscriber.get_nowait()
+                except queue.Empty:
+                    pass
+    
+    def subscribe(self, project_id: int, last_event_id: int = None) -> queue.Queue:
+        """Subscribe to a project's events, replaying recorded events after last_event_id"""
+        subscriber = queue.Queue(maxsize=self.max_queue_size)
+        with self._lock:
+            for event in self.history.get(project_id, ()):
+                if last_event_id is None or event["id"] > last_event_id:
+                    self._offer(subscriber, event)
+            self.subscribers.setdefault(project_id, set()).add(subscriber)
+        return subscriber
+    
+    def unsubscribe(self, project_id: int, subscriber: queue.Queue):
+        with self._lock:
+            subscribers = self.subscribers.get(project_id)
+            if subscribers is not None:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self.subscribers[project_id]
+    
+    def recent(self, project_id: int) -> List[Dict]:
+        """Events recorded for a project's current run"""
+        with self._lock:
+            return list(self.history.get(project_id, ()))
+    
+    def forget(self, project_id: int):
+        """Drop the recorded events of a deleted project"""
+        with self._lock:
+            self.history.pop(project_id, None)
@@ -0,0 +1,69 @@
+# services/export_stream.py - Incremental JSON/NDJSON encoding and compression for streamed exports
+import os
+import json
+import zlib
+import logging
+from typing import Any, Iterable, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Content codings in order of preference when the client accepts several equally
+SUPPORTED_ENCODINGS = ("zstd", "gzip") if zstandard is not None else ("gzip",)
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """Pick a content coding from an Accept-Encoding header, or None for identity"""
+    accepted = {}
+    for part in (accept_encoding or "").split(","):
+        coding, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if coding:
+            accepted[coding.strip().lower()] = quality
+    
+    best, best_quality = None, 0.0
+    for coding in SUPPORTED_ENCODINGS:
+        quality = accepted.get(coding, accepted.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = coding, quality
+    return best
+
+def compress_chunks(chunks: Iterable[str], encoding: Optional[str]) -> Iterator[bytes]:
+    """Encode and compress text chunks as they arrive; the compressor holds at most one block"""
+    if encoding is None:
+        for chunk in chunks:
+            yield chunk.encode("utf-8")
+        return
+    
+    if encoding == "zstd":
+        compressor = zstandard.ZstdCompressor(level=int(os.getenv('EXPORT_ZSTD_LEVEL', 3))).compressobj()
+    else:
+        # wbits=31 writes a gzip header and trailer
+        compressor = zlib.compressobj(int(os.getenv('EXPORT_GZIP_LEVEL', 6)), zlib.DEFLATED, 31)
+    
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode("utf-8"))
+        if data:
+            yield data
+    yield compressor.flush()
+
+def json_array_chunks(items: Iterable[Any]) -> Iterator[str]:
+    """A JSON array written one element at a time"""
+    yield "["
+    for index, item in enumerate(items):
+        yield ("," if index else "") + json.dumps(item, default=str)
+    yield "]"
+
+def ndjson_chunks(record_type: str, items: Iterable[dict]) -> Iterator[str]:
+    """One JSON line per item, tagged with its record type"""
+    for item in items:
+        yield json.dumps({"type": record_type, **item}, default=str) + "\n"
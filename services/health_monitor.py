@@ -0,0 +1,118 @@
+# services/health_monitor.py - Background health probing for pipeline components
+import os
+import time
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from datetime import datetime, timezone
+from typing import Dict, Callable
+
+logger = logging.getLogger(__name__)
+
+class HealthMonitor:
+    """Probes each component on a schedule and keeps the last known state.
+
+    A probe is a callable returning a details string, raising on failure.
+    Probes run concurrently with a timeout; a probe that is still hanging from
+    a previous round is not started again. Readers only ever get the cached
+    snapshot, so they never wait on a slow backend.
+    """
+
+    def __init__(self, probes: Dict[str, Callable[[], str]], interval: float = None,
+                 timeout: float = None, history_size: int = None):
+        self.probes = probes
+        self.interval = interval or float(os.getenv('HEALTH_CHECK_INTERVAL', 30))
+        self.timeout = timeout or float(os.getenv('HEALTH_CHECK_TIMEOUT', 5))
+        history_size = history_size or int(os.getenv('HEALTH_HISTORY_SIZE', 20))
+        
+        self.components = {
+            name: {"status": "unknown", "details": "Not checked yet", "latency_ms": None, "checked_at": None}
+            for name in probes
+        }
+        self.history = {name: deque(maxlen=history_size) for name in probes}
+        self.executor = ThreadPoolExecutor(max_workers=len(probes) or 1, thread_name_prefix='health-probe')
+        self.in_flight = {}
+        self.thread = None
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+    
+    def start(self):
+        """Start the background probe loop (idempotent)"""
+        if self.thread is not None:
+            return
+        with self._lock:
+            if self.thread is not None:
+                return
+            self.thread = threading.Thread(target=self._loop, name="health-monitor", daemon=True)
+            self.thread.start()
+    
+    def stop(self):
+        self._stopping.set()
+    
+    def _loop(self):
+        while not self._stopping.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error(f"Error probing component health: {str(e)}")
+            self._stopping.wait(self.interval)
+    
+    def _timed_probe(self, probe: Callable[[], str]):
+        start = time.perf_counter()
+        details = probe()
+        return details, (time.perf_counter() - start) * 1000
+    
+    def run_once(self):
+        """Probe every component once, waiting at most ``timeout`` seconds"""
+        started = {}
+        for name, probe in self.probes.items():
+            pending = self.in_flight.get(name)
+            if pending is not None and not pending.done():
+                self._record(name, "unhealthy", "Previous probe still running", None)
+                continue
+            started[name] = self.in_flight[name] = self.executor.submit(self._timed_probe, probe)
+        
+        deadline = time.monotonic() + self.timeout
+        for name, future in started.items():
+            try:
+                details, latency_ms = future.result(timeout=max(0.0, deadline - time.monotonic()))
+                self._record(name, "healthy", details, latency_ms)
+            except TimeoutError:
+                self._record(name, "unhealthy", f"Timed out after {self.timeout:g}s", None)
+            except Exception as e:
+                self._record(name, "unhealthy", str(e), None)
+    
+    def _record(self, name: str, status: str, details: str, latency_ms):
+        checked_at = datetime.now(timezone.utc).isoformat()
+        with self._lock:
+            self.components[name] = {
+                "status": status,
+                "details": details,
+                "latency_ms": round(latency_ms, 2) if latency_ms is not None else None,
+                "checked_at": checked_at
+            }
+            self.history[name].append({"checked_at": checked_at, "status": status, "latency_ms": latency_ms})
+    
+    def snapshot(self) -> Dict:
+        """Last known health of every component"""
+        with self._lock:
+            components = {}
+            for name, state in self.components.items():
+                latencies = [entry["latency_ms"] for entry in self.history[name] if entry["latency_ms"] is not None]
+                components[name] = {
+                    **state,
+                    "avg_latency_ms": round(sum(latencies) / len(latencies), 2) if latencies else None,
+                    "history": list(self.history[name])
+                }
+        
+        health = {"status": "healthy", "components": components}
+        
+        unhealthy_components = [name for name, state in components.items() if state["status"] == "unhealthy"]
+        if unhealthy_components:
+            health["status"] = "degraded"
+            health["issues"] = f"Unhealthy components: {', '.join(unhealthy_components)}"
+        elif any(state["status"] == "unknown" for state in components.values()):
+            health["status"] = "unknown"
+        
+        return health
@@ -0,0 +1,117 @@
+# services/job_queue.py - Bounded worker pool for durable pipeline jobs
+import os
+import logging
+import threading
+from typing import Callable, Any, List, Optional
+
+logger = logging.getLogger(__name__)
+
+class JobWorkerPool:
+    """Fixed-size pool of worker threads that drain a durable job queue.
+
+    The pool does not own the queue itself: ``claim_job`` atomically claims the
+    next queued job (returning ``None`` when there is nothing to do) and
+    ``run_job`` executes it. This keeps the storage (the SQLAlchemy job table)
+    in the Flask app and the scheduling here.
+
+    While jobs run, a heartbeat thread passes their ids to ``heartbeat`` every
+    ``heartbeat_interval`` seconds, so the store can keep their leases alive
+    and hand jobs of a dead worker or process to another one.
+    """
+
+    def __init__(self, claim_job: Callable[[], Optional[Any]], run_job: Callable[[Any], None],
+                 max_workers: int = None, poll_interval: float = None,
+                 heartbeat: Callable[[List[Any]], None] = None, heartbeat_interval: float = None):
+        self.claim_job = claim_job
+        self.run_job = run_job
+        self.max_workers = max_workers or int(os.getenv('PIPELINE_WORKERS', 2))
+        self.poll_interval = poll_interval or float(os.getenv('PIPELINE_POLL_INTERVAL', 2.0))
+        self.heartbeat = heartbeat
+        self.heartbeat_interval = heartbeat_interval or float(os.getenv('PIPELINE_HEARTBEAT_INTERVAL', 30.0))
+        self.workers = []
+        self.running = set()
+        self._heartbeat_thread = None
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+        self._running_lock = threading.Lock()
+
+    def start(self):
+        """Start the worker threads (idempotent)"""
+        if self.workers:
+            return
+        with self._lock:
+            if self.workers:
+                return
+            self._stopping.clear()
+            for i in range(self.max_workers):
+                worker = threading.Thread(
+                    target=self._worker_loop,
+                    name=f"pipeline-worker-{i}",
+                    daemon=True
+                )
+                worker.start()
+                self.workers.append(worker)
+            if self.heartbeat is not None:
+                self._heartbeat_thread = threading.Thread(
+                    target=self._heartbeat_loop,
+                    name="pipeline-heartbeat",
+                    daemon=True
+                )
+                self._heartbeat_thread.start()
+            logger.info(f"Started {self.max_workers} pipeline workers")
+
+    def notify(self):
+        """Wake idle workers because a new job was enqueued"""
+        self._wakeup.set()
+
+    def stop(self, timeout: float = None):
+        """Ask workers to exit once their current job finishes"""
+        self._stopping.set()
+        self._wakeup.set()
+        with self._lock:
+            for worker in self.workers:
+                worker.join(timeout)
+            self.workers = []
+            if self._heartbeat_thread is not None:
+                self._heartbeat_thread.join(timeout)
+                self._heartbeat_thread = None
+
+    def is_running(self) -> bool:
+        return bool(self.workers)
+
+    def _worker_loop(self):
+        while not self._stopping.is_set():
+            try:
+                job = self.claim_job()
+            except Exception as e:
+                logger.error(f"Error claiming pipeline job: {str(e)}")
+                job = None
+
+            if job is None:
+                # Sleep until notified or until the next poll (jobs may have been
+                # enqueued by another process sharing the database)
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                continue
+
+            with self._running_lock:
+                self.running.add(job)
+            try:
+                self.run_job(job)
+            except Exception as e:
+                logger.error(f"Error running pipeline job {job}: {str(e)}")
+            finally:
+                with self._running_lock:
+                    self.running.discard(job)
+
+    def _heartbeat_loop(self):
+        while not self._stopping.wait(self.heartbeat_interval):
+            with self._running_lock:
+                running = list(self.running)
+            if not running:
+                continue
+            try:
+                self.heartbeat(running)
+            except Exception as e:
+                logger.error(f"Error renewing pipeline job leases: {str(e)}")
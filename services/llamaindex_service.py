@@ -1,19 +1,66 @@
 # services/llamaindex_service_simple.py - Simplified LlamaIndex service
 import os
+import shutil
+import hashlib
 import logging
+import threading
 from typing import List, Dict, Any
+from services.model_backends import use_fake_models, llamaindex_llm
+from services.tracing import tracer
 
 logger = logging.getLogger(__name__)
 
+# Query used to pull the main concepts out of a project's index
+CONCEPT_QUERY = "What are the main concepts, techniques, and methods discussed in these research papers?"
+
+def paper_doc_id(paper: Dict) -> str:
+    """Stable document id derived from a paper's title, authors and abstract"""
+    content = "\x1f".join(str(paper.get(field) or '') for field in ('title', 'authors', 'abstract'))
+    return f"paper-{hashlib.sha256(content.encode('utf-8')).hexdigest()[:32]}"
+
+def make_cached_embedding(base_class, embedding_service):
+    """Wrap the shared EmbeddingService as a LlamaIndex embedding model"""
+    
+    class CachedEmbedding(base_class):
+        def _get_query_embedding(self, query: str) -> List[float]:
+            return embedding_service.embed_text(query)
+        
+        async def _aget_query_embedding(self, query: str) -> List[float]:
+            return embedding_service.embed_text(query)
+        
+        def _get_text_embedding(self, text: str) -> List[float]:
+            return embedding_service.embed_text(text)
+        
+        def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+            return embedding_service.embed_texts(texts)
+    
+    return CachedEmbedding(
+        model_name=embedding_service.model_name,
+        embed_batch_size=embedding_service.batch_size
+    )
+
 class LlamaIndexService:
-    def __init__(self):
+    def __init__(self, embedding_service=None):
         """Initialize LlamaIndex service with fallback handling"""
         self.llm = None
         self.embed_model = None
+        self.embedding_service = embedding_service
+        self.model_name = os.getenv('LLAMAINDEX_MODEL', 'gpt-3.5-turbo')
+        if use_fake_models():
+            # Keep stage cache entries of fake runs apart from real ones
+            self.model_name = f"fake-{self.model_name}"
         self.indices = {}
         self.documents_cache = {}
         self.service_available = False
         
+        # Indexes are persisted per project and loaded lazily on first use
+        self.storage_dir = os.getenv('LLAMAINDEX_STORAGE_DIR', 'instance/llamaindex')
+        # Documents chunked and embedded together when indexing many papers at once
+        self.insert_batch_size = int(os.getenv('LLAMAINDEX_INSERT_BATCH_SIZE', 256))
+        self.loaded_versions = {}
+        self._storage_lock = threading.RLock()
+        self._index_locks = {}
+        
         # Try to initialize LlamaIndex
         self._initialize_llama_index()
     
@@ -21,7 +68,7 @@ class LlamaIndexService:
         """Initialize LlamaIndex with version detection"""
         try:
             # Check if OpenAI API key is available
-            if not os.getenv('OPENAI_API_KEY'):
+            if not use_fake_models() and not os.getenv('OPENAI_API_KEY'):
                 logger.warning("OpenAI API key not found. LlamaIndex will not work.")
                 return
             
@@ -29,15 +76,18 @@ class LlamaIndexService:
             try:
                 # New API (0.9+)
                 from llama_index.core import VectorStoreIndex, Document, Settings
+                from llama_index.core import StorageContext, load_index_from_storage
+                from llama_index.core.embeddings import BaseEmbedding
                 from llama_index.embeddings.openai import OpenAIEmbedding
-                from llama_index.llms.openai import OpenAI
                 
                 # Configure settings
-                Settings.llm = OpenAI(model="gpt-3.5-turbo", temperature=0.1)
-                Settings.embed_model = OpenAIEmbedding()
+                Settings.llm = llamaindex_llm(self.model_name)
+                Settings.embed_model = self._embedding_model(BaseEmbedding, OpenAIEmbedding)
                 
                 self.VectorStoreIndex = VectorStoreIndex
                 self.Document = Document
+                self.StorageContext = StorageContext
+                self.load_index_from_storage = load_index_from_storage
                 self.use_settings = True
                 self.service_available = True
                 logger.info("Initialized LlamaIndex with new API (v0.9+)")
@@ -46,11 +96,13 @@ class LlamaIndexService:
                 # Old API (0.8.x)
                 try:
                     from llama_index import VectorStoreIndex, Document, ServiceContext
+                    from llama_index import StorageContext, load_index_from_storage
                     from llama_index.embeddings import OpenAIEmbedding
+                    from llama_index.embeddings.base import BaseEmbedding
                     from llama_index.llms import OpenAI
                     
-                    self.llm = OpenAI(model="gpt-3.5-turbo", temperature=0.1)
-                    self.embed_model = OpenAIEmbedding()
+                    self.llm = OpenAI(model=self.model_name, temperature=0.1)
+                    self.embed_model = self._embedding_model(BaseEmbedding, OpenAIEmbedding)
                     self.service_context = ServiceContext.from_defaults(
                         llm=self.llm,
                         embed_model=self.embed_model
@@ -58,6 +110,8 @@ class LlamaIndexService:
                     
                     self.VectorStoreIndex = VectorStoreIndex
                     self.Document = Document
+                    self.StorageContext = StorageContext
+                    self.load_index_from_storage = load_index_from_storage
                     self.use_settings = False
                     self.service_available = True
                     logger.info("Initialized LlamaIndex with old API (v0.8.x)")
@@ -70,6 +124,23 @@ class LlamaIndexService:
             logger.error(f"Error initializing LlamaIndex: {str(e)}")
             self.service_available = False
     
+    def _embedding_model(self, base_class, default_class):
+        """Use the shared cached embedder when available, else LlamaIndex's own"""
+        if self.embedding_service and self.embedding_service.service_available:
+            return make_cached_embedding(base_class, self.embedding_service)
+        return default_class()
+    
+    def ping(self) -> str:
+        """Check that the LLM backend is reachable without generating tokens"""
+        if not self.service_available:
+            raise RuntimeError("LlamaIndex not initialized")
+        if use_fake_models():
+            return f"LLM {self.model_name} is local"
+        
+        from openai import OpenAI
+        OpenAI(max_retries=0).models.retrieve(self.model_name)
+        return f"LLM {self.model_name} reachable"
+    
     def create_index(self, project_id: int):
         """Create a new index for a project"""
         if not self.service_available:
@@ -88,7 +159,7 @@ class LlamaIndexService:
                     service_context=self.service_context
                 )
             
-            self.documents_cache[project_id] = []
+            self.documents_cache[project_id] = {}
             logger.info(f"Created index for project {project_id}")
             return True
             
@@ -96,77 +167,299 @@ class LlamaIndexService:
             logger.error(f"Error creating index: {str(e)}")
             return False
     
-    def index_papers(self, project_id: int, papers: List[Dict]):
-        """Index research papers"""
+    def _project_dir(self, project_id: int) -> str:
+        return os.path.join(self.storage_dir, f"project_{project_id}")
+    
+    def _stored_version(self, project_id: int):
+        """Modification time of a project's persisted index, or None"""
+        try:
+            return os.path.getmtime(os.path.join(self._project_dir(project_id), "docstore.json"))
+        except OSError:
+            return None
+    
+    def _persist(self, project_id: int):
+        """Write a project's index to its storage directory.
+
+        The index is written to a temporary directory and swapped in, so other
+        worker processes never load a half-written index.
+        """
+        with self._storage_lock:
+            try:
+                project_dir = self._project_dir(project_id)
+                tmp_dir = f"{project_dir}.tmp"
+                old_dir = f"{project_dir}.old"
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+                self.indices[project_id].storage_context.persist(persist_dir=tmp_dir)
+                
+                if os.path.exists(project_dir):
+                    shutil.rmtree(old_dir, ignore_errors=True)
+                    os.rename(project_dir, old_dir)
+                os.rename(tmp_dir, project_dir)
+                shutil.rmtree(old_dir, ignore_errors=True)
+                
+                self.loaded_versions[project_id] = self._stored_version(project_id)
+                
+            except Exception as e:
+                logger.error(f"Error persisting index for project {project_id}: {str(e)}")
+    
+    def _load(self, project_id: int) -> bool:
+        """Load a project's index from disk"""
+        with self._storage_lock:
+            try:
+                version = self._stored_version(project_id)
+                if version is None:
+                    return False
+                
+                storage_context = self.StorageContext.from_defaults(persist_dir=self._project_dir(project_id))
+                if self.use_settings:
+                    index = self.load_index_from_storage(storage_context)
+                else:
+                    index = self.load_index_from_storage(storage_context, service_context=self.service_context)
+                
+                self.indices[project_id] = index
+                # Documents themselves are not kept in memory for loaded indexes
+                self.documents_cache[project_id] = {doc_id: None for doc_id in index.ref_doc_info}
+                self.loaded_versions[project_id] = version
+                logger.info(f"Loaded index for project {project_id} from {self._project_dir(project_id)}")
+                return True
+                
+            except Exception as e:
+                logger.error(f"Error loading index for project {project_id}: {str(e)}")
+                return False
+    
+    def _get_index(self, project_id: int):
+        """Return a project's index, loading it from disk if needed.
+
+        An index already in memory is reloaded when another process has
+        persisted a newer version.
+        """
+        if project_id in self.indices:
+            stored = self._stored_version(project_id)
+            if stored is None or stored <= (self.loaded_versions.get(project_id) or 0):
+                return self.indices[project_id]
+        
+        self._load(project_id)
+        return self.indices.get(project_id)
+    
+    def has_index(self, project_id: int) -> bool:
+        """Whether a project has an index in memory or on disk"""
+        return project_id in self.indices or self._stored_version(project_id) is not None
+    
+    def delete_index(self, project_id: int):
+        """Drop a project's index from memory and disk"""
+        with self._storage_lock:
+            self.indices.pop(project_id, None)
+            self.documents_cache.pop(project_id, None)
+            self.loaded_versions.pop(project_id, None)
+            shutil.rmtree(self._project_dir(project_id), ignore_errors=True)
+    
+    def _build_document(self, paper: Dict, doc_id: str):
+        """Create a LlamaIndex document for a paper"""
+        text_parts = []
+        
+        if paper.get('title'):
+            text_parts.append(f"Title: {paper['title']}")
+        
+        if paper.get('authors'):
+            text_parts.append(f"Authors: {paper['authors']}")
+        
+        if paper.get('abstract'):
+            text_parts.append(f"Abstract: {paper['abstract']}")
+        elif paper.get('title'):
+            # If no abstract, use title as content
+            text_parts.append(f"Content: {paper['title']}")
+        
+        text_content = "\n\n".join(text_parts)
+        
+        return self.Document(
+            text=text_content,
+            id_=doc_id,
+            metadata={
+                'title': paper.get('title', ''),
+                'authors': paper.get('authors', ''),
+                'url': paper.get('url', ''),
+                'source': paper.get('type', 'manual')
+            }
+        )
+    
+    def _insert_documents(self, index, documents: List):
+        """Insert documents a batch at a time, so a bulk import's chunks are embedded in large requests.
+
+        This is what ``index.insert`` does for one document; indexes without
+        the new API's transformations fall back to inserting one at a time.
+        """
+        transformations = getattr(index, '_transformations', None)
+        if not self.use_settings or transformations is None:
+            for doc in documents:
+                index.insert(doc)
+            return
+        
+        from llama_index.core.ingestion import run_transformations
+        for start in range(0, len(documents), self.insert_batch_size):
+            batch = documents[start:start + self.insert_batch_size]
+            index.insert_nodes(run_transformations(batch, transformations))
+            for doc in batch:
+                index.docstore.set_document_hash(doc.id_, doc.hash)
+    
+    def _rebuild_index(self, project_id: int, documents: List):
+        """Recreate a project's index from scratch"""
+        if self.use_settings:
+            self.indices[project_id] = self.VectorStoreIndex.from_documents(documents)
+        else:
+            self.indices[project_id] = self.VectorStoreIndex.from_documents(
+                documents, 
+                service_context=self.service_context
+            )
+    
+    def index_papers(self, project_id: int, papers: List[Dict], prune: bool = False):
+        """Incrementally index research papers.
+
+        Papers already in the index (same title, authors and abstract) are
+        skipped, so only new or changed papers are embedded. With ``prune`` the
+        given papers are treated as the project's full set and documents for
+        papers no longer present are removed.
+        """
         if not self.service_available:
             logger.warning(f"LlamaIndex not available. Mock indexing {len(papers)} papers")
             return len(papers)
         
-        try:
-            if project_id not in self.indices:
-                self.create_index(project_id)
-            
-            documents = []
-            
-            for paper in papers:
-                # Create text content from paper
-                text_parts = []
+        with self._index_lock(project_id):
+            try:
+                if self._get_index(project_id) is None:
+                    self.create_index(project_id)
                 
-                if paper.get('title'):
-                    text_parts.append(f"Title: {paper['title']}")
+                indexed = self.documents_cache.setdefault(project_id, {})
+                incoming = {paper_doc_id(paper): paper for paper in papers}
                 
-                if paper.get('authors'):
-                    text_parts.append(f"Authors: {paper['authors']}")
+                stale_ids = [doc_id for doc_id in indexed if doc_id not in incoming] if prune else []
+                for doc_id in stale_ids:
+                    self._delete_document(project_id, doc_id)
                 
-                if paper.get('abstract'):
-                    text_parts.append(f"Abstract: {paper['abstract']}")
-                elif paper.get('title'):
-                    # If no abstract, use title as content
-                    text_parts.append(f"Content: {paper['title']}")
+                documents = [
+                    self._build_document(paper, doc_id)
+                    for doc_id, paper in incoming.items()
+                    if doc_id not in indexed
+                ]
                 
-                text_content = "\n\n".join(text_parts)
+                # Add documents to index
+                index = self.indices[project_id]
                 
-                # Create document
-                doc = self.Document(
-                    text=text_content,
-                    metadata={
-                        'title': paper.get('title', ''),
-                        'authors': paper.get('authors', ''),
-                        'url': paper.get('url', ''),
-                        'source': paper.get('type', 'manual')
-                    }
+                # Try to insert documents
+                try:
+                    with tracer.span("llamaindex.insert", documents=len(documents),
+                                     text_chars=sum(len(doc.text) for doc in documents)):
+                        self._insert_documents(index, documents)
+                except Exception:
+                    # Fallback: recreate index with all documents
+                    self._rebuild_index(project_id, self._cached_documents(project_id) + documents)
+                
+                # Update cache
+                for doc in documents:
+                    indexed[doc.id_] = doc
+                
+                if documents or stale_ids:
+                    self._persist(project_id)
+                
+                logger.info(
+                    f"Indexed {len(documents)} new documents for project {project_id} "
+                    f"({len(incoming) - len(documents)} unchanged, {len(stale_ids)} removed)"
                 )
-                documents.append(doc)
-            
-            # Add documents to index
-            index = self.indices[project_id]
+                return len(incoming)
             
-            # Try to insert documents
+            except Exception as e:
+                logger.error(f"Error indexing papers: {str(e)}")
+                self._discard(project_id)
+                return 0
+    
+    def _delete_document(self, project_id: int, doc_id: str):
+        """Remove one document from a project's index"""
+        indexed = self.documents_cache.get(project_id, {})
+        index = self.indices.get(project_id)
+        if index is not None:
             try:
-                for doc in documents:
-                    index.insert(doc)
+                index.delete_ref_doc(doc_id, delete_from_docstore=True)
             except Exception:
-                # Fallback: recreate index with all documents
-                all_docs = self.documents_cache.get(project_id, []) + documents
-                if self.use_settings:
-                    self.indices[project_id] = self.VectorStoreIndex.from_documents(all_docs)
-                else:
-                    self.indices[project_id] = self.VectorStoreIndex.from_documents(
-                        all_docs, 
-                        service_context=self.service_context
-                    )
-            
-            # Update cache
-            if project_id not in self.documents_cache:
-                self.documents_cache[project_id] = []
-            self.documents_cache[project_id].extend(documents)
-            
-            logger.info(f"Indexed {len(documents)} documents for project {project_id}")
-            return len(documents)
-            
-        except Exception as e:
-            logger.error(f"Error indexing papers: {str(e)}")
+                # Fallback: recreate index without the document
+                indexed.pop(doc_id, None)
+                self._rebuild_index(project_id, self._cached_documents(project_id))
+        indexed.pop(doc_id, None)
+    
+    def _index_lock(self, project_id: int):
+        """Lock serializing changes to one project's index (pipeline runs and background imports)"""
+        with self._storage_lock:
+            return self._index_locks.setdefault(project_id, threading.RLock())
+    
+    def _cached_documents(self, project_id: int) -> List:
+        """Every document of a project's index, for rebuilding it.
+
+        Documents of an index loaded from disk are not kept in memory and are
+        recovered from its docstore. Raises RuntimeError when one cannot be, so
+        a rebuild never replaces the stored index with a partial one.
+        """
+        documents = self.documents_cache.get(project_id, {})
+        index = self.indices.get(project_id)
+        for doc_id, doc in list(documents.items()):
+            if doc is None:
+                doc = self._stored_document(index, doc_id) if index is not None else None
+                if doc is None:
+                    raise RuntimeError(f"Cannot rebuild index for project {project_id}: document {doc_id} not in its docstore")
+                documents[doc_id] = doc
+        return list(documents.values())
+    
+    def _stored_document(self, index, doc_id: str):
+        """A document of a loaded index, from its docstore or reassembled from its chunks (None if neither)"""
+        document = index.docstore.get_document(doc_id, raise_error=False)
+        if document is not None:
+            return document
+        
+        info = index.docstore.get_ref_doc_info(doc_id)
+        if info is None or not info.node_ids:
+            return None
+        nodes = sorted(index.docstore.get_nodes(info.node_ids), key=lambda node: node.start_char_idx or 0)
+        text = ""
+        for node in nodes:
+            start = node.start_char_idx
+            if start is None or start > len(text):
+                # Chunk offsets unknown or not contiguous; the text cannot be recovered exactly
+                return None
+            text += node.text[len(text) - start:]
+        return self.Document(text=text, id_=doc_id, metadata=info.metadata or nodes[0].metadata)
+    
+    def _discard(self, project_id: int):
+        """Drop a project's in-memory index after a failed change; the stored copy is loaded on next use"""
+        with self._storage_lock:
+            self.indices.pop(project_id, None)
+            self.documents_cache.pop(project_id, None)
+            self.loaded_versions.pop(project_id, None)
+    
+    def remove_papers(self, project_id: int, papers: List[Dict]) -> int:
+        """Remove papers from a project's index"""
+        if not self.service_available:
             return 0
+        
+        with self._index_lock(project_id):
+            try:
+                if self._get_index(project_id) is None:
+                    return 0
+                
+                indexed = self.documents_cache.get(project_id, {})
+                removed = 0
+                for paper in papers:
+                    doc_id = paper_doc_id(paper)
+                    if doc_id in indexed:
+                        self._delete_document(project_id, doc_id)
+                        removed += 1
+                
+                if removed:
+                    self._persist(project_id)
+                
+                logger.info(f"Removed {removed} documents from project {project_id}")
+                return removed
+            
+            except Exception as e:
+                logger.error(f"Error removing papers: {str(e)}")
+                self._discard(project_id)
+                return 0
     
     def query_research(self, project_id: int, query: str, top_k: int = 5):
         """Query the indexed research papers"""
@@ -183,11 +476,10 @@ class LlamaIndexService:
             }
         
         try:
-            if project_id not in self.indices:
+            index = self._get_index(project_id)
+            if index is None:
                 return {"error": "No index found for this project. Please index some papers first."}
             
-            index = self.indices[project_id]
-            
             # Create query engine
             if self.use_settings:
                 query_engine = index.as_query_engine(similarity_top_k=top_k)
@@ -198,7 +490,9 @@ class LlamaIndexService:
                 )
             
             # Query the index
-            response = query_engine.query(query)
+            with tracer.span("llamaindex.query", top_k=top_k, query_chars=len(query)) as span:
+                response = query_engine.query(query)
+                span.set(response_chars=len(str(response)), source_nodes=len(getattr(response, 'source_nodes', None) or []))
             
             # Extract source nodes
             source_nodes = []
@@ -224,6 +518,30 @@ class LlamaIndexService:
             logger.error(f"Error querying research: {str(e)}")
             return {"error": str(e)}
     
+    def retrieve_passages(self, project_id: int, query: str, top_k: int = 8) -> List[Dict]:
+        """Retrieve the passages most similar to a query (no LLM call)"""
+        if not self.service_available:
+            return []
+        
+        try:
+            index = self._get_index(project_id)
+            if index is None:
+                return []
+            
+            nodes = index.as_retriever(similarity_top_k=top_k).retrieve(query)
+            return [
+                {
+                    "title": (node.metadata or {}).get('title', ''),
+                    "text": node.text,
+                    "score": node.score
+                }
+                for node in nodes
+            ]
+        
+        except Exception as e:
+            logger.error(f"Error retrieving passages: {str(e)}")
+            return []
+    
     def extract_concepts(self, project_id: int, limit: int = 20):
         """Extract key concepts from the indexed papers"""
         if not self.service_available:
@@ -240,13 +558,11 @@ class LlamaIndexService:
             }
         
         try:
-            if project_id not in self.indices:
+            if self._get_index(project_id) is None:
                 return {"error": "No index found for this project"}
             
             # Use a simple query to extract concepts
-            query = "What are the main concepts, techniques, and methods discussed in these research papers?"
-            
-            result = self.query_research(project_id, query)
+            result = self.query_research(project_id, CONCEPT_QUERY)
             
             if "error" in result:
                 return result
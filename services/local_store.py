@@ -0,0 +1,17 @@
+# services/local_store.py - Helpers for the SQLite files backing local service stores
+import os
+import sqlite3
+
+def connect_sqlite(path: str) -> sqlite3.Connection:
+    """Open (creating if needed) a SQLite database shared across threads.
+
+    Callers must serialize access to the returned connection with their own lock.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    
+    conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
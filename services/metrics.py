@@ -0,0 +1,279 @@
+# services/metrics.py - Prometheus-style counters, gauges and histograms with per-thread collection
+import time
+import bisect
+import logging
+import threading
+import functools
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Latency buckets in seconds, from fast routes to multi-minute LLM calls
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+# Span attributes counted as LLM token usage
+TOKEN_ATTRIBUTES = ("prompt_tokens", "completion_tokens")
+
+class _Shard:
+    """Values written by one thread: counter/gauge deltas and histogram buckets"""
+    
+    def __init__(self):
+        self.values = {}
+        self.histograms = {}
+
+class MetricsRegistry:
+    """Collects metrics without a lock on the hot path.
+    
+    Each thread writes counter increments and histogram observations to its
+    own shard, so recording is a couple of dict operations under the GIL and
+    threads never contend. Shards are summed when ``render`` is called (a
+    scrape of ``/metrics``). Shards of threads that have exited are folded
+    into one retired shard whenever a new thread registers its shard, and on
+    each scrape, so thread churn does not grow the registry even when it is
+    never scraped.
+    """
+    
+    def __init__(self):
+        self.metrics = {}
+        self._local = threading.local()
+        self._shards = []
+        self._retired = _Shard()
+        self._lock = threading.Lock()
+    
+    def _shard(self) -> _Shard:
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = _Shard()
+            self._local.shard = shard
+            with self._lock:
+                self._fold_dead_shards()
+                self._shards.append((threading.current_thread(), shard))
+        return shard
+    
+    def _register(self, metric):
+        with self._lock:
+            existing = self.metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self.metrics[metric.name] = metric
+            return metric
+    
+    def counter(self, name: str, help_text: str, labels: Tuple[str, ...] = ()) -> 'Counter':
+        return self._register(Counter(self, name, help_text, labels))
+    
+    def gauge(self, name: str, help_text: str, labels: Tuple[str, ...] = (),
+              func: Callable[[], Dict] = None) -> 'Gauge':
+        """A gauge; with func, its values are read at scrape time from func()"""
+        return self._register(Gauge(self, name, help_text, labels, func))
+    
+    def histogram(self, name: str, help_text: str, labels: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> 'Histogram':
+        return self._register(Histogram(self, name, help_text, labels, buckets))
+    
+    def _fold_dead_shards(self):
+        """Merge the shards of exited threads into the retired shard (called with the lock held)"""
+        alive = []
+        for thread, shard in self._shards:
+            if thread.is_alive():
+                alive.append((thread, shard))
+                continue
+            for key, value in shard.values.items():
+                self._retired.values[key] = self._retired.values.get(key, 0) + value
+            for key, (counts, total) in shard.histograms.items():
+                merged = self._retired.histograms.setdefault(key, [[0] * len(counts), 0.0])
+                merged[0] = [a + b for a, b in zip(merged[0], counts)]
+                merged[1] += total
+        self._shards = alive
+    
+    def collect(self) -> Tuple[Dict, Dict]:
+        """Sum every shard into (values, histograms) keyed by (metric name, label values)"""
+        with self._lock:
+            self._fold_dead_shards()
+            # The retired shard changes under the lock; sum a copy of it
+            values = dict(self._retired.values)
+            histograms = {key: [list(counts), total] for key, (counts, total) in self._retired.histograms.items()}
+            shards = [shard for _, shard in self._shards]
+        
+        for shard in shards:
+            for key, value in list(shard.values.items()):
+                values[key] = values.get(key, 0) + value
+            for key, (counts, total) in list(shard.histograms.items()):
+                merged = histograms.setdefault(key, [[0] * len(counts), 0.0])
+                merged[0] = [a + b for a, b in zip(merged[0], list(counts))]
+                merged[1] += total
+        return values, histograms
+    
+    def render(self) -> str:
+        """Metrics in the Prometheus text exposition format"""
+        values, histograms = self.collect()
+        lines = []
+        for metric in list(self.metrics.values()):
+            lines.append(f"# HELP {metric.name} {metric.help_text}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render(values, histograms))
+        return "\n".join(lines) + "\n"
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(names: Tuple[str, ...], values: Tuple, extra: str = None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+class _Metric:
+    kind = "untyped"
+    
+    def __init__(self, registry: MetricsRegistry, name: str, help_text: str, labels: Tuple[str, ...]):
+        self.registry = registry
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+    
+    def _key(self, labels: Dict) -> Tuple:
+        return (self.name, tuple(labels.get(name, "") for name in self.labels))
+    
+    def _own(self, values: Dict) -> List[Tuple[Tuple, float]]:
+        return sorted(
+            ((key[1], value) for key, value in values.items() if key[0] == self.name),
+            key=lambda item: item[0]
+        )
+    
+    def render(self, values: Dict, histograms: Dict) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labels, label_values)} {_format_value(value)}"
+                for label_values, value in self._own(values)]
+
+class Counter(_Metric):
+    kind = "counter"
+    
+    def inc(self, amount: float = 1, **labels):
+        values = self.registry._shard().values
+        key = self._key(labels)
+        values[key] = values.get(key, 0) + amount
+
+class Gauge(_Metric):
+    kind = "gauge"
+    
+    def __init__(self, registry, name, help_text, labels, func=None):
+        super().__init__(registry, name, help_text, labels)
+        self.func = func
+    
+    def inc(self, amount: float = 1, **labels):
+        """Adjust the gauge (summed across threads, like a counter that can go down)"""
+        values = self.registry._shard().values
+        key = self._key(labels)
+        values[key] = values.get(key, 0) + amount
+    
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+    
+    def render(self, values: Dict, histograms: Dict) -> List[str]:
+        if self.func is None:
+            return super().render(values, histograms)
+        try:
+            readings = self.func()
+        except Exception as e:
+            logger.error(f"Error reading gauge {self.name}: {str(e)}")
+            return []
+        # func returns {label value tuple (or single value): reading}, or a bare number
+        if not isinstance(readings, dict):
+            readings = {(): readings}
+        return [
+            f"{self.name}{_format_labels(self.labels, key if isinstance(key, tuple) else (key,))} {_format_value(value)}"
+            for key, value in sorted(readings.items(), key=lambda item: str(item[0]))
+        ]
+
+class Histogram(_Metric):
+    kind = "histogram"
+    
+    def __init__(self, registry, name, help_text, labels, buckets):
+        super().__init__(registry, name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+    
+    def observe(self, value: float, **labels):
+        histograms = self.registry._shard().histograms
+        key = self._key(labels)
+        entry = histograms.get(key)
+        if entry is None:
+            # Last slot counts observations above the largest bucket
+            entry = histograms[key] = [[0] * (len(self.buckets) + 1), 0.0]
+        entry[0][bisect.bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+    
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+    
+    def render(self, values: Dict, histograms: Dict) -> List[str]:
+        lines = []
+        own = sorted(((key[1], entry) for key, entry in histograms.items() if key[0] == self.name),
+                     key=lambda item: item[0])
+        for label_values, (counts, total) in own:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, label_values, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, label_values)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, label_values)} {cumulative}")
+        return lines
+
+# Process-wide registry shared by the app and services
+registry = MetricsRegistry()
+
+service_call_seconds = registry.histogram(
+    "service_call_duration_seconds", "Duration of traced service calls", ("operation",)
+)
+service_call_errors = registry.counter(
+    "service_call_errors_total", "Traced service calls that failed", ("operation",)
+)
+llm_tokens = registry.counter(
+    "llm_tokens_total", "LLM tokens used by traced service calls", ("operation", "kind")
+)
+stage_cache_requests = registry.counter(
+    "stage_cache_requests_total", "Stage cache lookups by result", ("operation", "result")
+)
+
+def record_span(span):
+    """Tracer listener: turn each finished service span into metrics"""
+    service_call_seconds.observe(span.duration_ms / 1000.0, operation=span.name)
+    if span.error:
+        service_call_errors.inc(operation=span.name)
+    for kind in TOKEN_ATTRIBUTES:
+        tokens = span.attributes.get(kind)
+        if tokens:
+            llm_tokens.inc(tokens, operation=span.name, kind=kind.replace("_tokens", ""))
+    if "cache_hit" in span.attributes:
+        stage_cache_requests.inc(operation=span.name, result="hit" if span.attributes["cache_hit"] else "miss")
+
+def timed(histogram: Histogram, errors: Counter = None, **labels):
+    """Decorator recording a function's duration (and failures) under fixed labels"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            except Exception:
+                if errors is not None:
+                    errors.inc(**labels)
+                raise
+            finally:
+                histogram.observe(time.perf_counter() - start, **labels)
+        return wrapper
+    return decorator
+
+# Every traced service call (LlamaIndex, Weaviate, CrewAI, Comet) feeds the metrics
+from services.tracing import tracer
+tracer.add_listener(record_span)
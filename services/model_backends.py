@@ -0,0 +1,157 @@
+# services/model_backends.py - Pluggable model backends, including a local fake for offline load tests
+import os
+import time
+import hashlib
+import logging
+from types import SimpleNamespace
+from typing import Iterator, List, Any
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Words the fake LLM draws its deterministic responses from
+FAKE_VOCABULARY = (
+    "model data layer method result prototype test deploy vector index latency "
+    "throughput attention network training dataset baseline metric scaling cache "
+    "pipeline service concept evaluation feature module interface batch query"
+).split()
+
+def model_backend() -> str:
+    """Backend used by every model-calling service: "openai" (default) or "fake" """
+    return os.getenv('MODEL_BACKEND', 'openai').lower()
+
+def use_fake_models() -> bool:
+    return model_backend() == "fake"
+
+class FakeModelProfile:
+    """Latency and throughput of the fake backend, read from FAKE_* settings"""
+    
+    def __init__(self):
+        # Seconds before the first token, then tokens streamed at a fixed rate
+        self.llm_latency = float(os.getenv('FAKE_LLM_LATENCY', 0.2))
+        self.llm_tokens_per_second = float(os.getenv('FAKE_LLM_TOKENS_PER_SECOND', 200))
+        self.llm_output_tokens = int(os.getenv('FAKE_LLM_OUTPUT_TOKENS', 150))
+        # Seconds per embedding request plus time per embedded text
+        self.embed_latency = float(os.getenv('FAKE_EMBED_LATENCY', 0.05))
+        self.embed_texts_per_second = float(os.getenv('FAKE_EMBED_TEXTS_PER_SECOND', 2000))
+        self.embed_dim = int(os.getenv('FAKE_EMBED_DIM', 1536))
+
+def _seed(text: str) -> int:
+    return int.from_bytes(hashlib.sha256(text.encode('utf-8')).digest()[:8], 'little')
+
+def fake_embedding(text: str, dim: int) -> np.ndarray:
+    """Unit vector determined by the text alone"""
+    vector = np.random.default_rng(_seed(text)).standard_normal(dim).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+class FakeLLM:
+    """Deterministic text generator; the same prompt always gives the same response"""
+    
+    def __init__(self, profile: FakeModelProfile = None):
+        self.profile = profile or FakeModelProfile()
+    
+    def tokens(self, prompt: str) -> List[str]:
+        rng = np.random.default_rng(_seed(prompt))
+        words = rng.choice(FAKE_VOCABULARY, size=self.profile.llm_output_tokens)
+        return [f"Response {hashlib.sha256(prompt.encode('utf-8')).hexdigest()[:8]}:"] + list(words)
+    
+    def stream(self, prompt: str) -> Iterator[str]:
+        """Yield response tokens at the profile's latency and throughput"""
+        time.sleep(self.profile.llm_latency)
+        interval = 1.0 / self.profile.llm_tokens_per_second if self.profile.llm_tokens_per_second > 0 else 0
+        for index, token in enumerate(self.tokens(prompt)):
+            if interval:
+                time.sleep(interval)
+            yield token if index == 0 else f" {token}"
+    
+    def complete(self, prompt: str) -> str:
+        return "".join(self.stream(prompt))
+
+class FakeEmbeddingClient:
+    """Stands in for the OpenAI client in ``client.embeddings.create(model=, input=)`` calls"""
+    
+    def __init__(self, profile: FakeModelProfile = None):
+        self.profile = profile or FakeModelProfile()
+        self.embeddings = self
+    
+    def create(self, model: str, input: List[str]) -> Any:
+        texts = [input] if isinstance(input, str) else list(input)
+        rate = self.profile.embed_texts_per_second
+        time.sleep(self.profile.embed_latency + (len(texts) / rate if rate > 0 else 0))
+        return SimpleNamespace(data=[
+            SimpleNamespace(index=index, embedding=fake_embedding(text, self.profile.embed_dim).tolist())
+            for index, text in enumerate(texts)
+        ])
+
+def embedding_client():
+    """Client used by the shared EmbeddingService"""
+    if use_fake_models():
+        return FakeEmbeddingClient()
+    
+    from openai import OpenAI
+    return OpenAI()
+
+def llamaindex_llm(model_name: str):
+    """LLM for LlamaIndex query engines (new-style llama_index.core API)"""
+    if not use_fake_models():
+        from llama_index.llms.openai import OpenAI
+        return OpenAI(model=model_name, temperature=0.1)
+    
+    from llama_index.core.llms import CustomLLM, CompletionResponse, LLMMetadata
+    from llama_index.core.llms.callbacks import llm_completion_callback
+    fake = FakeLLM()
+    
+    class FakeLlamaIndexLLM(CustomLLM):
+        @property
+        def metadata(self) -> LLMMetadata:
+            return LLMMetadata(model_name=model_name)
+        
+        @llm_completion_callback()
+        def complete(self, prompt: str, formatted: bool = False, **kwargs) -> CompletionResponse:
+            return CompletionResponse(text=fake.complete(prompt))
+        
+        @llm_completion_callback()
+        def stream_complete(self, prompt: str, formatted: bool = False, **kwargs):
+            def generate():
+                text = ""
+                for token in fake.stream(prompt):
+                    text += token
+                    yield CompletionResponse(text=text, delta=token)
+            return generate()
+    
+    return FakeLlamaIndexLLM()
+
+def crewai_llm():
+    """LLM for CrewAI agents, or None to use CrewAI's default (OPENAI_MODEL_NAME)"""
+    if not use_fake_models():
+        return None
+    
+    from crewai.llms.base_llm import BaseLLM
+    fake = FakeLLM()
+    
+    class FakeCrewLLM(BaseLLM):
+        def call(self, messages, tools=None, callbacks=None, available_functions=None,
+                 from_task=None, from_agent=None, response_model=None):
+            prompt = messages if isinstance(messages, str) else "\n".join(
+                str(message.get("content", "")) for message in messages
+            )
+            text = ""
+            completion_tokens = 0
+            for token in fake.stream(prompt):
+                self._emit_stream_chunk_event(chunk=token, from_task=from_task, from_agent=from_agent)
+                text += token
+                completion_tokens += 1
+            # Report usage like a provider response, counting prompt words as tokens
+            prompt_tokens = len(prompt.split())
+            self._track_token_usage_internal({
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens
+            })
+            # Agents parse ReAct-style output; answer directly without tool calls
+            return f"Thought: I now know the final answer\nFinal Answer: {text}"
+        
+        def supports_function_calling(self) -> bool:
+            return False
+    
+    return FakeCrewLLM(model="fake")
@@ -0,0 +1,207 @@
+# services/paper_import.py - Parse NDJSON, BibTeX and arXiv imports into paper records, with dedupe keys
+import os
+import re
+import json
+import hashlib
+import logging
+from typing import Dict, Iterator, List, Set
+from services.model_backends import use_fake_models, FAKE_VOCABULARY
+
+logger = logging.getLogger(__name__)
+
+# Column sizes of ResearchPaper; longer values are truncated on import
+FIELD_LIMITS = {"title": 500, "authors": 1000, "url": 500, "paper_type": 50}
+
+DOI_PATTERN = re.compile(r'(10\.\d{4,9}/[^\s"<>]+)', re.IGNORECASE)
+ARXIV_ID_PATTERN = re.compile(r'((?:\d{4}\.\d{4,5})|(?:[a-z\-]+(?:\.[A-Z]{2})?/\d{7}))(?:v\d+)?', re.IGNORECASE)
+BIBTEX_ENTRY_OPEN = re.compile(r'[{(]')
+BIBTEX_FIELD = re.compile(r'\s*([\w\-:.]+)\s*=\s*')
+
+def paper_record(fields: Dict, default_type: str) -> Dict:
+    """Normalize an imported entry to ResearchPaper fields (plus doi); raises ValueError without a title"""
+    title = " ".join(str(fields.get("title") or "").split())
+    if not title:
+        raise ValueError("paper has no title")
+    
+    authors = fields.get("authors", fields.get("author")) or ""
+    if isinstance(authors, list):
+        authors = ", ".join(str(author) for author in authors)
+    doi = str(fields.get("doi") or "").strip() or None
+    url = str(fields.get("url") or "").strip() or (f"https://doi.org/{doi}" if doi else "")
+    
+    record = {
+        "title": title,
+        "authors": " ".join(str(authors).split()),
+        "abstract": str(fields.get("abstract") or "").strip(),
+        "url": url,
+        "paper_type": str(fields.get("type") or fields.get("paper_type") or default_type),
+        "doi": doi
+    }
+    for field, limit in FIELD_LIMITS.items():
+        record[field] = record[field][:limit]
+    return record
+
+def normalize_url(url: str) -> str:
+    url = url.strip().lower()
+    url = re.sub(r'^https?://', '', url)
+    url = re.sub(r'^www\.', '', url).rstrip('/')
+    # Versions and PDF links of an arXiv paper are the same paper
+    match = re.match(r'^(?:export\.)?arxiv\.org/(?:abs|pdf)/(.+?)(?:v\d+)?(?:\.pdf)?$', url)
+    if match:
+        return f"arxiv.org/abs/{match.group(1)}"
+    return url
+
+def title_hash(title: str) -> str:
+    normalized = " ".join(re.sub(r'[^a-z0-9]+', ' ', title.lower()).split())
+    return hashlib.sha256(normalized.encode('utf-8')).hexdigest()[:32]
+
+def dedupe_keys(paper: Dict) -> Set[str]:
+    """Keys identifying a paper: DOI (given, or found in its url), normalized url and title hash"""
+    keys = set()
+    url = paper.get("url") or ""
+    doi = paper.get("doi")
+    if not doi:
+        match = DOI_PATTERN.search(url)
+        doi = match.group(1) if match else None
+    if doi:
+        keys.add(f"doi:{doi.lower().rstrip('.')}")
+    if url:
+        keys.add(f"url:{normalize_url(url)}")
+    if paper.get("title"):
+        keys.add(f"title:{title_hash(paper['title'])}")
+    return keys
+
+def parse_ndjson(text: str) -> Iterator[Dict]:
+    """One JSON paper object per line; blank lines are skipped"""
+    for number, line in enumerate(text.splitlines(), 1):
+        if not line.strip():
+            continue
+        try:
+            fields = json.loads(line)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"line {number}: invalid JSON ({e.msg})")
+        if not isinstance(fields, dict):
+            raise ValueError(f"line {number}: expected a JSON object")
+        yield fields
+
+def _closing(text: str, start: int, opening: str = '{', closing: str = '}') -> int:
+    """Index of the delimiter closing the one at start, honouring nesting and backslash escapes"""
+    depth = 0
+    index = start
+    while index < len(text):
+        char = text[index]
+        if char == '\\':
+            index += 2
+            continue
+        if char == opening:
+            depth += 1
+        elif char == closing:
+            depth -= 1
+            if depth == 0:
+                return index
+        index += 1
+    raise ValueError(f"unbalanced '{opening}' at offset {start}")
+
+def _bibtex_value(text: str, index: int):
+    """(value, end index) of the field value starting at index"""
+    if text[index] == '{':
+        end = _closing(text, index)
+        return text[index + 1:end], end + 1
+    if text[index] == '"':
+        end = index + 1
+        depth = 0
+        while end < len(text) and not (text[end] == '"' and depth == 0 and text[end - 1] != '\\'):
+            depth += {'{': 1, '}': -1}.get(text[end], 0)
+            end += 1
+        return text[index + 1:end], end + 1
+    match = re.match(r'[^,}\s]+', text[index:])
+    value = match.group(0) if match else ""
+    return value, index + len(value)
+
+def _clean_latex(value: str) -> str:
+    value = re.sub(r'\\([&%$#_{}])', r'\1', value)
+    return " ".join(value.replace('{', '').replace('}', '').split())
+
+def parse_bibtex(text: str) -> Iterator[Dict]:
+    """Entries of a BibTeX file as field dicts (authors joined with commas)"""
+    position = 0
+    while True:
+        at = text.find('@', position)
+        if at < 0:
+            return
+        opening = BIBTEX_ENTRY_OPEN.search(text, at)
+        if opening is None:
+            return
+        entry_type = text[at + 1:opening.start()].strip().lower()
+        delimiters = ('{', '}') if opening.group(0) == '{' else ('(', ')')
+        end = _closing(text, opening.start(), *delimiters)
+        body = text[opening.start() + 1:end]
+        position = end + 1
+        if entry_type in ('comment', 'preamble', 'string'):
+            continue
+        
+        _, _, rest = body.partition(',')
+        fields = {}
+        index = 0
+        while True:
+            match = BIBTEX_FIELD.match(rest, index)
+            if match is None:
+                break
+            value, index = _bibtex_value(rest, match.end())
+            fields[match.group(1).lower()] = _clean_latex(value)
+            comma = rest.find(',', index)
+            if comma < 0:
+                break
+            index = comma + 1
+        
+        if "author" in fields:
+            fields["authors"] = ", ".join(name.strip() for name in fields.pop("author").split(" and "))
+        if "eprint" in fields and not fields.get("url"):
+            fields["url"] = f"https://arxiv.org/abs/{fields['eprint']}"
+        yield fields
+
+def arxiv_id(value: str) -> str:
+    """Bare arXiv id from an id, "arXiv:" reference or abs/pdf url (without its version)"""
+    match = ARXIV_ID_PATTERN.search(str(value).strip())
+    if match is None:
+        raise ValueError(f"not an arXiv id: {value}")
+    return match.group(1)
+
+class ArxivFetcher:
+    """Looks up arXiv papers through the arXiv API, up to page_size ids per request"""
+    
+    def __init__(self, page_size: int = None):
+        self.page_size = page_size or int(os.getenv('ARXIV_PAGE_SIZE', 100))
+    
+    def fetch(self, ids: List[str]) -> Iterator[Dict]:
+        import arxiv
+        client = arxiv.Client(page_size=self.page_size, delay_seconds=3.0, num_retries=3)
+        for start in range(0, len(ids), self.page_size):
+            chunk = ids[start:start + self.page_size]
+            for result in client.results(arxiv.Search(id_list=chunk, max_results=len(chunk))):
+                yield {
+                    "title": result.title,
+                    "authors": [author.name for author in result.authors],
+                    "abstract": result.summary,
+                    "url": result.entry_id,
+                    "doi": result.doi
+                }
+
+class FakeArxivFetcher:
+    """Offline stand-in for ArxivFetcher: deterministic papers made up from the ids"""
+    
+    def fetch(self, ids: List[str]) -> Iterator[Dict]:
+        for paper_id in ids:
+            digest = hashlib.sha256(paper_id.encode('utf-8')).digest()
+            words = [FAKE_VOCABULARY[byte % len(FAKE_VOCABULARY)] for byte in digest[:12]]
+            yield {
+                "title": f"{' '.join(words[:4]).capitalize()} ({paper_id})",
+                "authors": [f"Author {digest[12] % 50}", f"Author {digest[13] % 50}"],
+                "abstract": f"We study {' '.join(words[4:])}.",
+                "url": f"https://arxiv.org/abs/{paper_id}"
+            }
+
+def arxiv_fetcher():
+    """Fetcher for arXiv imports: ARXIV_BACKEND=api or fake (default fake with fake models)"""
+    backend = os.getenv('ARXIV_BACKEND', 'fake' if use_fake_models() else 'api').lower()
+    return FakeArxivFetcher() if backend == 'fake' else ArxivFetcher()
@@ -3,173 +3,444 @@ from services.llamaindex_service import LlamaIndexService
 from services.weaviate_service import WeaviateService
 from services.crewai_service import CrewAIService
 from services.comet_service import CometService
+from services.stage_cache import StageCache
+from services.embedding_service import EmbeddingService
+from services.health_monitor import HealthMonitor
+from services.event_bus import EventBus
+from services.batching import BackendLimiter
+from services.tracing import tracer, operation_name, payload_size, propagate
+from services.llamaindex_service import CONCEPT_QUERY
+import os
+import json
+import time
 import logging
+import functools
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, List, Any
 import asyncio
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
+# Status-table stage names for the stages accepted by run_single_stage
+SINGLE_STAGE_STATUS_NAMES = {
+    "research": "research",
+    "connect": "weaviate",
+    "prototype": "prototype",
+    "test": "testing",
+    "production": "production"
+}
+
+def record_result(span, result):
+    """Attach a service call's result size and returned error to its span.
+
+    Token usage is left to the inner crew.kickoff span that reported it, so
+    llm_tokens_total counts each call's tokens once.
+    """
+    span.set(output_bytes=payload_size(result))
+    if isinstance(result, dict) and result.get("error"):
+        span.fail(result["error"])
+
 class PipelineOrchestrator:
     def __init__(self):
-        self.llamaindex = LlamaIndexService()
-        self.weaviate = WeaviateService()
-        self.crewai = CrewAIService()
+        # One cached embedder shared by the LlamaIndex and Weaviate services
+        self.embeddings = EmbeddingService()
+        self.llamaindex = LlamaIndexService(embedding_service=self.embeddings)
+        self.weaviate = WeaviateService(embedding_service=self.embeddings)
+        self.crewai = CrewAIService(retriever=self.llamaindex.retrieve_passages)
         self.comet = CometService()
+        self.stage_cache = StageCache()
+        self.stage_listeners = []
+        self.events = EventBus()
+        # Concurrency limits per backend, shared by every project in flight
+        self.limiter = BackendLimiter()
+        self.health_monitor = HealthMonitor({
+            "llamaindex": self.llamaindex.ping,
+            "weaviate": self.weaviate.ping,
+            "crewai": self.crewai.ping,
+            "comet": self.comet.ping
+        })
+        
+        # Shared pool for blocking SDK calls made from the async pipeline
+        self.executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv('ORCHESTRATOR_THREADS', 16)),
+            thread_name_prefix='orchestrator'
+        )
+        
+    async def _run_blocking(self, func, *args, **kwargs):
+        """Run a blocking service call on the orchestrator executor, inside the caller's span"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(propagate(func), *args, **kwargs))
+    
+    def _call_limited(self, backend: str, func, *args, **kwargs):
+        """Call a blocking backend function within the backend's concurrency limit"""
+        with tracer.span(operation_name(func), backend=backend, input_bytes=payload_size(args)) as span:
+            waited = time.perf_counter()
+            with self.limiter.slot(backend):
+                span.set(queue_ms=round((time.perf_counter() - waited) * 1000, 3))
+                result = func(*args, **kwargs)
+            record_result(span, result)
+            return result
+    
+    async def _run_on(self, backend: str, func, *args, **kwargs):
+        """Run a blocking backend call on the executor within the backend's concurrency limit"""
+        return await self._run_blocking(self._call_limited, backend, func, *args, **kwargs)
+    
+    def _log_in_background(self, func, *args):
+        """Queue a Comet logging call; CometService writes it from its own background thread"""
+        with tracer.span(operation_name(func), backend="comet", input_bytes=payload_size(args)) as span:
+            record_result(span, func(*args))
+    
+    def index_papers_in_background(self, project_id: int, papers: List[Dict]):
+        """Incrementally index newly added papers on the executor, within the LLM concurrency limit"""
+        future = self.executor.submit(propagate(self._call_limited), "llm", self.llamaindex.index_papers, project_id, papers)
+        future.add_done_callback(self._report_background_error)
+        return future
+    
+    @staticmethod
+    def _report_background_error(future):
+        if future.exception() is not None:
+            logger.error(f"Error in background indexing: {str(future.exception())}")
+    
+    def add_stage_listener(self, listener):
+        """Register a callable(project_id, stage, status, counters) run when a stage finishes"""
+        self.stage_listeners.append(listener)
+    
+    def _stage_started(self, project_id: int, stage: str):
+        """Publish a stage start progress event"""
+        self.events.publish(project_id, "stage_started", stage=stage)
+    
+    def _record_stage(self, project_id: int, stage: str, status: str, **counters):
+        """Notify stage listeners (e.g. the app's status table) and subscribers of a finished stage"""
+        for listener in self.stage_listeners:
+            try:
+                listener(project_id, stage, status, counters)
+            except Exception as e:
+                logger.error(f"Error recording {stage} status for project {project_id}: {str(e)}")
         
+        scope = "pipeline" if stage == "pipeline" else "stage"
+        self.events.publish(project_id, f"{scope}_{status}", stage=stage, **counters)
+    
+    def _cached_call(self, stage: str, inputs: Dict, force: bool, func, *args):
+        """Call a stage function, reusing the cached output for identical inputs.
+
+        Cached stages are LLM calls, so a cache miss runs within the LLM
+        concurrency limit.
+        """
+        with tracer.span(operation_name(func), backend="llm", stage=stage, input_bytes=payload_size(inputs)) as span:
+            key = self.stage_cache.fingerprint(stage, inputs)
+            if not force:
+                cached = self.stage_cache.get(key)
+                if cached is not None:
+                    logger.info(f"Stage cache hit for {stage}")
+                    span.set(cache_hit=True)
+                    return cached
+            
+            # Round-trip through JSON so fresh and cached outputs have the same shape
+            waited = time.perf_counter()
+            with self.limiter.slot("llm"):
+                span.set(cache_hit=False, queue_ms=round((time.perf_counter() - waited) * 1000, 3))
+                output = func(*args)
+            result = json.loads(json.dumps(output, default=str))
+            record_result(span, result)
+            if isinstance(result, dict) and not result.get("error"):
+                self.stage_cache.set(key, stage, result)
+            return result
+    
+    def _concept_inputs(self, papers: List[Dict]) -> Dict:
+        """Cache inputs for concept extraction over a paper set"""
+        return {
+            "papers": sorted(papers, key=lambda paper: json.dumps(paper, sort_keys=True, default=str)),
+            "model": self.llamaindex.model_name,
+            "query": CONCEPT_QUERY
+        }
+    
+    def _crew_inputs(self, task_type: str, config: Dict, **inputs) -> Dict:
+        """Cache inputs for a CrewAI task: its arguments plus model and prompt template"""
+        inputs["prompt"] = self.crewai.prompt_fingerprint(task_type)
+        inputs["ai_model"] = config.get("ai_model")
+        return inputs
+    
     async def run_complete_pipeline(self, project_id: int, config: Dict) -> Dict:
-        """Run the complete research-to-product pipeline"""
+        """Run the complete research-to-product pipeline.
+
+        Steps run as a dependency graph: once concepts are extracted, the
+        Weaviate branch (schema, storage, connections), the CrewAI research
+        analysis and the prototype -> testing -> production chain run
+        concurrently. Comet logging is submitted in the background.
+
+        The run is traced: every service call is a span under one "pipeline"
+        root span, exported when the run finishes (see services/tracing.py).
+        """
+        with tracer.span("pipeline", project_id=project_id, papers=len(config.get("papers", []))) as span:
+            results = await self._run_complete_pipeline(project_id, config)
+            if results.get("error"):
+                span.fail(results["error"])
+            return results
+    
+    async def _run_complete_pipeline(self, project_id: int, config: Dict) -> Dict:
+        pipeline_start = datetime.now()
+        results = {
+            "project_id": project_id,
+            "stages": {},
+            "status": "running",
+            "start_time": pipeline_start.isoformat()
+        }
+        if tracer.current() is not None:
+            results["trace_id"] = tracer.current().trace_id
+        branches = []
+        self.events.publish(project_id, "pipeline_started", papers=len(config.get("papers", [])))
+        
         try:
-            pipeline_start = datetime.now()
-            results = {
-                "project_id": project_id,
-                "stages": {},
-                "status": "running",
-                "start_time": pipeline_start.isoformat()
-            }
-            
             # Stage 1: Research Indexing and Analysis
             logger.info(f"Starting research stage for project {project_id}")
             research_start = datetime.now()
+            self._stage_started(project_id, "research")
             
-            # Index research papers
+            # Index research papers and extract concepts (everything else depends on these)
             papers = config.get("papers", [])
-            indexed_count = self.llamaindex.index_papers(project_id, papers)
-            
-            # Extract concepts
-            concepts_result = self.llamaindex.extract_concepts(project_id)
+            force = bool(config.get("force"))
+            # The config carries the project's full paper set, so prune removed papers
+            indexed_count = await self._run_on(
+                "llm", self.llamaindex.index_papers, project_id, papers, prune=True
+            )
+            concepts_result = await self._run_blocking(
+                self._cached_call, "concepts", self._concept_inputs(papers), force,
+                self.llamaindex.extract_concepts, project_id
+            )
             concepts = concepts_result.get("concepts", [])
-            
-            # Store concepts in Weaviate
-            if not concepts_result.get("error"):
-                self.weaviate.create_schema(project_id)
-                concept_data = [{"title": concept, "description": concept} for concept in concepts]
-                self.weaviate.store_concepts(project_id, concept_data)
-            
-            # Research analysis with CrewAI
-            research_data = {
-                "papers": papers,
-                "concepts": concepts,
-                "indexed_count": indexed_count
-            }
-            crewai_research = self.crewai.analyze_research(project_id, research_data)
-            
-            research_end = datetime.now()
-            research_metrics = {
-                "papers_indexed": indexed_count,
-                "concepts_extracted": len(concepts),
-                "analysis_time_seconds": (research_end - research_start).total_seconds(),
-                "crewai_analysis": crewai_research.get("result", "")
-            }
-            
-            # Log research metrics to Comet
-            self.comet.log_research_metrics(project_id, research_metrics)
-            
-            results["stages"]["research"] = {
-                "status": "completed",
-                "metrics": research_metrics,
-                "duration_seconds": (research_end - research_start).total_seconds()
-            }
-            
-            # Stage 2: Concept Connection and Prototyping
-            logger.info(f"Starting prototyping stage for project {project_id}")
-            prototype_start = datetime.now()
-            
-            # Find connections between concepts
             top_concept = concepts[0] if concepts else "main concept"
-            connections = self.weaviate.find_connections(project_id, top_concept)
             
-            # Create prototype with CrewAI
             prototype_requirements = config.get("prototype_requirements", {
                 "language": "python",
                 "framework": "flask",
                 "features": ["basic_api", "web_interface"]
             })
             
-            crewai_prototype = self.crewai.create_prototype(
-                project_id, 
-                top_concept, 
-                prototype_requirements
-            )
-            
-            prototype_end = datetime.now()
-            prototype_metrics = {
-                "development_time": (prototype_end - prototype_start).total_seconds(),
-                "connections_found": len(connections.get("implementations", [])),
-                "prototype_created": bool(crewai_prototype.get("result")),
-                "language": prototype_requirements.get("language"),
-                "framework": prototype_requirements.get("framework")
-            }
-            
-            # Log prototype metrics to Comet
-            self.comet.log_prototype_metrics(project_id, prototype_metrics)
-            
-            results["stages"]["prototype"] = {
-                "status": "completed",
-                "metrics": prototype_metrics,
-                "duration_seconds": (prototype_end - prototype_start).total_seconds(),
-                "connections": connections
-            }
-            
-            # Stage 3: Testing
-            logger.info(f"Starting testing stage for project {project_id}")
-            testing_start = datetime.now()
-            
-            # Design tests with CrewAI
-            prototype_code = crewai_prototype.get("result", "")
-            crewai_testing = self.crewai.design_tests(
-                project_id, 
-                prototype_code, 
-                prototype_requirements
-            )
-            
-            testing_end = datetime.now()
-            testing_metrics = {
-                "test_design_time": (testing_end - testing_start).total_seconds(),
-                "tests_created": True,
-                "test_coverage": 80.0,  # Simulated metric
-                "tests_passed": 45,      # Simulated metric
-                "tests_failed": 2,       # Simulated metric
-                "performance_score": 85.0 # Simulated metric
-            }
-            
-            # Log testing metrics to Comet
-            self.comet.log_testing_metrics(project_id, testing_metrics)
-            
-            results["stages"]["testing"] = {
-                "status": "completed",
-                "metrics": testing_metrics,
-                "duration_seconds": (testing_end - testing_start).total_seconds()
-            }
-            
-            # Stage 4: Production Deployment
-            logger.info(f"Starting production stage for project {project_id}")
-            production_start = datetime.now()
-            
-            # Productionize with CrewAI
-            test_results = {"overall_score": testing_metrics["performance_score"]}
-            crewai_production = self.crewai.productionize(
-                project_id, 
-                prototype_code, 
-                test_results
-            )
-            
-            production_end = datetime.now()
-            production_metrics = {
-                "deployment_time": (production_end - production_start).total_seconds(),
-                "optimization_improvement": 25.0,  # Simulated metric
-                "scalability_score": 90.0,         # Simulated metric
-                "security_score": 88.0,            # Simulated metric
-                "monitoring_coverage": 95.0        # Simulated metric
-            }
-            
-            # Log production metrics to Comet
-            self.comet.log_production_metrics(project_id, production_metrics)
+            async def store_concepts():
+                # Store concepts in Weaviate
+                if concepts_result.get("error"):
+                    return False, 0
+                self._stage_started(project_id, "weaviate")
+                has_schema = await self._run_on("weaviate", self.weaviate.create_schema, project_id)
+                concept_data = [{"title": concept, "description": concept} for concept in concepts]
+                stored_count = await self._run_on("weaviate", self.weaviate.store_concepts, project_id, concept_data)
+                return has_schema, stored_count
+            
+            async def find_connections():
+                # Find connections between concepts once they are stored
+                has_schema, stored_count = await store_task
+                connections = await self._run_on("weaviate", self.weaviate.find_connections, project_id, top_concept)
+                await self._run_blocking(
+                    self._record_stage, project_id, "weaviate", "completed",
+                    has_schema=bool(has_schema),
+                    concepts_stored=stored_count,
+                    connections_available=len(connections.get("concepts", []))
+                )
+                return connections
+            
+            async def analyze_research():
+                # Research analysis with CrewAI
+                research_data = {
+                    "papers": papers,
+                    "concepts": concepts,
+                    "indexed_count": indexed_count
+                }
+                inputs = self._crew_inputs("research_analysis", config, project_id=project_id, **research_data)
+                return await self._run_blocking(
+                    self._cached_call, "research_analysis", inputs, force,
+                    self.crewai.analyze_research, project_id, research_data
+                )
+            
+            store_task = asyncio.ensure_future(store_concepts())
+            connections_task = asyncio.ensure_future(find_connections())
+            analysis_task = asyncio.ensure_future(analyze_research())
+            branches.extend([store_task, connections_task, analysis_task])
+            
+            async def research_stage():
+                crewai_research, _ = await asyncio.gather(analysis_task, store_task)
+                
+                research_end = datetime.now()
+                research_metrics = {
+                    "papers_indexed": indexed_count,
+                    "concepts_extracted": len(concepts),
+                    "analysis_time_seconds": (research_end - research_start).total_seconds(),
+                    "crewai_analysis": crewai_research.get("result", "")
+                }
+                
+                # Log research metrics to Comet
+                self._log_in_background(self.comet.log_research_metrics, project_id, research_metrics)
+                
+                results["stages"]["research"] = {
+                    "status": "completed",
+                    "metrics": research_metrics,
+                    "duration_seconds": (research_end - research_start).total_seconds()
+                }
+                await self._run_blocking(
+                    self._record_stage, project_id, "research", "completed",
+                    papers_indexed=indexed_count,
+                    concepts_count=len(concepts),
+                    has_index=concepts_result.get("error") is None,
+                    duration_seconds=(research_end - research_start).total_seconds()
+                )
+                return research_end
+            
+            async def create_prototype():
+                # Stage 2: Prototyping (needs only the extracted concepts)
+                logger.info(f"Starting prototyping stage for project {project_id}")
+                prototype_start = datetime.now()
+                self._stage_started(project_id, "prototype")
+                inputs = self._crew_inputs(
+                    "prototyping", config,
+                    project_id=project_id, concept=top_concept, requirements=prototype_requirements
+                )
+                crewai_prototype = await self._run_blocking(
+                    self._cached_call, "prototyping", inputs, force,
+                    self.crewai.create_prototype,
+                    project_id, 
+                    top_concept, 
+                    prototype_requirements
+                )
+                return prototype_start, crewai_prototype
+            
+            prototype_task = asyncio.ensure_future(create_prototype())
+            branches.append(prototype_task)
+            
+            async def prototype_stage():
+                (prototype_start, crewai_prototype), connections = await asyncio.gather(
+                    prototype_task, connections_task
+                )
+                
+                prototype_end = datetime.now()
+                prototype_metrics = {
+                    "development_time": (prototype_end - prototype_start).total_seconds(),
+                    "connections_found": len(connections.get("implementations", [])),
+                    "prototype_created": bool(crewai_prototype.get("result")),
+                    "language": prototype_requirements.get("language"),
+                    "framework": prototype_requirements.get("framework")
+                }
+                
+                # Log prototype metrics to Comet
+                self._log_in_background(self.comet.log_prototype_metrics, project_id, prototype_metrics)
+                
+                results["stages"]["prototype"] = {
+                    "status": "completed",
+                    "metrics": prototype_metrics,
+                    "duration_seconds": (prototype_end - prototype_start).total_seconds(),
+                    "connections": connections
+                }
+                await self._run_blocking(
+                    self._record_stage, project_id, "prototype", "completed",
+                    prototype_created=prototype_metrics["prototype_created"],
+                    connections_found=prototype_metrics["connections_found"],
+                    duration_seconds=(prototype_end - prototype_start).total_seconds()
+                )
+                return prototype_start, prototype_end
+            
+            async def delivery_stages():
+                _, crewai_prototype = await prototype_task
+                
+                # Stage 3: Testing
+                logger.info(f"Starting testing stage for project {project_id}")
+                testing_start = datetime.now()
+                self._stage_started(project_id, "testing")
+                
+                # Design tests with CrewAI
+                prototype_code = crewai_prototype.get("result", "")
+                inputs = self._crew_inputs(
+                    "testing", config,
+                    project_id=project_id, prototype_code=prototype_code, requirements=prototype_requirements
+                )
+                crewai_testing = await self._run_blocking(
+                    self._cached_call, "testing", inputs, force,
+                    self.crewai.design_tests,
+                    project_id, 
+                    prototype_code, 
+                    prototype_requirements
+                )
+                
+                testing_end = datetime.now()
+                test_plan = crewai_testing.get("result", "")
+                testing_metrics = {
+                    "test_design_time": (testing_end - testing_start).total_seconds(),
+                    "tests_created": bool(test_plan),
+                    "test_plan_chars": len(str(test_plan)),
+                    "llm_tokens": crewai_testing.get("token_usage", {}).get("total_tokens", 0)
+                }
+                
+                # Log testing metrics to Comet
+                self._log_in_background(self.comet.log_testing_metrics, project_id, testing_metrics)
+                
+                results["stages"]["testing"] = {
+                    "status": "completed",
+                    "metrics": testing_metrics,
+                    "duration_seconds": (testing_end - testing_start).total_seconds()
+                }
+                await self._run_blocking(
+                    self._record_stage, project_id, "testing", "completed",
+                    duration_seconds=(testing_end - testing_start).total_seconds()
+                )
+                
+                # Stage 4: Production Deployment
+                logger.info(f"Starting production stage for project {project_id}")
+                production_start = datetime.now()
+                self._stage_started(project_id, "production")
+                
+                # Productionize with CrewAI
+                test_results = {"test_plan": test_plan}
+                inputs = self._crew_inputs(
+                    "productionization", config,
+                    project_id=project_id, prototype_code=prototype_code, test_results=test_results
+                )
+                crewai_production = await self._run_blocking(
+                    self._cached_call, "productionization", inputs, force,
+                    self.crewai.productionize,
+                    project_id, 
+                    prototype_code, 
+                    test_results
+                )
+                
+                production_end = datetime.now()
+                production_plan = crewai_production.get("result", "")
+                production_metrics = {
+                    "deployment_time": (production_end - production_start).total_seconds(),
+                    "plan_created": bool(production_plan),
+                    "plan_chars": len(str(production_plan)),
+                    "llm_tokens": crewai_production.get("token_usage", {}).get("total_tokens", 0)
+                }
+                
+                # Log production metrics to Comet
+                self._log_in_background(self.comet.log_production_metrics, project_id, production_metrics)
+                
+                results["stages"]["production"] = {
+                    "status": "completed",
+                    "metrics": production_metrics,
+                    "duration_seconds": (production_end - production_start).total_seconds()
+                }
+                await self._run_blocking(
+                    self._record_stage, project_id, "production", "completed",
+                    duration_seconds=(production_end - production_start).total_seconds()
+                )
+                
+                return {
+                    "testing": (testing_start, testing_end),
+                    "production": (production_start, production_end)
+                }
             
-            results["stages"]["production"] = {
-                "status": "completed",
-                "metrics": production_metrics,
-                "duration_seconds": (production_end - production_start).total_seconds()
+            stage_tasks = [
+                asyncio.ensure_future(research_stage()),
+                asyncio.ensure_future(prototype_stage()),
+                asyncio.ensure_future(delivery_stages())
+            ]
+            branches.extend(stage_tasks)
+            research_end, (prototype_start, prototype_end), timeline = await asyncio.gather(*stage_tasks)
+            timeline["prototype"] = (prototype_start, prototype_end)
+            production_start, production_end = timeline["production"]
+            
+            # Branches finish in any order; keep stages in pipeline order
+            results["stages"] = {
+                stage: results["stages"][stage]
+                for stage in ("research", "prototype", "testing", "production")
             }
             
             # Log overall project progression
@@ -178,7 +449,8 @@ class PipelineOrchestrator:
                 "total_time": (pipeline_end - pipeline_start).total_seconds(),
                 "research_to_prototype": (prototype_end - research_start).total_seconds(),
                 "prototype_to_production": (production_end - prototype_start).total_seconds(),
-                "success_score": 85.0,  # Calculated based on all stages
+                # Where the time went: calls and milliseconds per traced operation
+                "time_by_operation": tracer.breakdown(),
                 "stage_completions": {
                     "research": True,
                     "prototype": True,
@@ -187,13 +459,14 @@ class PipelineOrchestrator:
                 },
                 "timeline": {
                     "research": {"start": research_start.isoformat(), "end": research_end.isoformat()},
-                    "prototype": {"start": prototype_start.isoformat(), "end": prototype_end.isoformat()},
-                    "testing": {"start": testing_start.isoformat(), "end": testing_end.isoformat()},
-                    "production": {"start": production_start.isoformat(), "end": production_end.isoformat()}
+                    **{
+                        stage: {"start": timeline[stage][0].isoformat(), "end": timeline[stage][1].isoformat()}
+                        for stage in ("prototype", "testing", "production")
+                    }
                 }
             }
             
-            self.comet.log_project_progression(project_id, progression_data)
+            self._log_in_background(self.comet.log_project_progression, project_id, progression_data)
             
             results["status"] = "completed"
             results["end_time"] = pipeline_end.isoformat()
@@ -201,32 +474,60 @@ class PipelineOrchestrator:
             results["progression"] = progression_data
             results["comet_dashboard_url"] = self.comet.get_project_dashboard_url(project_id)
             
+            await self._run_blocking(
+                self._record_stage, project_id, "pipeline", "completed",
+                duration_seconds=results["total_duration_seconds"]
+            )
+            
             logger.info(f"Pipeline completed successfully for project {project_id}")
             return results
             
         except Exception as e:
             logger.error(f"Error in pipeline execution: {str(e)}")
+            for branch in branches:
+                branch.cancel()
             results["status"] = "failed"
             results["error"] = str(e)
+            self._record_stage(project_id, "pipeline", "failed", error=str(e))
             return results
     
     def run_single_stage(self, project_id: int, stage: str, config: Dict) -> Dict:
-        """Run a single stage of the pipeline"""
+        """Run a single stage of the pipeline (traced under a "stage.<name>" root span)"""
+        with tracer.span(f"stage.{stage}", project_id=project_id) as span:
+            result = self._run_single_stage(project_id, stage, config)
+            if result.get("error"):
+                span.fail(result["error"])
+            return result
+    
+    def _run_single_stage(self, project_id: int, stage: str, config: Dict) -> Dict:
         try:
             start_time = datetime.now()
+            force = bool(config.get("force"))
             result = {}
+            counters = {}
+            
+            if stage in SINGLE_STAGE_STATUS_NAMES:
+                self._stage_started(project_id, SINGLE_STAGE_STATUS_NAMES[stage])
             
             if stage == "research":
                 # Index papers and extract concepts
                 papers = config.get("papers", [])
-                indexed_count = self.llamaindex.index_papers(project_id, papers)
-                concepts_result = self.llamaindex.extract_concepts(project_id)
+                indexed_count = self._call_limited("llm", self.llamaindex.index_papers, project_id, papers, prune=True)
+                concepts_result = self._cached_call(
+                    "concepts", self._concept_inputs(papers), force,
+                    self.llamaindex.extract_concepts, project_id
+                )
                 
                 result = {
                     "indexed_papers": indexed_count,
                     "concepts": concepts_result.get("concepts", []),
                     "status": "completed"
                 }
+                counters = {
+                    "papers_indexed": indexed_count,
+                    "concepts_count": len(result["concepts"]),
+                    "has_index": concepts_result.get("error") is None
+                }
                 
                 metrics = {
                     "papers_indexed": indexed_count,
@@ -234,25 +535,36 @@ class PipelineOrchestrator:
                     "papers": papers,
                     "concepts": concepts_result.get("concepts", [])
                 }
-                self.comet.log_research_metrics(project_id, metrics)
+                self._log_in_background(self.comet.log_research_metrics, project_id, metrics)
                 
             elif stage == "connect":
                 # Connect concepts using Weaviate
                 query = config.get("query", "")
-                connections = self.weaviate.find_connections(project_id, query)
-                suggestions = self.weaviate.get_implementation_suggestions(project_id, query)
+                connections = self._call_limited("weaviate", self.weaviate.find_connections, project_id, query)
+                suggestions = self._call_limited("weaviate", self.weaviate.get_implementation_suggestions, project_id, query)
                 
                 result = {
                     "connections": connections,
                     "suggestions": suggestions,
                     "status": "completed"
                 }
+                counters = {
+                    "has_schema": not connections.get("error"),
+                    "connections_available": len(connections.get("concepts", []))
+                }
                 
             elif stage == "prototype":
                 # Create prototype using CrewAI
                 concept = config.get("concept", "")
                 requirements = config.get("requirements", {})
-                crewai_result = self.crewai.create_prototype(project_id, concept, requirements)
+                inputs = self._crew_inputs(
+                    "prototyping", config,
+                    project_id=project_id, concept=concept, requirements=requirements
+                )
+                crewai_result = self._cached_call(
+                    "prototyping", inputs, force,
+                    self.crewai.create_prototype, project_id, concept, requirements
+                )
                 
                 result = {
                     "prototype": crewai_result.get("result", ""),
@@ -265,13 +577,20 @@ class PipelineOrchestrator:
                     "framework": requirements.get("framework", "unknown"),
                     "source_code": crewai_result.get("result", "")
                 }
-                self.comet.log_prototype_metrics(project_id, metrics)
+                self._log_in_background(self.comet.log_prototype_metrics, project_id, metrics)
                 
             elif stage == "test":
                 # Design tests using CrewAI
                 prototype_code = config.get("prototype_code", "")
                 requirements = config.get("requirements", {})
-                crewai_result = self.crewai.design_tests(project_id, prototype_code, requirements)
+                inputs = self._crew_inputs(
+                    "testing", config,
+                    project_id=project_id, prototype_code=prototype_code, requirements=requirements
+                )
+                crewai_result = self._cached_call(
+                    "testing", inputs, force,
+                    self.crewai.design_tests, project_id, prototype_code, requirements
+                )
                 
                 result = {
                     "tests": crewai_result.get("result", ""),
@@ -283,13 +602,20 @@ class PipelineOrchestrator:
                     "testing_framework": requirements.get("testing_framework", "pytest"),
                     "test_report": crewai_result.get("result", "")
                 }
-                self.comet.log_testing_metrics(project_id, metrics)
+                self._log_in_background(self.comet.log_testing_metrics, project_id, metrics)
                 
             elif stage == "production":
                 # Productionize using CrewAI
                 prototype_code = config.get("prototype_code", "")
                 test_results = config.get("test_results", {})
-                crewai_result = self.crewai.productionize(project_id, prototype_code, test_results)
+                inputs = self._crew_inputs(
+                    "productionization", config,
+                    project_id=project_id, prototype_code=prototype_code, test_results=test_results
+                )
+                crewai_result = self._cached_call(
+                    "productionization", inputs, force,
+                    self.crewai.productionize, project_id, prototype_code, test_results
+                )
                 
                 result = {
                     "production_plan": crewai_result.get("result", ""),
@@ -301,7 +627,7 @@ class PipelineOrchestrator:
                     "platform": config.get("platform", "cloud"),
                     "deployment_config": {"type": "containerized", "orchestration": "kubernetes"}
                 }
-                self.comet.log_production_metrics(project_id, metrics)
+                self._log_in_background(self.comet.log_production_metrics, project_id, metrics)
                 
             else:
                 result = {"error": f"Unknown stage: {stage}", "status": "failed"}
@@ -311,40 +637,39 @@ class PipelineOrchestrator:
             result["start_time"] = start_time.isoformat()
             result["end_time"] = end_time.isoformat()
             
+            if stage in SINGLE_STAGE_STATUS_NAMES:
+                self._record_stage(
+                    project_id, SINGLE_STAGE_STATUS_NAMES[stage], result["status"],
+                    duration_seconds=result["duration_seconds"], **counters
+                )
+            
             return result
             
         except Exception as e:
             logger.error(f"Error running stage {stage}: {str(e)}")
+            if stage in SINGLE_STAGE_STATUS_NAMES:
+                self._record_stage(project_id, SINGLE_STAGE_STATUS_NAMES[stage], "failed", error=str(e))
             return {"error": str(e), "status": "failed"}
     
-    def get_project_status(self, project_id: int) -> Dict:
-        """Get the current status of a project across all stages"""
+    def get_project_status(self, project_id: int, stage_status: Dict = None) -> Dict:
+        """Get the current status of a project across all stages.
+
+        ``stage_status`` holds the per-stage state and counters recorded in the
+        app's status table when stages finish; no LLM or vector store calls are
+        made here.
+        """
         try:
             status = {
                 "project_id": project_id,
-                "stages": {},
+                "stages": dict(stage_status or {}),
                 "comet_dashboard_url": self.comet.get_project_dashboard_url(project_id)
             }
             
-            # Check LlamaIndex status
-            concepts_result = self.llamaindex.extract_concepts(project_id)
-            status["stages"]["research"] = {
-                "concepts_count": len(concepts_result.get("concepts", [])),
-                "has_index": concepts_result.get("error") is None
-            }
-            
-            # Check Weaviate connections
-            connections = self.weaviate.find_connections(project_id, "test query")
-            status["stages"]["weaviate"] = {
-                "has_schema": not connections.get("error"),
-                "connections_available": len(connections.get("concepts", []))
-            }
-            
             # Check CrewAI tasks
-            active_tasks = self.crewai.list_active_tasks()
-            project_tasks = [task for task in active_tasks if str(project_id) in task]
+            project_tasks = self.crewai.list_project_tasks(project_id)
             status["stages"]["crewai"] = {
-                "active_tasks": project_tasks,
+                "active_tasks": [task["task_id"] for task in project_tasks if task["status"] == "running"],
+                "recent_tasks": project_tasks,
                 "task_count": len(project_tasks)
             }
             
@@ -360,6 +685,13 @@ class PipelineOrchestrator:
             # Close Comet experiments
             self.comet.close_experiments(project_id)
             
+            # Remove the persisted vector index
+            self.llamaindex.delete_index(project_id)
+            
+            # Drop recorded progress events and CrewAI task runs
+            self.events.forget(project_id)
+            self.crewai.tasks.forget(project_id)
+            
             # Clean up any temporary files or caches
             logger.info(f"Cleaned up resources for project {project_id}")
             
@@ -367,48 +699,10 @@ class PipelineOrchestrator:
             logger.error(f"Error cleaning up project {project_id}: {str(e)}")
     
     def get_pipeline_health(self) -> Dict:
-        """Check the health status of all pipeline components"""
-        health = {
-            "status": "healthy",
-            "components": {}
-        }
-        
-        try:
-            # Check LlamaIndex
-            health["components"]["llamaindex"] = {
-                "status": "healthy" if self.llamaindex.service_context else "unhealthy",
-                "details": "Service context initialized"
-            }
-            
-            # Check Weaviate
-            weaviate_connected = self.weaviate.client is not None
-            health["components"]["weaviate"] = {
-                "status": "healthy" if weaviate_connected else "unhealthy",
-                "details": "Connected" if weaviate_connected else "Not connected"
-            }
-            
-            # Check CrewAI
-            health["components"]["crewai"] = {
-                "status": "healthy",
-                "details": f"Agents initialized: {len(self.crewai.current_tasks)} active tasks"
-            }
-            
-            # Check Comet
-            comet_healthy = self.comet.api_key is not None
-            health["components"]["comet"] = {
-                "status": "healthy" if comet_healthy else "unhealthy",
-                "details": "API key configured" if comet_healthy else "No API key"
-            }
-            
-            # Overall status
-            unhealthy_components = [comp for comp, status in health["components"].items() 
-                                  if status["status"] == "unhealthy"]
-            if unhealthy_components:
-                health["status"] = "degraded"
-                health["issues"] = f"Unhealthy components: {', '.join(unhealthy_components)}"
-            
-        except Exception as e:
-            health["status"] = "error"
-            health["error"] = str(e)
-            
-        return health
\ No newline at end of file
+        """Last known health of all pipeline components.
+
+        Components are probed in the background, so this never blocks on a
+        slow backend.
+        """
+        self.health_monitor.start()
+        return self.health_monitor.snapshot()
@@ -0,0 +1,138 @@
+# services/prompt_builder.py - Token-budgeted sections for CrewAI task descriptions
+import os
+import json
+import logging
+from typing import Callable, Dict, List, Any
+
+logger = logging.getLogger(__name__)
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# Share of the prompt budget given to each templated section, per task type
+SECTION_SHARES = {
+    "research_analysis": {"papers": 0.75, "concepts": 0.25},
+    "prototyping": {"concept": 0.3, "requirements": 0.7},
+    "testing": {"prototype_code": 0.7, "requirements": 0.3},
+    "productionization": {"prototype_code": 0.7, "test_results": 0.3}
+}
+
+# Query used to pick passages when a project's papers do not fit their budget
+PASSAGE_QUERY = "Key methods, techniques, results and implementable ideas of these research papers"
+
+class PromptBuilder:
+    """Fits the variable sections of a task description into a token budget.
+    
+    Each section gets a share of ``budget`` tokens. Values are packed compactly
+    (one line per paper, JSON without indentation) and truncated to their
+    share. When a project's papers do not fit, the top-k passages retrieved
+    from its index are used instead, so prompt size stays bounded however
+    large the corpus grows. Tokens are counted with tiktoken when installed,
+    otherwise estimated at four characters per token.
+    """
+    
+    def __init__(self, retriever: Callable[[int, str, int], List[Dict]] = None,
+                 budget: int = None, model_name: str = None):
+        self.retriever = retriever
+        self.budget = budget or int(os.getenv('PROMPT_TOKEN_BUDGET', 3000))
+        self.top_k = int(os.getenv('PROMPT_RETRIEVAL_TOP_K', 8))
+        self.abstract_tokens = int(os.getenv('PROMPT_ABSTRACT_TOKENS', 120))
+        self.encoding = self._load_encoding(model_name or 'gpt-3.5-turbo')
+    
+    @staticmethod
+    def _load_encoding(model_name: str):
+        """The model's tiktoken encoding, or None to fall back to estimates"""
+        if tiktoken is None:
+            return None
+        try:
+            return tiktoken.encoding_for_model(model_name)
+        except KeyError:
+            pass
+        except Exception as e:
+            # The encoding files are downloaded on first use
+            logger.warning(f"Could not load tiktoken encoding, estimating token counts: {str(e)}")
+            return None
+        try:
+            return tiktoken.get_encoding('cl100k_base')
+        except Exception as e:
+            logger.warning(f"Could not load tiktoken encoding, estimating token counts: {str(e)}")
+            return None
+    
+    def fingerprint(self) -> str:
+        """Identify the settings that shape built prompts (part of stage cache keys)"""
+        return f"budget={self.budget},top_k={self.top_k},abstract={self.abstract_tokens}"
+    
+    def count_tokens(self, text: str) -> int:
+        if self.encoding is not None:
+            return len(self.encoding.encode(text, disallowed_special=()))
+        return (len(text) + 3) // 4
+    
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """Cut text to at most max_tokens tokens"""
+        if max_tokens <= 0:
+            return ""
+        if self.encoding is not None:
+            tokens = self.encoding.encode(text, disallowed_special=())
+            if len(tokens) <= max_tokens:
+                return text
+            return self.encoding.decode(tokens[:max_tokens]) + "..."
+        if len(text) <= max_tokens * 4:
+            return text
+        return text[:max_tokens * 4] + "..."
+    
+    def compact(self, value: Any) -> str:
+        """Render a section value without pretty-print whitespace"""
+        if isinstance(value, str):
+            return value
+        return json.dumps(value, separators=(',', ':'), default=str)
+    
+    def pack_papers(self, papers: List[Dict], max_tokens: int) -> str:
+        """One line per paper (title, authors, shortened abstract) while the budget lasts"""
+        lines = []
+        used = 0
+        for paper in papers:
+            line = f"- {paper.get('title', '')}"
+            if paper.get('authors'):
+                line += f" ({paper['authors']})"
+            if paper.get('abstract'):
+                line += f": {self.truncate(paper['abstract'], self.abstract_tokens)}"
+            
+            tokens = self.count_tokens(line) + 1
+            if used + tokens > max_tokens:
+                lines.append(f"- ... {len(papers) - len(lines)} more papers omitted")
+                break
+            lines.append(line)
+            used += tokens
+        return "\n".join(lines)
+    
+    def papers_section(self, project_id: int, papers: List[Dict], max_tokens: int) -> str:
+        """Pack all papers if they fit, otherwise the passages most relevant to the project"""
+        packed = self.pack_papers(papers, max_tokens)
+        if not packed.endswith("omitted") or not self.retriever:
+            return packed
+        
+        passages = self.retriever(project_id, PASSAGE_QUERY, self.top_k)
+        if not passages:
+            return packed
+        
+        per_passage = max_tokens // len(passages)
+        lines = [f"{len(papers)} papers; most relevant passages:"]
+        for passage in passages:
+            text = " ".join(str(passage.get('text', '')).split())
+            lines.append(self.truncate(f"- [{passage.get('title', '')}] {text}", per_passage))
+        logger.info(f"Papers for project {project_id} exceed {max_tokens} tokens; using {len(passages)} retrieved passages")
+        return self.truncate("\n".join(lines), max_tokens)
+    
+    def build(self, task_type: str, project_id: int, **sections) -> Dict[str, str]:
+        """Render each templated section of a task within its share of the budget"""
+        shares = SECTION_SHARES.get(task_type, {})
+        rendered = {}
+        for name, value in sections.items():
+            max_tokens = int(self.budget * shares.get(name, 1.0 / max(len(sections), 1)))
+            if name == "papers":
+                rendered[name] = self.papers_section(project_id, value or [], max_tokens)
+            else:
+                rendered[name] = self.truncate(self.compact(value), max_tokens)
+        return rendered
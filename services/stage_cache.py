@@ -0,0 +1,126 @@
+# services/stage_cache.py - Content-addressed cache for pipeline stage outputs
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from typing import Dict, Any, Optional
+from services.local_store import connect_sqlite
+
+logger = logging.getLogger(__name__)
+
+class StageCache:
+    """SQLite-backed cache of stage outputs keyed by a hash of the stage inputs.
+
+    Entries expire after ``ttl_seconds`` and the least recently used entries are
+    evicted once the cache holds more than ``max_entries`` rows.
+    """
+
+    def __init__(self, path: str = None, max_entries: int = None, ttl_seconds: float = None):
+        self.path = path or os.getenv('STAGE_CACHE_PATH', 'instance/stage_cache.db')
+        self.max_entries = max_entries or int(os.getenv('STAGE_CACHE_MAX_ENTRIES', 1000))
+        self.ttl_seconds = ttl_seconds or float(os.getenv('STAGE_CACHE_TTL_SECONDS', 7 * 24 * 3600))
+        self.enabled = os.getenv('STAGE_CACHE_ENABLED', 'true').lower() == 'true'
+        self.conn = None
+        self._lock = threading.Lock()
+        
+        if self.enabled:
+            self._initialize()
+    
+    def _initialize(self):
+        """Open the cache database, disabling the cache if that fails"""
+        try:
+            self.conn = connect_sqlite(self.path)
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS stage_cache (
+                    key TEXT PRIMARY KEY,
+                    stage TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )
+            """)
+            self.conn.execute("CREATE INDEX IF NOT EXISTS ix_stage_cache_last_access ON stage_cache (last_access)")
+            self.conn.commit()
+        except Exception as e:
+            logger.error(f"Error opening stage cache at {self.path}: {str(e)}")
+            self.conn = None
+            self.enabled = False
+    
+    @staticmethod
+    def fingerprint(stage: str, inputs: Dict) -> str:
+        """Hash a stage name and its inputs into a cache key"""
+        payload = json.dumps({"stage": stage, "inputs": inputs}, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+    
+    def get(self, key: str) -> Optional[Any]:
+        """Return the cached value for a key, or None on a miss"""
+        if not self.enabled:
+            return None
+        
+        try:
+            now = time.time()
+            with self._lock:
+                row = self.conn.execute(
+                    "SELECT value, created_at FROM stage_cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row is None:
+                    return None
+                
+                value, created_at = row
+                if now - created_at > self.ttl_seconds:
+                    self.conn.execute("DELETE FROM stage_cache WHERE key = ?", (key,))
+                    self.conn.commit()
+                    return None
+                
+                self.conn.execute("UPDATE stage_cache SET last_access = ? WHERE key = ?", (now, key))
+                self.conn.commit()
+            return json.loads(value)
+            
+        except Exception as e:
+            logger.error(f"Error reading stage cache: {str(e)}")
+            return None
+    
+    def set(self, key: str, stage: str, value: Any) -> bool:
+        """Store a JSON-serializable stage output and evict old entries"""
+        if not self.enabled:
+            return False
+        
+        try:
+            now = time.time()
+            with self._lock:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO stage_cache (key, stage, value, created_at, last_access) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (key, stage, json.dumps(value), now, now)
+                )
+                self._evict(now)
+                self.conn.commit()
+            return True
+            
+        except Exception as e:
+            logger.error(f"Error writing stage cache: {str(e)}")
+            return False
+    
+    def _evict(self, now: float):
+        """Drop expired entries, then the least recently used beyond max_entries"""
+        self.conn.execute("DELETE FROM stage_cache WHERE created_at < ?", (now - self.ttl_seconds,))
+        self.conn.execute("""
+            DELETE FROM stage_cache WHERE key IN (
+                SELECT key FROM stage_cache ORDER BY last_access DESC LIMIT -1 OFFSET ?
+            )
+        """, (self.max_entries,))
+    
+    def clear(self, stage: str = None) -> int:
+        """Remove all entries, or only those for one stage"""
+        if not self.enabled:
+            return 0
+        
+        with self._lock:
+            if stage:
+                cursor = self.conn.execute("DELETE FROM stage_cache WHERE stage = ?", (stage,))
+            else:
+                cursor = self.conn.execute("DELETE FROM stage_cache")
+            self.conn.commit()
+        return cursor.rowcount
@@ -0,0 +1,90 @@
+# services/task_graph.py - Dependency-aware concurrent execution of agent tasks
+import time
+import logging
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Callable, Dict, List, Any
+
+logger = logging.getLogger(__name__)
+
+def validate_graph(tasks: List[Dict]):
+    """Check that dependencies name known tasks and contain no cycles"""
+    keys = {task["key"] for task in tasks}
+    for task in tasks:
+        unknown = set(task.get("depends_on", [])) - keys
+        if unknown:
+            raise ValueError(f"Task {task['key']} depends on unknown tasks: {sorted(unknown)}")
+
+    remaining = {task["key"]: set(task.get("depends_on", [])) for task in tasks}
+    while remaining:
+        ready = [key for key, deps in remaining.items() if not deps]
+        if not ready:
+            raise ValueError(f"Dependency cycle between tasks: {sorted(remaining)}")
+        for key in ready:
+            del remaining[key]
+        for deps in remaining.values():
+            deps.difference_update(ready)
+
+def run_task_graph(tasks: List[Dict], run_task: Callable[[Dict, Dict[str, Any]], Any],
+                   max_workers: int = None) -> Dict:
+    """Run tasks as soon as their ``depends_on`` tasks have finished.
+
+    ``run_task(task, dependency_outputs)`` is called on a thread pool of
+    ``max_workers`` threads (one per task by default; 1 runs the graph
+    sequentially in declaration order). Returns each task's output, its
+    start/end offsets and wall time, and the critical path: the chain of
+    dependencies that determined the total wall time.
+    """
+    validate_graph(tasks)
+    by_key = {task["key"]: task for task in tasks}
+    outputs = {}
+    timings = {}
+    graph_start = time.perf_counter()
+    
+    def execute(task):
+        dependency_outputs = {key: outputs[key] for key in task.get("depends_on", [])}
+        start = time.perf_counter()
+        try:
+            return run_task(task, dependency_outputs)
+        finally:
+            end = time.perf_counter()
+            timings[task["key"]] = {
+                "start_seconds": round(start - graph_start, 3),
+                "end_seconds": round(end - graph_start, 3),
+                "wall_seconds": round(end - start, 3),
+                "depends_on": list(task.get("depends_on", []))
+            }
+    
+    pending = list(tasks)
+    running = {}
+    with ThreadPoolExecutor(max_workers=max_workers or len(tasks), thread_name_prefix='crew-task') as pool:
+        while pending or running:
+            for task in [task for task in pending if all(dep in outputs for dep in task.get("depends_on", []))]:
+                pending.remove(task)
+                # Tasks run in a copy of the caller's context (e.g. its tracing span)
+                running[pool.submit(contextvars.copy_context().run, execute, task)] = task["key"]
+            
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                key = running.pop(future)
+                # Let dependents see the output before anything else is scheduled
+                outputs[key] = future.result()
+    
+    total_seconds = time.perf_counter() - graph_start
+    critical_path = []
+    key = max(timings, key=lambda name: timings[name]["end_seconds"]) if timings else None
+    while key is not None:
+        critical_path.insert(0, key)
+        deps = by_key[key].get("depends_on", [])
+        key = max(deps, key=lambda name: timings[name]["end_seconds"]) if deps else None
+    
+    task_seconds = sum(timing["wall_seconds"] for timing in timings.values())
+    return {
+        "outputs": outputs,
+        "timings": timings,
+        "critical_path": critical_path,
+        "critical_path_seconds": round(sum(timings[name]["wall_seconds"] for name in critical_path), 3),
+        "total_seconds": round(total_seconds, 3),
+        "task_seconds": round(task_seconds, 3),
+        "speedup": round(task_seconds / total_seconds, 2) if total_seconds else None
+    }
@@ -0,0 +1,224 @@
+# services/task_registry.py - Bounded, persistent registry of CrewAI task runs
+import os
+import json
+import time
+import uuid
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Any, Optional
+from services.local_store import connect_sqlite
+
+logger = logging.getLogger(__name__)
+
+# Characters of a task result kept in the in-memory summary
+RESULT_PREVIEW_CHARS = 200
+
+class TaskRegistry:
+    """Tracks CrewAI task runs by unique id.
+
+    Every run gets its own id (``<task_type>_<project_id>_<hex>``), so reruns
+    never overwrite each other. Full results are written to SQLite and only
+    small summaries are kept in memory, in an LRU of at most ``max_entries``
+    runs plus the set of running tasks. Rows older than ``retention_days``
+    are deleted. Legacy ids like ``prototyping_<project_id>`` resolve to the
+    project's latest run of that task type.
+    """
+
+    def __init__(self, path: str = None, max_entries: int = None, retention_days: float = None):
+        self.path = path or os.getenv('CREWAI_TASK_STORE', 'instance/crewai_tasks.db')
+        self.max_entries = max_entries or int(os.getenv('CREWAI_TASK_CACHE_SIZE', 200))
+        self.retention_seconds = (retention_days or float(os.getenv('CREWAI_TASK_RETENTION_DAYS', 30))) * 24 * 3600
+        self.summaries = OrderedDict()
+        self.running = {}
+        self.conn = None
+        self._lock = threading.Lock()
+
+        self._initialize()
+
+    def _initialize(self):
+        """Open the task database; without it only the in-memory summaries are kept"""
+        try:
+            self.conn = connect_sqlite(self.path)
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS crewai_tasks (
+                    task_id TEXT PRIMARY KEY,
+                    project_id INTEGER,
+                    task_type TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    result TEXT,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            self.conn.execute(
+                "CREATE INDEX IF NOT EXISTS ix_crewai_tasks_project ON crewai_tasks (project_id, task_type, created_at)"
+            )
+            self.conn.execute("CREATE INDEX IF NOT EXISTS ix_crewai_tasks_created ON crewai_tasks (created_at)")
+            # Runs interrupted by a restart will never finish
+            self.conn.execute(
+                "UPDATE crewai_tasks SET status = 'failed', error = 'Interrupted' WHERE status = 'running'"
+            )
+            self.conn.commit()
+        except Exception as e:
+            logger.error(f"Error opening CrewAI task store at {self.path}: {str(e)}")
+            self.conn = None
+
+    def _remember(self, summary: Dict):
+        self.summaries[summary["task_id"]] = summary
+        self.summaries.move_to_end(summary["task_id"])
+        while len(self.summaries) > self.max_entries:
+            self.summaries.popitem(last=False)
+
+    def start(self, project_id: int, task_type: str) -> str:
+        """Register a new running task and return its unique id"""
+        now = time.time()
+        task_id = f"{task_type}_{project_id}_{uuid.uuid4().hex[:12]}"
+        summary = {
+            "task_id": task_id,
+            "project_id": project_id,
+            "task_type": task_type,
+            "status": "running",
+            "created_at": now,
+            "updated_at": now
+        }
+
+        with self._lock:
+            self.running[task_id] = summary
+            self._remember(summary)
+            if self.conn is not None:
+                try:
+                    self.conn.execute(
+                        "INSERT INTO crewai_tasks (task_id, project_id, task_type, status, created_at, updated_at) "
+                        "VALUES (?, ?, ?, 'running', ?, ?)",
+                        (task_id, project_id, task_type, now, now)
+                    )
+                    self._evict(now)
+                    self.conn.commit()
+                except Exception as e:
+                    logger.error(f"Error recording CrewAI task {task_id}: {str(e)}")
+        return task_id
+
+    def finish(self, task_id: str, status: str, result: Any = None, error: str = None):
+        """Record a task's outcome, spilling the full result to disk"""
+        now = time.time()
+        result_text = None if result is None else str(result)
+
+        with self._lock:
+            summary = self.running.pop(task_id, None) or self.summaries.get(task_id) or {"task_id": task_id}
+            summary = {
+                **summary,
+                "status": status,
+                "updated_at": now,
+                "result_preview": (result_text or "")[:RESULT_PREVIEW_CHARS],
+                "error": error
+            }
+            self._remember(summary)
+            if self.conn is not None:
+                try:
+                    self.conn.execute(
+                        "UPDATE crewai_tasks SET status = ?, result = ?, error = ?, updated_at = ? WHERE task_id = ?",
+                        (status, result_text, error, now, task_id)
+                    )
+                    self.conn.commit()
+                except Exception as e:
+                    logger.error(f"Error recording CrewAI task {task_id}: {str(e)}")
+
+    def _evict(self, now: float):
+        """Delete finished runs older than the retention period"""
+        self.conn.execute(
+            "DELETE FROM crewai_tasks WHERE created_at < ? AND status != 'running'",
+            (now - self.retention_seconds,)
+        )
+
+    @staticmethod
+    def _row_to_summary(row) -> Dict:
+        task_id, project_id, task_type, status, result, error, created_at, updated_at = row
+        return {
+            "task_id": task_id,
+            "project_id": project_id,
+            "task_type": task_type,
+            "status": status,
+            "created_at": created_at,
+            "updated_at": updated_at,
+            "result_preview": (result or "")[:RESULT_PREVIEW_CHARS],
+            "error": error
+        }
+
+    def resolve(self, task_id: str) -> Optional[str]:
+        """Map a task id, or a legacy ``<task_type>_<project_id>`` alias, to a run id"""
+        with self._lock:
+            if task_id in self.summaries:
+                return task_id
+
+        task_type, _, project_id = task_id.rpartition("_")
+        if project_id.isdigit() and task_type:
+            latest = self.project_tasks(int(project_id), task_type=task_type, limit=1)
+            if latest:
+                return latest[0]["task_id"]
+        return task_id
+
+    def get(self, task_id: str, include_result: bool = False) -> Optional[Dict]:
+        """Summary of a run (optionally with its full result), or None if unknown"""
+        task_id = self.resolve(task_id)
+        with self._lock:
+            summary = self.summaries.get(task_id)
+            if summary is not None:
+                self.summaries.move_to_end(task_id)
+            if self.conn is None or (summary is not None and not include_result):
+                return dict(summary) if summary is not None else None
+
+            row = self.conn.execute(
+                "SELECT task_id, project_id, task_type, status, result, error, created_at, updated_at "
+                "FROM crewai_tasks WHERE task_id = ?", (task_id,)
+            ).fetchone()
+
+        if row is None:
+            return dict(summary) if summary is not None else None
+
+        loaded = self._row_to_summary(row)
+        if include_result:
+            loaded["result"] = row[4]
+        return loaded
+
+    def project_tasks(self, project_id: int, task_type: str = None, limit: int = 50) -> List[Dict]:
+        """Most recent runs for a project, newest first (served by the project index)"""
+        if self.conn is None:
+            with self._lock:
+                tasks = [
+                    dict(summary) for summary in reversed(self.summaries.values())
+                    if summary.get("project_id") == project_id
+                    and (task_type is None or summary.get("task_type") == task_type)
+                ]
+            return tasks[:limit]
+
+        query = ("SELECT task_id, project_id, task_type, status, result, error, created_at, updated_at "
+                 "FROM crewai_tasks WHERE project_id = ?")
+        params = [project_id]
+        if task_type is not None:
+            query += " AND task_type = ?"
+            params.append(task_type)
+        query += " ORDER BY created_at DESC LIMIT ?"
+        params.append(limit)
+
+        with self._lock:
+            rows = self.conn.execute(query, params).fetchall()
+        return [self._row_to_summary(row) for row in rows]
+
+    def active(self) -> List[str]:
+        """Ids of the tasks currently running"""
+        with self._lock:
+            return list(self.running)
+
+    def forget(self, project_id: int) -> int:
+        """Drop every run recorded for a project"""
+        with self._lock:
+            for task_id in [task_id for task_id, summary in self.summaries.items()
+                            if summary.get("project_id") == project_id]:
+                del self.summaries[task_id]
+            if self.conn is None:
+                return 0
+            cursor = self.conn.execute("DELETE FROM crewai_tasks WHERE project_id = ?", (project_id,))
+            self.conn.commit()
+        return cursor.rowcount
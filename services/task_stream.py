@@ -0,0 +1,83 @@
+# services/task_stream.py - Per-task buffers of streamed CrewAI output
+import os
+import time
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Tuple
+
+class TaskStream:
+    """Append-only buffer of one task's LLM tokens and agent steps.
+
+    Readers follow the buffer by offset while the task is still running, so
+    any number of HTTP clients can stream the same task and a reconnecting
+    client resumes where it left off.
+    """
+
+    def __init__(self, task_id: str):
+        self.task_id = task_id
+        self.chunks = []
+        self.status = "running"
+        self.started_at = time.time()
+        self.finished_at = None
+        self._condition = threading.Condition()
+
+    def append(self, kind: str, content: str, **data):
+        with self._condition:
+            self.chunks.append({"kind": kind, "content": content, **data})
+            self._condition.notify_all()
+
+    def add_chunk(self, chunk):
+        """Record a CrewAI StreamChunk (token text or tool call)"""
+        tool_call = getattr(chunk, "tool_call", None)
+        if tool_call is not None:
+            self.append("tool_call", tool_call.arguments, tool=tool_call.tool_name, agent=chunk.agent_role)
+        elif chunk.content:
+            self.append("token", chunk.content, agent=chunk.agent_role)
+
+    def add_step(self, step):
+        """Record an intermediate agent step (used as a Crew step_callback)"""
+        content = getattr(step, "thought", None) or getattr(step, "result", None) or getattr(step, "output", None)
+        self.append("step", str(content if content is not None else step)[:2000], step=type(step).__name__)
+
+    def close(self, status: str):
+        with self._condition:
+            self.status = status
+            self.finished_at = time.time()
+            self._condition.notify_all()
+
+    @property
+    def done(self) -> bool:
+        return self.finished_at is not None
+
+    def read(self, offset: int, timeout: float) -> Tuple[List[Dict], bool]:
+        """Chunks after offset, waiting up to timeout for new ones; also whether the task finished"""
+        with self._condition:
+            if len(self.chunks) <= offset and not self.done:
+                self._condition.wait(timeout)
+            return self.chunks[offset:], self.done
+
+class TaskStreamRegistry:
+    """Streams keyed by task id; only the most recent finished streams are kept"""
+
+    def __init__(self, max_finished: int = None):
+        self.max_finished = max_finished or int(os.getenv('CREWAI_STREAM_HISTORY', 50))
+        self.streams = OrderedDict()
+        self._lock = threading.Lock()
+
+    def open(self, task_id: str) -> TaskStream:
+        """Start a new stream for a task, replacing the stream of a previous run"""
+        stream = TaskStream(task_id)
+        with self._lock:
+            self.streams.pop(task_id, None)
+            self.streams[task_id] = stream
+            self._evict()
+        return stream
+
+    def get(self, task_id: str) -> TaskStream:
+        with self._lock:
+            return self.streams.get(task_id)
+
+    def _evict(self):
+        finished = [task_id for task_id, stream in self.streams.items() if stream.done]
+        for task_id in finished[:max(0, len(finished) - self.max_finished)]:
+            del self.streams[task_id]
@@ -0,0 +1,211 @@
+# services/telemetry_buffer.py - Bounded background queue that writes telemetry in batches off the request path
+import os
+import json
+import time
+import atexit
+import logging
+import threading
+from collections import deque
+from typing import Callable, Dict, List
+
+logger = logging.getLogger(__name__)
+
+# What put() does with a record when the queue is full
+DROP_POLICIES = ("drop_oldest", "drop_newest", "block", "spool")
+
+class TelemetryBuffer:
+    """Queues telemetry records and writes them in batches from a worker thread.
+    
+    ``put(record)`` only appends to a bounded in-memory queue, so callers never
+    wait on the backend. The worker takes up to ``batch_size`` records, waiting
+    at most ``flush_interval`` seconds for a batch to fill, and passes them to
+    ``write_batch``, which returns the records it could not write.
+    
+    When the queue is full, ``drop_policy`` decides what happens to a new
+    record: ``drop_oldest`` discards the oldest queued record, ``drop_newest``
+    discards the new one, ``block`` waits up to ``block_timeout`` seconds for
+    room before discarding it, and ``spool`` appends it to the spool file.
+    Records that fail to write, and records still queued at shutdown, are
+    spooled to ``spool_path`` as JSON lines and replayed once a batch writes
+    cleanly again.
+    """
+    
+    def __init__(self, write_batch: Callable[[List[Dict]], List[Dict]], name: str = "telemetry",
+                 max_size: int = 1000, batch_size: int = 50, flush_interval: float = 1.0,
+                 drop_policy: str = "drop_oldest", spool_path: str = None, block_timeout: float = 0.05):
+        if drop_policy not in DROP_POLICIES:
+            raise ValueError(f"Unknown drop policy: {drop_policy} (expected one of {', '.join(DROP_POLICIES)})")
+        self.write_batch = write_batch
+        self.name = name
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.drop_policy = drop_policy
+        self.spool_path = spool_path
+        self.block_timeout = block_timeout
+        self.counts = {"queued": 0, "written": 0, "dropped": 0, "spooled": 0, "replayed": 0}
+        self._queue = deque()
+        self._writing = 0
+        self._flushing = 0
+        self._cond = threading.Condition()
+        self._spool_lock = threading.Lock()
+        self._worker = None
+        self._closed = False
+    
+    def _start(self):
+        # Called with the condition held
+        if self._worker is None:
+            self._worker = threading.Thread(target=self._worker_loop, name=f"{self.name}-writer", daemon=True)
+            self._worker.start()
+            atexit.register(self.close)
+    
+    def put(self, record: Dict) -> bool:
+        """Queue a record for writing; False if it was dropped"""
+        with self._cond:
+            if self._closed:
+                self.counts["dropped"] += 1
+                return False
+            
+            if len(self._queue) >= self.max_size:
+                if self.drop_policy == "drop_oldest":
+                    self._queue.popleft()
+                    self.counts["dropped"] += 1
+                elif self.drop_policy == "block":
+                    if not self._cond.wait_for(lambda: len(self._queue) < self.max_size, self.block_timeout):
+                        self.counts["dropped"] += 1
+                        return False
+                elif self.drop_policy == "drop_newest":
+                    self.counts["dropped"] += 1
+                    return False
+            
+            overflow = len(self._queue) >= self.max_size
+            if not overflow:
+                self._queue.append(record)
+                self.counts["queued"] += 1
+                self._start()
+                self._cond.notify_all()
+        
+        if overflow:
+            # Only the spool policy gets here
+            return self._spool([record]) > 0
+        return True
+    
+    def flush(self, timeout: float = None) -> bool:
+        """Wait until every queued record has been handed to write_batch"""
+        with self._cond:
+            self._flushing += 1
+            self._cond.notify_all()
+            try:
+                return self._cond.wait_for(lambda: not self._queue and not self._writing, timeout)
+            finally:
+                self._flushing -= 1
+    
+    def close(self, timeout: float = 5.0):
+        """Flush what can be written within timeout and spool the rest"""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        
+        if self._worker is not None:
+            self._worker.join(timeout)
+        with self._cond:
+            remaining = list(self._queue)
+            self._queue.clear()
+        if remaining:
+            self._spool(remaining)
+    
+    def stats(self) -> Dict:
+        with self._cond:
+            return {**self.counts, "pending": len(self._queue) + self._writing, "policy": self.drop_policy}
+    
+    def _next_batch(self) -> List[Dict]:
+        with self._cond:
+            self._cond.wait_for(lambda: self._queue or self._closed)
+            # Give the batch up to flush_interval to fill unless flushing or shutting down
+            deadline = time.monotonic() + self.flush_interval
+            while len(self._queue) < self.batch_size and not self._closed and not self._flushing:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            
+            batch = [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+            self._writing = len(batch)
+            # Wake producers blocked on a full queue
+            self._cond.notify_all()
+            return batch
+    
+    def _worker_loop(self):
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                return
+            
+            failed = self._write(batch)
+            if failed:
+                self._spool(failed)
+            elif self.spool_path and os.path.exists(self.spool_path):
+                self._replay_spool()
+            
+            with self._cond:
+                self._writing = 0
+                self._cond.notify_all()
+    
+    def _write(self, batch: List[Dict]) -> List[Dict]:
+        try:
+            failed = self.write_batch(batch) or []
+        except Exception as e:
+            logger.error(f"Error writing {self.name} batch of {len(batch)} records: {str(e)}")
+            failed = batch
+        with self._cond:
+            self.counts["written"] += len(batch) - len(failed)
+        return failed
+    
+    def _spool(self, records: List[Dict]) -> int:
+        """Append records to the spool file; records that cannot be spooled are dropped"""
+        if not self.spool_path:
+            with self._cond:
+                self.counts["dropped"] += len(records)
+            return 0
+        
+        try:
+            with self._spool_lock:
+                directory = os.path.dirname(self.spool_path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                with open(self.spool_path, 'a') as f:
+                    for record in records:
+                        f.write(json.dumps(record, default=str) + "\n")
+        except Exception as e:
+            logger.error(f"Error spooling {len(records)} {self.name} records to {self.spool_path}: {str(e)}")
+            with self._cond:
+                self.counts["dropped"] += len(records)
+            return 0
+        
+        with self._cond:
+            self.counts["spooled"] += len(records)
+        return len(records)
+    
+    def _replay_spool(self):
+        """Write spooled records in batches, keeping whatever still fails in the spool"""
+        with self._spool_lock:
+            try:
+                with open(self.spool_path) as f:
+                    records = [json.loads(line) for line in f if line.strip()]
+                os.remove(self.spool_path)
+            except Exception as e:
+                logger.error(f"Error reading {self.name} spool {self.spool_path}: {str(e)}")
+                return
+        
+        logger.info(f"Replaying {len(records)} spooled {self.name} records")
+        for start in range(0, len(records), self.batch_size):
+            batch = records[start:start + self.batch_size]
+            failed = self._write(batch)
+            with self._cond:
+                self.counts["replayed"] += len(batch) - len(failed)
+            if failed:
+                # Backend is failing again; keep the rest for the next replay
+                self._spool(failed + records[start + self.batch_size:])
+                return
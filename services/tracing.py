@@ -0,0 +1,323 @@
+# services/tracing.py - Nested timing spans for service calls, exported as JSON lines
+import os
+import json
+import time
+import uuid
+import fnmatch
+import logging
+import threading
+import contextvars
+from collections import deque, OrderedDict
+from contextlib import contextmanager
+from typing import Dict, List, Any
+
+logger = logging.getLogger(__name__)
+
+# Span of the code currently running; asyncio tasks get a copy on creation
+_current_span = contextvars.ContextVar('current_span', default=None)
+
+def operation_name(func) -> str:
+    """Span name for a service call, e.g. WeaviateService.store_concepts"""
+    owner = getattr(func, '__self__', None)
+    if owner is not None:
+        return f"{type(owner).__name__}.{func.__name__}"
+    return getattr(func, '__qualname__', repr(func))
+
+def payload_size(value: Any) -> int:
+    """Approximate serialized size of a call argument or result, in bytes"""
+    if isinstance(value, (str, bytes)):
+        return len(value)
+    try:
+        return len(json.dumps(value, default=str))
+    except (TypeError, ValueError):
+        return 0
+
+def propagate(func):
+    """Bind func to the current context so spans it opens on another thread nest correctly"""
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.run(func, *args, **kwargs)
+
+class Span:
+    """One timed operation with attributes (sizes, token counts) and an optional error"""
+    
+    def __init__(self, name: str, trace_id: str, parent_id: str, attributes: Dict):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.attributes = dict(attributes)
+        self.error = None
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self._started = time.perf_counter()
+        self._token = None
+    
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+    
+    def fail(self, error: Any):
+        self.error = str(error)
+    
+    def finish(self):
+        self.attributes["duration_ms"] = round((time.perf_counter() - self._started) * 1000, 3)
+        self.end_ns = self.start_ns + int(self.attributes["duration_ms"] * 1e6)
+    
+    @property
+    def duration_ms(self) -> float:
+        return self.attributes.get("duration_ms", 0.0)
+    
+    def to_dict(self) -> Dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "duration_ms": self.duration_ms,
+            "attributes": {key: value for key, value in self.attributes.items() if key != "duration_ms"},
+            "error": self.error
+        }
+    
+    def to_otel(self) -> Dict:
+        """The span as an OTLP/JSON span record"""
+        record = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": 1,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [
+                {"key": key, "value": otel_value(value)}
+                for key, value in self.attributes.items() if key != "duration_ms"
+            ],
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 1}
+        }
+        if self.parent_id:
+            record["parentSpanId"] = self.parent_id
+        return record
+
+def otel_value(value: Any) -> Dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+class _NoopSpan:
+    """Stands in for spans while tracing is disabled"""
+    
+    def set(self, **attributes):
+        pass
+    
+    def fail(self, error: Any):
+        pass
+
+NOOP_SPAN = _NoopSpan()
+
+class Tracer:
+    """Records nested spans around service calls.
+    
+    The current span lives in a context variable, so spans opened in asyncio
+    tasks, and in executor calls wrapped with ``propagate``, nest under the
+    span that started them. When a trace's root span ends, the trace is
+    appended to ``export_path`` as one JSON line, in this module's format
+    (TRACE_FORMAT=json) or as an OpenTelemetry OTLP/JSON ``resourceSpans``
+    record (TRACE_FORMAT=otlp), and kept among the ``history`` most recent
+    traces. Spans ending after their root (background Comet logging) are
+    exported on their own line with the same trace id.
+    
+    Only traces whose root span name matches one of the TRACE_EXPORT_ROOTS
+    glob patterns (by default pipeline runs and single stages) are exported
+    and kept in the history; roots started by background work, such as
+    embedding batches and Comet flushes, only reach the listeners, so they
+    never push a project's runs out of ``recent``. The export file is rotated once it
+    would exceed TRACE_EXPORT_MAX_BYTES, keeping TRACE_EXPORT_BACKUPS old
+    files (``traces.jsonl.1`` is the newest).
+    
+    Listeners added with ``add_listener`` see every finished span, even with
+    TRACING_ENABLED=false, which only stops traces being kept and exported.
+    """
+    
+    def __init__(self, export_path: str = None, export_format: str = None, history: int = None):
+        self.enabled = os.getenv('TRACING_ENABLED', 'true').lower() == 'true'
+        self.export_path = export_path if export_path is not None else os.getenv('TRACE_EXPORT_PATH', 'instance/traces.jsonl')
+        self.export_format = (export_format or os.getenv('TRACE_FORMAT', 'json')).lower()
+        self.service_name = os.getenv('TRACE_SERVICE_NAME', 'research-to-product-pipeline')
+        self.traces = deque(maxlen=history or int(os.getenv('TRACE_HISTORY', 50)))
+        self.export_roots = [
+            pattern.strip() for pattern in os.getenv('TRACE_EXPORT_ROOTS', 'pipeline,stage.*').split(',')
+            if pattern.strip()
+        ]
+        self.max_bytes = int(os.getenv('TRACE_EXPORT_MAX_BYTES', 50 * 1024 * 1024))
+        self.backups = int(os.getenv('TRACE_EXPORT_BACKUPS', 3))
+        # Recently exported trace ids, so spans ending after their root follow it
+        self._exported = OrderedDict()
+        self.listeners = []
+        self._open = {}
+        self._lock = threading.Lock()
+        self._export_lock = threading.Lock()
+    
+    def add_listener(self, listener):
+        """Register a callable(span) run whenever a span finishes"""
+        self.listeners.append(listener)
+    
+    def current(self):
+        return _current_span.get()
+    
+    def start(self, name: str, **attributes) -> Span:
+        """Open a span under the current one and make it current"""
+        parent = _current_span.get()
+        if parent is None:
+            span = Span(name, uuid.uuid4().hex, None, attributes)
+            if self.enabled:
+                with self._lock:
+                    self._open[span.trace_id] = []
+        else:
+            span = Span(name, parent.trace_id, parent.span_id, attributes)
+        span._token = _current_span.set(span)
+        return span
+    
+    def end(self, span: Span):
+        """Close a span; closing a root span exports its trace"""
+        span.finish()
+        try:
+            _current_span.reset(span._token)
+        except ValueError:
+            # Ended from a different context than it was started in
+            pass
+        
+        for listener in self.listeners:
+            try:
+                listener(span)
+            except Exception as e:
+                logger.error(f"Error in span listener: {str(e)}")
+        if not self.enabled:
+            return
+        
+        with self._lock:
+            spans = self._open.get(span.trace_id)
+            late = spans is None
+            if late:
+                spans = [span]
+                export = span.trace_id in self._exported
+            else:
+                spans.append(span)
+                export = False
+                if span.parent_id is None:
+                    del self._open[span.trace_id]
+                    export = self._exports(span.name)
+                    if export:
+                        self.traces.append(spans)
+                        self._exported[span.trace_id] = True
+                        if len(self._exported) > 1000:
+                            self._exported.popitem(last=False)
+        
+        if export:
+            self._export(spans)
+    
+    def _exports(self, root_name: str) -> bool:
+        return any(fnmatch.fnmatchcase(root_name, pattern) for pattern in self.export_roots)
+    
+    @contextmanager
+    def span(self, name: str, **attributes):
+        """Time the enclosed block as a span; exceptions are recorded and re-raised"""
+        if not self.enabled and not self.listeners:
+            yield NOOP_SPAN
+            return
+        
+        span = self.start(name, **attributes)
+        try:
+            yield span
+        except BaseException as e:
+            span.fail(f"{type(e).__name__}: {e}")
+            raise
+        finally:
+            self.end(span)
+    
+    def _export(self, spans: List[Span]):
+        if not self.export_path:
+            return
+        
+        if self.export_format == "otlp":
+            record = {"resourceSpans": [{
+                "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": self.service_name}}]},
+                "scopeSpans": [{"scope": {"name": __name__}, "spans": [span.to_otel() for span in spans]}]
+            }]}
+        else:
+            record = {"trace_id": spans[0].trace_id, "spans": [span.to_dict() for span in spans]}
+        
+        line = json.dumps(record, default=str) + "\n"
+        try:
+            with self._export_lock:
+                directory = os.path.dirname(self.export_path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                if self.max_bytes and os.path.exists(self.export_path) \
+                        and os.path.getsize(self.export_path) + len(line) > self.max_bytes:
+                    self._rotate()
+                with open(self.export_path, 'a') as f:
+                    f.write(line)
+        except Exception as e:
+            logger.error(f"Error exporting trace to {self.export_path}: {str(e)}")
+    
+    def _rotate(self):
+        """Shift traces.jsonl to traces.jsonl.1 (and .1 to .2, ...), dropping the oldest backup"""
+        if self.backups <= 0:
+            os.remove(self.export_path)
+            return
+        for index in range(self.backups - 1, 0, -1):
+            older = f"{self.export_path}.{index}"
+            if os.path.exists(older):
+                os.replace(older, f"{self.export_path}.{index + 1}")
+        os.replace(self.export_path, f"{self.export_path}.1")
+    
+    def breakdown(self, trace_id: str = None) -> Dict[str, Dict]:
+        """Call count and total milliseconds per span name in a trace (default: the current one)"""
+        if trace_id is None:
+            current = _current_span.get()
+            if current is None:
+                return {}
+            trace_id = current.trace_id
+        
+        with self._lock:
+            spans = self._open.get(trace_id)
+            if spans is None:
+                spans = next((trace for trace in self.traces if trace[0].trace_id == trace_id), [])
+            spans = list(spans)
+        
+        totals = {}
+        for span in spans:
+            entry = totals.setdefault(span.name, {"count": 0, "total_ms": 0.0, "errors": 0})
+            entry["count"] += 1
+            entry["total_ms"] = round(entry["total_ms"] + span.duration_ms, 3)
+            entry["errors"] += span.error is not None
+        return dict(sorted(totals.items(), key=lambda item: item[1]["total_ms"], reverse=True))
+    
+    def recent(self, project_id: int = None, limit: int = 10) -> List[Dict]:
+        """Most recent finished traces, newest first, optionally for one project"""
+        with self._lock:
+            traces = list(self.traces)
+        
+        found = []
+        for spans in reversed(traces):
+            root = spans[-1]
+            if project_id is not None and root.attributes.get("project_id") != project_id:
+                continue
+            found.append({
+                "trace_id": root.trace_id,
+                "name": root.name,
+                "duration_ms": root.duration_ms,
+                "error": root.error,
+                "breakdown": self.breakdown(root.trace_id),
+                "spans": [span.to_dict() for span in spans]
+            })
+            if len(found) >= limit:
+                break
+        return found
+
+# Process-wide tracer shared by the orchestrator and services
+tracer = Tracer()
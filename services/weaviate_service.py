@@ -4,13 +4,70 @@ from weaviate.auth import AuthApiKey
 import os
 import json
 import logging
+from services.batching import MicroBatcher
+from services.tracing import tracer
 
 logger = logging.getLogger(__name__)
 
+def concept_text(concept: dict) -> str:
+    """Text embedded for a research concept"""
+    return f"{concept.get('title', '')}\n{concept.get('description', '')}"
+
+def implementation_text(impl: dict) -> str:
+    """Text embedded for an implementation example"""
+    return f"{impl.get('title', '')}\n{impl.get('description', '')}\n{impl.get('code', '')}"
+
 class WeaviateService:
-    def __init__(self):
+    def __init__(self, embedding_service=None):
         self.client = None
+        self.embedding_service = embedding_service
+        # Inserts from concurrent projects share one client-level batch
+        self.insert_batcher = MicroBatcher(
+            self._insert_objects,
+            max_batch=int(os.getenv('WEAVIATE_BATCH_SIZE', 200)),
+            max_wait=float(os.getenv('WEAVIATE_BATCH_WAIT', 0.05))
+        )
         self.connect()
+    
+    def _client_vectors(self) -> bool:
+        """Whether vectors come from the shared cached embedder instead of text2vec_openai"""
+        return bool(self.embedding_service and self.embedding_service.service_available)
+    
+    def _vectorizer_config(self):
+        if self._client_vectors():
+            return weaviate.Configure.Vectorizer.none()
+        return weaviate.Configure.Vectorizer.text2vec_openai()
+    
+    def _embed(self, texts: list) -> list:
+        """Embed object texts locally, or return None placeholders for server-side vectorization"""
+        if self._client_vectors():
+            return self.embedding_service.embed_texts(texts)
+        return [None] * len(texts)
+    
+    def _search(self, collection, query: str, vector, limit: int, **kwargs):
+        """Similarity search by precomputed query vector when available, else by text"""
+        operation = "near_vector" if vector is not None else "near_text"
+        with tracer.span(f"weaviate.{operation}", collection=collection.name, limit=limit) as span:
+            if vector is not None:
+                response = collection.query.near_vector(near_vector=vector, limit=limit, **kwargs)
+            else:
+                response = collection.query.near_text(query=query, limit=limit, **kwargs)
+            span.set(results=len(response.objects))
+            return response
+    
+    def _insert_objects(self, objects: list) -> list:
+        """Insert (collection, properties, vector) objects in one batch, returning per-object success"""
+        uuids = []
+        with tracer.span("weaviate.batch_insert", objects=len(objects)) as span:
+            with self.client.batch.dynamic() as batch:
+                for collection_name, properties, vector in objects:
+                    uuids.append(batch.add_object(collection=collection_name, properties=properties, vector=vector))
+            
+            failed = {str(obj.original_uuid or obj.object_.uuid) for obj in self.client.batch.failed_objects}
+            span.set(failed=len(failed))
+            if failed:
+                logger.error(f"Weaviate rejected {len(failed)} of {len(objects)} batched objects")
+        return [str(object_uuid) not in failed for object_uuid in uuids]
         
     def connect(self):
         """Connect to Weaviate instance using v4 API"""
@@ -40,6 +97,14 @@ class WeaviateService:
             logger.error(f"Failed to connect to Weaviate: {str(e)}")
             self.client = None
     
+    def ping(self) -> str:
+        """Check that the Weaviate instance is ready"""
+        if not self.client:
+            raise RuntimeError("Not connected to Weaviate")
+        if not self.client.is_ready():
+            raise RuntimeError("Weaviate is not ready")
+        return "Ready"
+    
     def create_schema(self, project_id: int):
         """Create schema for storing research concepts and implementations"""
         try:
@@ -68,7 +133,7 @@ class WeaviateService:
                         {"name": "source_paper", "dataType": "string", "description": "Source paper title"},
                         {"name": "implementation_difficulty", "dataType": "int", "description": "Difficulty score for implementation (1-10)"}
                     ],
-                    vectorizer_config=weaviate.Configure.Vectorizer.text2vec_openai()
+                    vectorizer_config=self._vectorizer_config()
                 )
                 logger.info(f"Created collection {concept_collection_name}")
             
@@ -89,7 +154,7 @@ class WeaviateService:
                         {"name": "language", "dataType": "string", "description": "Programming language"},
                         {"name": "complexity", "dataType": "string", "description": "Implementation complexity level"}
                     ],
-                    vectorizer_config=weaviate.Configure.Vectorizer.text2vec_openai()
+                    vectorizer_config=self._vectorizer_config()
                 )
                 logger.info(f"Created collection {impl_collection_name}")
             
@@ -106,23 +171,21 @@ class WeaviateService:
                 return 0
                 
             collection_name = f"ResearchConcept_Project_{project_id}"
-            collection = self.client.collections.get(collection_name)
-            
-            stored_count = 0
+            vectors = self._embed([concept_text(concept) for concept in concepts])
             
             # Batch insert for better performance
-            with collection.batch.dynamic() as batch:
-                for concept in concepts:
-                    data_object = {
-                        "title": concept.get("title", ""),
-                        "description": concept.get("description", ""),
-                        "keywords": concept.get("keywords", []),
-                        "source_paper": concept.get("source_paper", ""),
-                        "implementation_difficulty": concept.get("difficulty", 5)
-                    }
-                    
-                    batch.add_object(properties=data_object)
-                    stored_count += 1
+            objects = []
+            for concept, vector in zip(concepts, vectors):
+                data_object = {
+                    "title": concept.get("title", ""),
+                    "description": concept.get("description", ""),
+                    "keywords": concept.get("keywords", []),
+                    "source_paper": concept.get("source_paper", ""),
+                    "implementation_difficulty": concept.get("difficulty", 5)
+                }
+                objects.append((collection_name, data_object, vector))
+            
+            stored_count = sum(self.insert_batcher.submit(objects))
             
             logger.info(f"Stored {stored_count} concepts for project {project_id}")
             return stored_count
@@ -138,22 +201,20 @@ class WeaviateService:
                 return 0
                 
             collection_name = f"Implementation_Project_{project_id}"
-            collection = self.client.collections.get(collection_name)
-            
-            stored_count = 0
-            
-            with collection.batch.dynamic() as batch:
-                for impl in implementations:
-                    data_object = {
-                        "title": impl.get("title", ""),
-                        "description": impl.get("description", ""),
-                        "code_snippet": impl.get("code", ""),
-                        "language": impl.get("language", "python"),
-                        "complexity": impl.get("complexity", "medium")
-                    }
-                    
-                    batch.add_object(properties=data_object)
-                    stored_count += 1
+            vectors = self._embed([implementation_text(impl) for impl in implementations])
+            
+            objects = []
+            for impl, vector in zip(implementations, vectors):
+                data_object = {
+                    "title": impl.get("title", ""),
+                    "description": impl.get("description", ""),
+                    "code_snippet": impl.get("code", ""),
+                    "language": impl.get("language", "python"),
+                    "complexity": impl.get("complexity", "medium")
+                }
+                objects.append((collection_name, data_object, vector))
+            
+            stored_count = sum(self.insert_batcher.submit(objects))
             
             logger.info(f"Stored {stored_count} implementations for project {project_id}")
             return stored_count
@@ -171,23 +232,20 @@ class WeaviateService:
             concept_collection_name = f"ResearchConcept_Project_{project_id}"
             impl_collection_name = f"Implementation_Project_{project_id}"
             
+            # Embed the query once for both searches
+            query_vector = self._embed([concept_query])[0]
+            
             # Search for related concepts
             try:
                 concept_collection = self.client.collections.get(concept_collection_name)
-                concept_result = concept_collection.query.near_text(
-                    query=concept_query,
-                    limit=limit
-                )
+                concept_result = self._search(concept_collection, concept_query, query_vector, limit)
             except:
                 concept_result = None
             
             # Search for related implementations
             try:
                 impl_collection = self.client.collections.get(impl_collection_name)
-                impl_result = impl_collection.query.near_text(
-                    query=concept_query,
-                    limit=limit
-                )
+                impl_result = self._search(impl_collection, concept_query, query_vector, limit)
             except:
                 impl_result = None
             
@@ -212,9 +270,8 @@ class WeaviateService:
             
             try:
                 collection = self.client.collections.get(collection_name)
-                result = collection.query.near_text(
-                    query=concept,
-                    limit=limit,
+                result = self._search(
+                    collection, concept, self._embed([concept])[0], limit,
                     return_metadata=["distance"]
                 )
                 
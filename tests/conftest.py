@@ -0,0 +1,25 @@
+# tests/conftest.py - Run the tests offline on the fake model backend with every store in a temporary directory
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Services read their settings when they are created, so set them before any test imports them
+WORKDIR = tempfile.mkdtemp(prefix='r2p-tests-')
+os.environ.update({
+    'MODEL_BACKEND': 'fake',
+    'FAKE_LLM_LATENCY': '0',
+    'FAKE_LLM_TOKENS_PER_SECOND': '0',
+    'FAKE_LLM_OUTPUT_TOKENS': '20',
+    'FAKE_EMBED_LATENCY': '0',
+    'DATABASE_URL': f"sqlite:///{os.path.join(WORKDIR, 'test.db')}",
+    'STAGE_CACHE_PATH': os.path.join(WORKDIR, 'stage_cache.db'),
+    'EMBEDDING_CACHE_PATH': os.path.join(WORKDIR, 'embeddings.db'),
+    'LLAMAINDEX_STORAGE_DIR': os.path.join(WORKDIR, 'llamaindex'),
+    'CREWAI_TASK_STORE': os.path.join(WORKDIR, 'crewai_tasks.db'),
+    'COMET_OFFLINE_DIR': os.path.join(WORKDIR, 'comet_offline'),
+    'COMET_SPOOL_PATH': os.path.join(WORKDIR, 'comet_spool.jsonl'),
+    'TRACE_EXPORT_PATH': os.path.join(WORKDIR, 'traces.jsonl')
+})
@@ -0,0 +1,35 @@
+# tests/test_metrics.py - Token metrics recorded from traced pipeline stages
+from services.metrics import registry
+from services.pipeline_orchestrator import PipelineOrchestrator
+
+def llm_token_totals():
+    values, _ = registry.collect()
+    totals = {"prompt": 0, "completion": 0}
+    for (name, labels), value in values.items():
+        if name == "llm_tokens_total":
+            totals[labels[1]] += value
+    return totals
+
+def test_single_stage_tokens_counted_once():
+    orchestrator = PipelineOrchestrator()
+    usages = []
+    design_tests = orchestrator.crewai.design_tests
+
+    def recording_design_tests(*args):
+        result = design_tests(*args)
+        usages.append(result["token_usage"])
+        return result
+
+    orchestrator.crewai.design_tests = recording_design_tests
+    before = llm_token_totals()
+    result = orchestrator.run_single_stage(1, "test", {
+        "prototype_code": "def attend(q, k, v):\n    return v",
+        "requirements": {"testing_framework": "pytest"},
+        "force": True
+    })
+    after = llm_token_totals()
+
+    assert result["status"] == "completed"
+    assert len(usages) == 1 and usages[0]["prompt_tokens"] > 0
+    assert after["prompt"] - before["prompt"] == usages[0]["prompt_tokens"]
+    assert after["completion"] - before["completion"] == usages[0]["completion_tokens"]
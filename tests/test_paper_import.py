@@ -0,0 +1,37 @@
+# tests/test_paper_import.py - Bulk paper import records fit the ResearchPaper columns
+import json
+
+from services.paper_import import paper_record, parse_ndjson
+
+LONG_TYPE = "preprint-" * 20
+
+def test_overlong_paper_type_is_truncated():
+    record = paper_record({"title": "Sparse attention", "type": LONG_TYPE}, "import")
+    assert record["paper_type"] == LONG_TYPE[:50]
+
+def test_import_endpoint_stores_overlong_type():
+    from app import app, db, ResearchProject, ResearchPaper
+
+    with app.app_context():
+        db.create_all()
+        project = ResearchProject(title="Import test", description="")
+        db.session.add(project)
+        db.session.commit()
+        project_id = project.id
+
+    body = "\n".join(json.dumps(paper) for paper in [
+        {"title": "Sparse attention", "type": LONG_TYPE},
+        {"title": "Dense retrieval", "type": "arxiv"}
+    ])
+    assert [fields["title"] for fields in parse_ndjson(body)] == ["Sparse attention", "Dense retrieval"]
+
+    response = app.test_client().post(
+        f"/api/project/{project_id}/papers/import?format=ndjson",
+        data=body, content_type="application/x-ndjson"
+    )
+    assert response.status_code == 200, response.get_json()
+    assert response.get_json()["imported"] == 2
+
+    with app.app_context():
+        types = {paper.title: paper.paper_type for paper in ResearchPaper.query.filter_by(project_id=project_id)}
+    assert types == {"Sparse attention": LONG_TYPE[:50], "Dense retrieval": "arxiv"}